@@ -1,10 +1,265 @@
 import streamlit as st
+import altair as alt
 import pandas as pd
-import numpy as np
+import json
+import os
 import time
+from functools import partial
+
+from retro_optimizer import SimulationParams, sample_portfolio, telemetry
+from retro_optimizer.aggregate import ProgramScreen, aggregate_distribution
+from retro_optimizer import charts
+from retro_optimizer.cache import content_key, get_or_compute, make_cache
+from retro_optimizer.export import DATA_FORMATS, PacketContent, treaty_wording
+from retro_optimizer.ingest import exposure_table, read_portfolio
+from retro_optimizer.layers import Layer, ProgramBatch
+from retro_optimizer.jobs import (
+    CANCELLED,
+    DONE,
+    QUEUED,
+    JobManager,
+    converging_simulation_job,
+    export_job,
+    frontier_job,
+    simulation_job,
+    training_job,
+)
+from retro_optimizer.metrics import StreamingTail, catalog_summary, return_on_risk_capital
+from retro_optimizer.parallel import default_workers
+from retro_optimizer.pipeline import STRATEGY_FORMAT, program_metrics, structure_table
+from retro_optimizer.rl import RetroEnv
+from retro_optimizer.ylt import open_ylt, stored_portfolio
 
 st.set_page_config(page_title="Retrocession Strategy Optimizer", layout="wide")
 
+# Capital backing the portfolio ($M), used for expected surplus.
+CAPITAL_ALLOCATED = 150
+
+# Placeholder program shown until the optimizer picks one; its premiums stand
+# in until a catalog is available to price it.
+DEFAULT_PROGRAM = ProgramBatch.from_programs([[
+    Layer("XoL", retention=30, limit=100, reinstatements=1),
+    Layer("ILW", retention=50, limit=75, trigger=20_000),
+    Layer("Sidecar", retention=20, limit=50, share=0.5),
+]], premiums=[[8.2, 4.5, 6.1]])
+
+TRAINING_ITERATIONS = 100
+
+
+@st.cache_resource
+def result_cache():
+    # One bounded cache per server, shared by all sessions; pick the backend
+    # with RETRO_CACHE_BACKEND=memory|disk.
+    return make_cache()
+
+
+@st.cache_resource
+def job_manager():
+    # One bounded worker pool per server; every session's jobs queue on it.
+    # Size it with RETRO_JOB_WORKERS.
+    return JobManager()
+
+
+@st.cache_resource
+def load_catalog(path):
+    # Memory-mapped and shared by every session reading the same catalog.
+    return open_ylt(path)
+
+
+@st.cache_data(max_entries=4, show_spinner=False)
+def ingest_upload(file_id, name, _upload):
+    # Keyed by the upload's id so re-runs don't re-parse or re-hash the bytes.
+    start = time.perf_counter()
+    portfolio = read_portfolio(_upload, name=name)
+    return len(portfolio), exposure_table(portfolio), time.perf_counter() - start
+
+
+def current_portfolio():
+    # Region/LOB exposure from Step 1, or the sample book.
+    return st.session_state.get("portfolio", sample_portfolio())
+
+
+def stored_catalog():
+    path = st.session_state.get("ylt_path")
+    return load_catalog(path) if path else None
+
+
+@st.cache_resource
+def frontier_results():
+    # (catalog path, capital) -> frontier job result: the env with the
+    # catalog's layer rate tables and its efficient frontier.
+    # Shared by every session, like the catalogs themselves.
+    return {}
+
+
+def submit_job(kind, fn, *args, **kwargs):
+    # A session follows one job per kind; the one it replaces would run on
+    # unobserved, so it is cancelled.
+    previous = current_job(kind)
+    if previous is not None and previous.active:
+        previous.cancel()
+    job = job_manager().submit(kind, fn, *args, **kwargs)
+    st.session_state.setdefault("jobs", {})[kind] = job.id
+    return job
+
+
+def current_job(kind):
+    job_id = st.session_state.get("jobs", {}).get(kind)
+    return job_manager().get(job_id) if job_id else None
+
+
+def finish_job(kind):
+    st.session_state.get("jobs", {}).pop(kind, None)
+
+
+def poll_job(job, wait=True):
+    # Progress and a cancel button for an unfinished job, refreshed until it
+    # ends; the script thread itself never waits on the computation.  With
+    # ``wait=False`` the rest of the page still renders and the refresh
+    # happens at the end of the script.
+    global refresh_pending
+    if job.status == QUEUED:
+        ahead = job_manager().queue_position(job)
+        st.info(f"⏳ {job.label} — queued behind {ahead} other job(s) on this server.")
+    else:
+        text = f"{job.label} — {job.detail}" if job.detail else job.label
+        st.progress(job.fraction, text=text)
+    if st.button("⏹️ Cancel", key=f"cancel-{job.id}"):
+        job.cancel()
+    if wait:
+        refresh()
+    refresh_pending = True
+
+
+def refresh():
+    telemetry.end(rerun_span)
+    time.sleep(0.5)
+    st.rerun()
+
+
+def catalog_frontier(path, capital):
+    # Env and efficient frontier of a stored catalog.  Pricing the layers
+    # and sweeping the front take seconds to minutes on large catalogs, so a
+    # background job builds them on first use; None (with progress) until then.
+    key = (path, capital)
+    results = frontier_results()
+    if key not in results:
+        kind = f"frontier-{content_key(path, capital)[:12]}"
+        job = current_job(kind)
+        if job is None:
+            job = submit_job(kind, frontier_job, path, capital, label="Precomputing the efficient frontier")
+        if job.active:
+            poll_job(job, wait=False)
+            return None
+        finish_job(kind)
+        if job.status != DONE:
+            st.error(f"❌ Efficient frontier failed: {job.error or 'cancelled'}")
+            return None
+        results[key] = job.result
+    return results[key]
+
+
+def collect_simulation():
+    # Follow the session's simulation job; once done its catalog becomes the
+    # session's stored catalog.
+    job = current_job("simulation")
+    if job is None:
+        return
+    if job.active:
+        poll_job(job)
+    elif job.status == DONE:
+        st.session_state["ylt_path"] = job.result
+        st.session_state["sim_elapsed"] = job.elapsed
+    elif job.status == CANCELLED:
+        st.warning("⏹️ Simulation cancelled; the partial catalog was discarded.")
+    else:
+        st.error(f"❌ Simulation failed: {job.error}")
+    finish_job("simulation")
+
+
+def exact_distribution(portfolio, params):
+    # Analytical aggregate loss distribution; milliseconds, but shared anyway.
+    return get_or_compute(
+        result_cache(),
+        content_key("aggregate", portfolio, params),
+        lambda: aggregate_distribution(portfolio, params)
+    )
+
+
+def current_strategy():
+    key = st.session_state.get("strategy_key")
+    return result_cache().get(key) if key else None
+
+
+def read_file(path):
+    # Download data read only when the button is clicked; the file is closed
+    # before Streamlit serves the bytes.
+    with open(path, "rb") as fh:
+        return fh.read()
+
+
+def money_columns(decimals: dict, labels: bool = False) -> dict:
+    # Render-time "$…M" formatting for the numeric columns of a structure table;
+    # ``labels`` also drops the "($M)" suffix from the headers.
+    return {
+        column: st.column_config.NumberColumn(column.replace(" ($M)", "") if labels else column,
+                                              format=f"$%.{places}fM")
+        for column, places in decimals.items()
+    }
+
+
+def density_chart(density):
+    # Smoothed loss density from charts.loss_density (a few hundred points).
+    return alt.Chart(density).mark_area(opacity=0.6, line=True).encode(
+        x=alt.X(f"{charts.LOSS}:Q"),
+        y=alt.Y(f"{charts.DENSITY}:Q", axis=alt.Axis(format=".1e")),
+        tooltip=[alt.Tooltip(f"{charts.LOSS}:Q", format=",.1f"), alt.Tooltip(f"{charts.DENSITY}:Q", format=".2e")],
+    )
+
+
+def exceedance_chart(curve):
+    # Exceedance probability on a log axis, so the 1-in-100+ tail is legible.
+    return alt.Chart(curve).mark_line(point=False).encode(
+        x=alt.X(f"{charts.LOSS}:Q"),
+        y=alt.Y(f"{charts.PROBABILITY}:Q", scale=alt.Scale(type="log"), axis=alt.Axis(format=".0e")),
+        tooltip=[alt.Tooltip(f"{charts.LOSS}:Q", format=",.1f"), alt.Tooltip(f"{charts.PROBABILITY}:Q", format=".2e"),
+                 alt.Tooltip(f"{charts.RETURN_PERIOD}:Q", format=",.0f")],
+    )
+
+
+def diagnostics_panel():
+    # Timings, counters and memory of this server process; recording is
+    # process-wide, so every session sees (and toggles) the same log.
+    with st.sidebar.expander("🩺 Diagnostics"):
+        recording = st.toggle("Record timings", value=telemetry.enabled(),
+                              help="Times reruns, simulation, evaluation, training and charts. "
+                                   "Set RETRO_TELEMETRY=1 to record from server start.")
+        if recording != telemetry.enabled():
+            telemetry.enable(recording)
+        if not recording:
+            st.caption("Off — instrumentation costs nothing while disabled.")
+            return
+        summary = telemetry.summary()
+        if summary:
+            st.dataframe(pd.DataFrame(summary), hide_index=True, use_container_width=True, column_config={
+                "total_s": st.column_config.NumberColumn("total (s)", format="%.2f"),
+                "mean_ms": st.column_config.NumberColumn("mean (ms)", format="%.1f"),
+                "max_ms": st.column_config.NumberColumn("max (ms)", format="%.1f"),
+            })
+        else:
+            st.caption("Nothing recorded yet.")
+        for name, total in telemetry.counters().items():
+            st.caption(f"{name.replace('_', ' ')}: {total:,.0f}")
+        peak = telemetry.peak_rss_mb()
+        if peak is not None:
+            st.caption(f"Peak memory (RSS): {peak:,.0f} MiB")
+        st.download_button("⬇️ Download trace", json.dumps(telemetry.chrome_trace(), default=str),
+                           file_name="retro-trace.json", mime="application/json",
+                           help="Trace Event JSON; open in chrome://tracing or ui.perfetto.dev.")
+        if st.button("Clear", key="telemetry-reset"):
+            telemetry.reset()
+
+
 # Sidebar navigation
 st.sidebar.title("🧭 Navigation")
 page = st.sidebar.radio(
@@ -18,11 +273,13 @@ page = st.sidebar.radio(
         "✅ Step 5: Final Strategy"
     ]
 )
+# Set by poll_job(wait=False) when a job shown on this page is still running.
+refresh_pending = False
 
 # ------------------------------------------------
 # HOME
 # ------------------------------------------------
-if page == "🏠 Home":
+def home_page():
     # ===== Logo & Title =====
     st.image("assets/logo.png", width=200)
     st.markdown("<h1 style='text-align: center;'>⚡ Retrocession Strategy Optimizer</h1>", unsafe_allow_html=True)
@@ -95,7 +352,7 @@ if page == "🏠 Home":
 # ------------------------------------------------
 # STEP 1: Portfolio Input
 # ------------------------------------------------
-elif page == "📁 Step 1: Portfolio Input":
+def portfolio_page():
     st.header("📁 Step 1: Define Your Reinsurer Portfolio")
     st.image("assets/step1_icon.png", width=80)
 
@@ -119,6 +376,8 @@ elif page == "📁 Step 1: Portfolio Input":
        - `Line of Business`
        - Optional: `Capital Allocated`, `Cost Tolerance`, etc.
 
+       Location-level files with hundreds of thousands of rows are fine; CSV loads fastest.
+
     2. **Use a simulated sample portfolio** — to explore the tool with realistic placeholder data.
 
     """)
@@ -126,19 +385,31 @@ elif page == "📁 Step 1: Portfolio Input":
     uploaded = st.file_uploader("📤 Upload Your Portfolio File (CSV or XLSX)", type=["csv", "xlsx"])
     use_sample = st.checkbox("Or use a sample portfolio", value=True)
 
-    if uploaded or use_sample:
+    df = None
+    if uploaded:
+        try:
+            with st.spinner(f"Parsing {uploaded.name}..."):
+                n_locations, df, elapsed = ingest_upload(uploaded.file_id, uploaded.name, uploaded)
+        except ValueError as exc:
+            st.error(f"❌ Could not load {uploaded.name}: {exc}")
+        else:
+            st.success(
+                f"✅ Portfolio successfully loaded and parsed: {n_locations:,} locations "
+                f"in {df['Region'].nunique()} regions ({elapsed:.1f}s)."
+            )
+    elif use_sample:
         st.success("✅ Portfolio successfully loaded and parsed.")
 
         # Simulated sample data
-        df = pd.DataFrame({
-            "Region": ["Florida", "Gulf Coast", "Northeast"],
-            "TIV ($M)": [300, 250, 180],
-            "Expected Loss ($M)": [45, 38, 20],
-            "Line of Business": ["Property CAT", "Property All Risk", "Commercial Lines"]
-        })
+        df = sample_portfolio()
+
+    if df is not None:
+        st.session_state["portfolio"] = df
 
         st.markdown("### 🧾 Portfolio Overview")
         st.dataframe(df, use_container_width=True)
+        if uploaded:
+            st.caption("Location rows aggregated by region and line of business; this table drives the simulation.")
 
         st.markdown("""
         ---
@@ -166,14 +437,14 @@ elif page == "📁 Step 1: Portfolio Input":
         """)
 
         st.info("➡️ You're ready! Move to **Step 2** to simulate catastrophe scenarios based on this portfolio.")
-    else:
+    elif not uploaded:
         st.warning("📂 Please upload your portfolio or use the sample option to continue.")
 
 
 # ------------------------------------------------
 # STEP 2: Scenario Simulation
 # ------------------------------------------------
-elif page == "🔄 Step 2: Scenario Simulation":
+def simulation_page():
     st.header("🔄 Step 2: Catastrophe Scenario Simulation")
     st.image("assets/step2_icon.png", width=80)
 
@@ -205,6 +476,22 @@ elif page == "🔄 Step 2: Scenario Simulation":
 
     This option is fast and useful for general risk simulation.
 
+    Switch on **regional dependence** to correlate losses across your regions with a
+    Gaussian or t copula, and **season clustering** to make busy years busy everywhere
+    (negative binomial event counts). Each region's expected loss stays the same; only
+    how the bad years line up changes — which is what drives ILW and multi-region layers.
+
+    **Variance reduction** gets the same 99% CVaR precision from fewer years: antithetic
+    years and stratified severities spread the draws evenly, and tail importance sampling
+    simulates severe years more often, weighting each year so every statistic stays unbiased.
+
+    #### 📐 Analytical Engine (FFT)
+    Computes the **exact** annual loss distribution of the same Poisson/lognormal model —
+    no sampling, no simulated years — by applying the event-count generating function to the
+    Fourier transform of the severity distribution. Return-period losses, VaR and CVaR come
+    back in milliseconds with no Monte Carlo noise. It covers independent regions (with or
+    without season clustering); use the stochastic generator for copula dependence.
+
     #### 🧠 LLM-Based Scenario Generator *(Coming Soon)*
     A generative model that creates **realistic CAT narratives**:
     - Hurricanes hitting multiple coasts in one season
@@ -216,25 +503,168 @@ elif page == "🔄 Step 2: Scenario Simulation":
     ---
     """)
 
-    if st.button("▶️ Run Loss Simulation"):
-        with st.spinner("Simulating 1,000+ annual loss scenarios..."):
-            time.sleep(2)
-            losses = np.random.lognormal(mean=2, sigma=0.5, size=1000)
-            loss_df = pd.DataFrame({"Simulated Annual Loss ($M)": losses})
+    engine = st.radio(
+        "Simulation engine",
+        ["stochastic", "analytical"],
+        format_func={"stochastic": "🔢 Stochastic generator (Monte Carlo)",
+                     "analytical": "📐 Analytical (FFT)"}.get,
+        horizontal=True
+    )
+    n_years, seed, workers = 10_000, 2024, 1
+    if engine == "stochastic":
+        n_years = st.select_slider(
+            "Number of simulated years",
+            options=[1_000, 10_000, 100_000, 1_000_000],
+            value=10_000
+        )
+        seed = st.number_input("Random seed", min_value=0, value=2024, step=1)
+        workers = st.number_input(
+            "Worker processes", min_value=1, max_value=default_workers(), value=1, step=1,
+            help="Shards the catalog across processes; results are identical for any worker count."
+        )
+
+    st.markdown("#### 🔗 Regional Dependence")
+    copula = st.selectbox(
+        "Cross-region dependence",
+        ["independent", "gaussian", "t"] if engine == "stochastic" else ["independent"],
+        format_func={"independent": "Independent regions", "gaussian": "Gaussian copula",
+                     "t": "t copula (joint extremes)"}.get
+    )
+    correlation, t_dof = 0.5, 4.0
+    if copula != "independent":
+        correlation = st.slider("Correlation between regions", 0.0, 0.95, 0.5, step=0.05)
+    if copula == "t":
+        t_dof = float(st.slider("t copula degrees of freedom", 2, 30, 4,
+                                help="Lower values make regions more likely to suffer extreme years together."))
+    clustering = st.slider(
+        "Season clustering (negative binomial dispersion)", 0.0, 1.0, 0.0, step=0.05,
+        help="Variance of a shared season-activity multiplier; 0 keeps independent Poisson counts."
+    )
 
-        st.success("✅ Scenario simulation complete.")
+    sampling, tail_tilt, stop_early = "monte_carlo", 0.0, False
+    if engine == "stochastic":
+        st.markdown("#### 🎯 Variance Reduction")
+        sampling = st.selectbox(
+            "Sampling scheme",
+            ["monte_carlo", "antithetic", "stratified"],
+            format_func={"monte_carlo": "Plain Monte Carlo", "antithetic": "Antithetic years",
+                         "stratified": "Stratified (Latin hypercube) severities"}.get,
+            help="Every candidate program is always scored on the same simulated years (common random numbers)."
+        )
+        tail_tilt = st.slider(
+            "Tail importance sampling", 0.0, 1.0, 0.0, step=0.1,
+            help="Simulates bad years more often and reweights them; 0.5 needs several times fewer years "
+                 "for the same 99% CVaR interval."
+        )
+
+        min_years = StreamingTail(level=0.99).min_years()
+        stop_early = st.checkbox(
+            "⏱️ Stop early once the 99% CVaR has converged (±1%)", value=False,
+            disabled=n_years <= min_years,
+            help="Streams the simulation chunk by chunk and stops as soon as the CVaR confidence interval is tight "
+                 f"enough. Needs more than {min_years:,} years: the interval only counts once 100 tail years are in."
+        ) and n_years > min_years
 
-        st.markdown("### 📈 Loss Distribution Plot")
-        st.line_chart(loss_df)
+    if st.button("▶️ Run Loss Simulation"):
+        portfolio = current_portfolio()
+        params = SimulationParams(n_years=n_years, seed=int(seed), copula=copula, correlation=correlation,
+                                  t_dof=t_dof, clustering=clustering, sampling=sampling, tail_tilt=tail_tilt)
+        label = f"Simulating {n_years:,} annual loss scenarios"
+        if engine == "analytical":
+            start = time.perf_counter()
+            st.session_state["aggregate"] = exact_distribution(portfolio, params)
+            st.session_state["aggregate_elapsed"] = time.perf_counter() - start
+        elif stop_early:
+            submit_job("simulation", converging_simulation_job, portfolio, params, rel_tol=0.01, label=label)
+        else:
+            submit_job("simulation", simulation_job, portfolio, params, workers=int(workers), label=label)
+
+    collect_simulation()
+    ylt = stored_catalog()
+    dist = st.session_state.get("aggregate")
+    if engine == "analytical":
+        if dist is not None:
+            summary = dist.summary()
+            st.success(
+                f"✅ Exact aggregate loss distribution computed in "
+                f"{st.session_state['aggregate_elapsed'] * 1000:,.0f} ms ({dist.pmf.size:,}-point FFT grid)."
+            )
+
+            col1, col2, col3 = st.columns(3)
+            col1.metric("Mean Annual Loss", f"${summary['mean']:,.1f}M")
+            col2.metric("VaR (99%)", f"${summary['var']:,.1f}M")
+            col3.metric("CVaR (99%)", f"${summary['cvar']:,.1f}M")
+
+            st.markdown("### 📅 Return Period Losses")
+            st.dataframe(pd.DataFrame({
+                "Return Period (years)": summary["return_periods"],
+                "Aggregate Loss – AEP ($M)": summary["aep"].round(1),
+                "Largest Event – OEP ($M)": summary["oep"].round(1)
+            }), use_container_width=True, hide_index=True)
+
+            st.markdown("### 📈 Exceedance Probability Curve")
+            with telemetry.span("chart", chart="exceedance", points=charts.CHART_POINTS):
+                st.altair_chart(exceedance_chart(charts.distribution_exceedance(dist)), use_container_width=True)
+
+            st.info(
+                "➡️ Step 3 trains on a simulated catalog. Run the stochastic generator for one; the agent can "
+                "then screen candidates with this engine and confirm the best on the catalog."
+            )
+    elif ylt is not None:
+        summary = get_or_compute(
+            result_cache(),
+            content_key("catalog-summary", st.session_state["ylt_path"]),
+            lambda: catalog_summary(ylt)
+        )
+        n_years = ylt.n_years
+
+        elapsed = st.session_state.get("sim_elapsed")
+        timing = f" in {elapsed:.2f}s" if elapsed is not None else ""
+        dependence = "" if ylt.params.copula == "independent" else f", {ylt.params.copula} copula"
+        if ylt.params.clustering > 0:
+            dependence += ", clustered seasons"
+        if ylt.weights is not None:
+            dependence += f", tail tilt {ylt.params.tail_tilt:g}"
+        st.success(
+            f"✅ Scenario simulation complete ({n_years:,} years{timing}, seed {ylt.params.seed}{dependence})."
+        )
+
+        col1, col2, col3 = st.columns(3)
+        col1.metric("Mean Annual Loss", f"${summary['mean']:,.1f}M")
+        col2.metric("VaR (99%)", f"${summary['var']:,.1f}M")
+        low, high = summary["cvar_interval"]
+        col3.metric("CVaR (99%)", f"${summary['cvar']:,.1f}M", help=f"95% CI ${low:,.1f}M – ${high:,.1f}M")
+
+        st.markdown("### 📅 Return Period Losses")
+        rp_df = pd.DataFrame({
+            "Return Period (years)": summary["return_periods"],
+            "Aggregate Loss – AEP ($M)": summary["aep"].round(1),
+            "Largest Event – OEP ($M)": summary["oep"].round(1)
+        })
+        st.dataframe(rp_df, use_container_width=True, hide_index=True)
+
+        curves = get_or_compute(
+            result_cache(),
+            content_key("catalog-charts", st.session_state["ylt_path"], charts.CHART_POINTS),
+            lambda: charts.catalog_charts(ylt)
+        )
+        with telemetry.span("chart", chart="loss_distribution", points=2 * charts.CHART_POINTS):
+            col1, col2 = st.columns(2)
+            with col1:
+                st.markdown("### 📈 Loss Distribution")
+                st.altair_chart(density_chart(curves["density"]), use_container_width=True)
+            with col2:
+                st.markdown("### 📉 Exceedance Probability Curve")
+                st.altair_chart(exceedance_chart(curves["exceedance"]), use_container_width=True)
 
         with st.expander("🔍 View Sample Simulated Losses"):
-            st.dataframe(loss_df.head(10))
+            st.dataframe(pd.DataFrame({"Simulated Annual Loss ($M)": ylt.total[:10]}))
 
-        st.markdown("""
+        st.markdown(f"""
         ---
         ### 📊 How to Interpret the Results
 
-        You’ve now generated 1,000 synthetic loss years.
+        You’ve now generated {n_years:,} synthetic loss years.
 
         - Each value represents a **total annual loss** for your reinsurer portfolio.
         - The **distribution curve** shows how frequently mild, moderate, and severe loss years occur.
@@ -250,7 +680,7 @@ elif page == "🔄 Step 2: Scenario Simulation":
 # ------------------------------------------------
 # STEP 3: RL Optimization
 # ------------------------------------------------
-elif page == "🧠 Step 3: RL Optimization":
+def optimization_page():
     st.header("🧠 Step 3: RL-Based Strategy Optimization")
     st.image("assets/step3_icon.png", width=80)
 
@@ -267,6 +697,13 @@ elif page == "🧠 Step 3: RL Optimization":
     It tests each strategy across thousands of loss simulations and learns how to **maximize retained capital**, **minimize tail risk**, and **control cost**.
     """)
 
+    collect_simulation()
+    ylt = stored_catalog()
+    if ylt is None:
+        st.warning("⚠️ No simulated catalog found. Run **Step 2** first, or the agent will train on a default 10,000-year catalog.")
+    else:
+        st.caption(f"📂 Using stored catalog: {ylt.n_years:,} simulated years (seed {ylt.params.seed}).")
+
     # ------------------------
     # Reward Function Weights
     # ------------------------
@@ -305,36 +742,124 @@ elif page == "🧠 Step 3: RL Optimization":
     # ------------------------
     st.markdown("### 💰 Set Premium Budget Constraint")
     max_premium = st.slider("Maximum Total Premium ($M)", min_value=10, max_value=30, value=20)
+    st.caption(
+        "Layers are priced from the simulated catalog: expected loss plus expenses, plus a cost-of-capital "
+        "load on each layer's 99% tail. Every program the agent evaluates is held within this budget."
+    )
+
+    # ------------------------
+    # Instant Frontier Lookup
+    # ------------------------
+    analysis = catalog_frontier(st.session_state["ylt_path"], CAPITAL_ALLOCATED) if ylt is not None else None
+    if analysis is not None:
+        frontier_env, frontier = analysis["env"], analysis["frontier"]
+        best = frontier.best(frontier_env, (surplus_w, cvar_w, cost_w), max_premium)
+
+        st.markdown("### ⚡ Instant Recommendation from the Efficient Frontier")
+        if best < 0:
+            st.warning("⚠️ No program on the frontier fits within this premium budget.")
+        else:
+            col1, col2, col3 = st.columns(3)
+            col1.metric("Return on Risk Capital", f"{frontier.roi[best]:.1f}%")
+            col2.metric("Net CVaR (99%)", f"${frontier.cvar[best]:,.1f}M")
+            col3.metric("Total Premium", f"${frontier.premium[best]:,.1f}M")
+            pick = frontier_env.decode(frontier.actions[best][None, :])
+            st.dataframe(structure_table(pick), use_container_width=True, hide_index=True,
+                         column_config=money_columns({"Retention ($M)": 1, "Limit ($M)": 1}))
+            st.caption(
+                f"Picked from {len(frontier):,} non-dominated programs. Moving a slider re-scores this front "
+                "instantly; run the agent below to train a dedicated policy."
+            )
 
     # ------------------------
     # Run Optimization
     # ------------------------
+    screen_candidates = st.checkbox(
+        "⚡ Screen candidates with the analytical (FFT) engine", value=True,
+        disabled=ylt is not None and ylt.params.copula != "independent",
+        help="Scores every sampled program on the exact aggregate distribution and confirms only the best "
+             "few per iteration on the catalog. Needs a catalog with independent regions."
+    )
     if st.button("🎯 Run Optimization Agent"):
-        with st.spinner("Training RL agent across 1,000 simulated loss years..."):
-            time.sleep(3)  # Replace with actual RL training logic
-
-            # Simulated strategy output
-            result_df = pd.DataFrame({
-                "Cover Type": ["XoL", "ILW", "Sidecar"],
-                "Retention ($M)": [30, 50, 20],
-                "Limit ($M)": [100, 75, 50],
-                "Premium ($M)": [8.2, 4.5, 6.1],
-                "Expected Payout ($M)": [28, 20, 15]
-            })
-
-            # Simulated frontier points
-            strategies = pd.DataFrame({
-                "ROI (%)": [18.2, 20.1, 21.5, 19.8, 22.4],
-                "CVaR (99%)": [38, 35, 32, 36, 30]
-            })
+        # Settings of the run, started below once a catalog and its rate
+        # tables are ready.
+        st.session_state["training_request"] = ((surplus_w, cvar_w, cost_w), max_premium, screen_candidates)
+        if ylt is None:
+            submit_job("simulation", simulation_job, current_portfolio(), SimulationParams(),
+                       label="Simulating a default 10,000-year catalog")
+            refresh()
+
+    request = st.session_state.get("training_request")
+    if request is not None and analysis is not None:
+        del st.session_state["training_request"]
+        weights, budget, screened = request
+        strategy_key = content_key(
+            "strategy", STRATEGY_FORMAT, st.session_state["ylt_path"], weights,
+            budget, CAPITAL_ALLOCATED, TRAINING_ITERATIONS, screened
+        )
+        st.session_state["strategy_key"] = strategy_key
+        st.session_state["strategy_from_cache"] = strategy_key in result_cache()
+        if not st.session_state["strategy_from_cache"]:
+            shared = analysis["env"]
+            env = RetroEnv(
+                shared.basis,
+                weights=weights,
+                max_premium=budget,
+                capital=CAPITAL_ALLOCATED,
+                pricer=shared.pricer
+            )
+            screen = None
+            if screened and ylt.params.copula == "independent":
+                # The book the catalog was simulated from, not the sidebar's.
+                screen = ProgramScreen(exact_distribution(stored_portfolio(st.session_state["ylt_path"]), ylt.params))
+            st.session_state["training"] = (strategy_key, st.session_state["ylt_path"])
+            submit_job("training", training_job, env, TRAINING_ITERATIONS, screen=screen,
+                       label=f"Training RL agent across {ylt.n_years:,} simulated loss years")
+    elif request is not None and ylt is None and current_job("simulation") is None:
+        # The default catalog was cancelled or failed.
+        del st.session_state["training_request"]
+    elif request is not None:
+        st.info("⏳ The agent starts training as soon as the catalog's layer pricing is ready.")
+
+    job = current_job("training")
+    if job is not None:
+        if job.active:
+            poll_job(job)
+        training_key, training_path = st.session_state.pop("training")
+        if job.status == DONE:
+            # Everything later pages need from the run, ready to cache.
+            result_cache().put(training_key, {"catalog": training_path, **job.result})
+        elif job.status == CANCELLED:
+            st.warning("⏹️ Training cancelled.")
+        else:
+            st.error(f"❌ Optimization failed: {job.error}")
+        finish_job("training")
+
+    strategy = current_strategy()
+    if strategy is not None:
+        result_df = structure_table(strategy["program"], payouts=strategy["payouts"])
+
+        # Frontier points and where the agent's program lands
+        analysis = catalog_frontier(strategy["catalog"], CAPITAL_ALLOCATED)
+        strategies = pd.DataFrame({
+            "ROI (%)": analysis["frontier"].roi if analysis is not None else [],
+            "CVaR (99%)": analysis["frontier"].cvar if analysis is not None else []
+        })
 
-        st.success("✅ Optimization complete. Strategy generated!")
+        st.success(
+            f"✅ Optimization complete in {strategy['elapsed']:.1f}s ({strategy['iterations']} iterations). "
+            "Strategy generated!"
+        )
+        if st.session_state.get("strategy_from_cache"):
+            st.caption("⚡ Served from the result cache: these exact settings were already optimized.")
 
         # ------------------------
         # Show Strategy Output
         # ------------------------
         st.markdown("### 🧾 Optimized Retrocession Strategy")
-        st.dataframe(result_df, use_container_width=True)
+        st.dataframe(result_df, use_container_width=True, column_config=money_columns(
+            {"Retention ($M)": 1, "Limit ($M)": 1, "Premium ($M)": 2, "Expected Payout ($M)": 1}
+        ))
 
         st.markdown("""
         Each row represents a **recommended retrocession layer**, and each column tells you what the RL agent selected:
@@ -342,7 +867,7 @@ elif page == "🧠 Step 3: RL Optimization":
         - **Retention ($M)**: How much loss you’ll absorb before this layer activates.
         - **Limit ($M)**: The cap or maximum payout from the cover.
         - **Premium ($M)**: Estimated cost of purchasing the layer.
-        - **Expected Payout ($M)**: Average modeled benefit over 1,000 simulated loss years.
+        - **Expected Payout ($M)**: Average modeled benefit over the simulated loss years.
 
         🧠 **Interpretation Tips**:
         - Lower retentions reduce tail risk but usually cost more.
@@ -357,13 +882,16 @@ elif page == "🧠 Step 3: RL Optimization":
 
         import matplotlib.pyplot as plt
 
-        fig, ax = plt.subplots()
-        ax.scatter(strategies["CVaR (99%)"], strategies["ROI (%)"], color="teal", s=80)
-        ax.set_xlabel("Tail Risk (CVaR 99%) [$M]")
-        ax.set_ylabel("Return on Risk Capital [%]")
-        ax.set_title("Efficient Frontier: Risk vs. Reward")
-        ax.grid(True)
-        st.pyplot(fig)
+        with telemetry.span("chart", chart="frontier", points=len(strategies)):
+            fig, ax = plt.subplots()
+            ax.scatter(strategies["CVaR (99%)"], strategies["ROI (%)"], color="teal", s=30, label="Pareto-efficient programs")
+            ax.scatter(strategy["cvar"], strategy["roi"], color="crimson", marker="*", s=200, label="RL agent's program")
+            ax.legend()
+            ax.set_xlabel("Tail Risk (CVaR 99%) [$M]")
+            ax.set_ylabel("Return on Risk Capital [%]")
+            ax.set_title("Efficient Frontier: Risk vs. Reward")
+            ax.grid(True)
+            st.pyplot(fig)
 
         st.markdown("""
         This chart shows the **trade-off between profitability and catastrophic risk** across strategies tested by the RL agent.
@@ -384,7 +912,7 @@ elif page == "🧠 Step 3: RL Optimization":
 # ------------------------------------------------
 # STEP 4: LLM Explanation
 # ------------------------------------------------
-elif page == "💬 Step 4: LLM Explanation":
+def explanation_page():
     st.header("💬 Step 4: Strategy Explanation & Wording")
     st.image("assets/step4_icon.png", width=80)
 
@@ -422,18 +950,10 @@ elif page == "💬 Step 4: LLM Explanation":
     # ------------------------
     st.markdown("### 📜 Sample Retrocession Wording Draft")
 
-    st.code("""
-    Retrocession Agreement — Draft Language:
-
-    1. XoL Layer: The Reinsurer agrees to cede losses in excess of $30 million up to a limit of $100 million  
-       for the Property CAT portfolio concentrated in Florida and Gulf Coast territories.
-
-    2. ILW Trigger: An Industry Loss Warranty will activate upon aggregate insured losses  
-       exceeding $20 billion for a named U.S. windstorm season, providing up to $75 million coverage.
-
-    3. Sidecar Participation: Up to $50 million of additional capital will be sourced via a Sidecar vehicle,  
-       attaching at the $150 million portfolio-level loss point, for 1-in-200 modeled events.
-    """)
+    strategy = current_strategy()
+    if strategy is not None:
+        st.caption("Wording below reflects the terms selected in **Step 3**.")
+    st.code(treaty_wording(strategy["program"] if strategy is not None else DEFAULT_PROGRAM), language=None)
 
     st.markdown("""
     ✍️ **Note**: This wording is a first-pass draft. Legal teams and brokers should customize and validate before use in contracts.
@@ -447,7 +967,7 @@ elif page == "💬 Step 4: LLM Explanation":
 # ------------------------------------------------
 # STEP 5: Final Strategy
 # ------------------------------------------------
-elif page == "✅ Step 5: Final Strategy":
+def strategy_page():
     st.header("✅ Step 5: Final Strategy Summary")
     st.image("assets/step5_icon.png", width=80)
 
@@ -459,26 +979,55 @@ elif page == "✅ Step 5: Final Strategy":
     This output is designed to be **decision-ready** — supporting discussions with CROs, capital committees, brokers, or treaty teams.
     """)
 
+    strategy = current_strategy()
+    # Metrics, frontier and recoveries all come from the catalog the strategy
+    # was trained on, which need not be the one loaded now; without a
+    # strategy the stored catalog's rate tables price the default program.
+    ylt_path = strategy["catalog"] if strategy is not None else st.session_state.get("ylt_path")
+    ylt = load_catalog(ylt_path) if ylt_path else None
+    if ylt is not None:
+        st.caption(f"📂 Based on stored catalog: {ylt.n_years:,} simulated years (seed {ylt.params.seed}).")
+        if ylt_path != st.session_state.get("ylt_path"):
+            st.caption("The strategy was trained on an earlier catalog than the one loaded in Step 2; its figures "
+                       "and exports use that catalog.")
+
     st.markdown("### 📈 Key Performance Metrics")
 
-    st.markdown("""
+    analysis = catalog_frontier(ylt_path, CAPITAL_ALLOCATED) if ylt is not None else None
+    if strategy is not None:
+        program = strategy["program"]
+    elif analysis is not None:
+        program = analysis["env"].price(DEFAULT_PROGRAM)
+    else:
+        program = DEFAULT_PROGRAM
+    total_premium = float(program.premiums.sum())
+    if ylt is not None:
+        surplus, tail_loss = get_or_compute(
+            result_cache(),
+            content_key("program-metrics", ylt_path, program, CAPITAL_ALLOCATED),
+            lambda: program_metrics(ylt, program, CAPITAL_ALLOCATED)
+        )
+        surplus_text = f"${surplus:,.1f}M"
+        cvar_text = f"${tail_loss:,.1f}M"
+        roi_text = f"{return_on_risk_capital(surplus, tail_loss):.1f}%"
+    else:
+        surplus_text, cvar_text, roi_text = "$95M", "$32M", "22.4%"
+
+    st.markdown(f"""
     | Metric | Description | Value |
     |--------|-------------|-------|
-    | 📈 **Expected Surplus** | Projected capital retained after losses & premiums | `$95M` |
-    | 🛡️ **Tail Risk (CVaR 99%)** | Estimated capital needed in worst 1% of years | `$32M` |
-    | 💰 **Total Premium** | Modeled cost of retrocession program | `$18.8M` |
-    | 🎯 **Return on Risk Capital** | ROI across simulations (post-protection) | `22.4%` |
+    | 📈 **Expected Surplus** | Projected capital retained after losses & premiums | `{surplus_text}` |
+    | 🛡️ **Tail Risk (CVaR 99%)** | Estimated capital needed in worst 1% of years | `{cvar_text}` |
+    | 💰 **Total Premium** | Modeled cost of retrocession program | `${total_premium:.1f}M` |
+    | 🎯 **Return on Risk Capital** | ROI across simulations (post-protection) | `{roi_text}` |
     """)
 
     st.markdown("### 📋 Final Retrocession Structure")
 
-    final_df = pd.DataFrame({
-        "Cover Type": ["XoL", "ILW", "Sidecar"],
-        "Retention": ["$30M", "$50M", "$20M"],
-        "Limit": ["$100M", "$75M", "$50M"],
-        "Premium": ["$8.2M", "$4.5M", "$6.1M"]
-    })
-    st.dataframe(final_df, use_container_width=True)
+    final_df = structure_table(program)
+    st.dataframe(final_df, use_container_width=True, column_config=money_columns(
+        {"Retention ($M)": 0, "Limit ($M)": 0, "Premium ($M)": 1}, labels=True
+    ))
 
     st.markdown("""
     - **XoL**: Offers efficient tail-risk absorption for Florida block.
@@ -492,18 +1041,90 @@ elif page == "✅ Step 5: Final Strategy":
     st.markdown("""
     Your final strategy can be exported for stakeholder presentation or contract preparation.
 
-    **Included in the packet (coming soon):**
-    - Executive summary
-    - Coverage tables
-    - Tail risk chart (CVaR frontier)
+    **The PDF packet contains:**
+    - Key performance metrics
+    - Coverage table
+    - Tail risk chart (CVaR frontier, once Step 3 has run)
     - LLM-generated treaty wording
+
+    With a stored catalog, the program's recoveries in every simulated year come alongside as CSV or Parquet.
+    Sections whose inputs have not changed since the last build are reused, so rebuilding after a tweak is quick.
     """)
 
-    st.download_button(
-        label="⬇️ Download Strategy Packet (PDF Coming Soon)",
-        data="Strategy content here",
-        file_name="Retro_Strategy_Summary.txt",
-        disabled=True
+    frontier = analysis["frontier"] if strategy is not None and analysis is not None else None
+    content = PacketContent(
+        program=program,
+        payouts=strategy["payouts"] if strategy is not None else None,
+        ylt_path=ylt_path if ylt is not None else None,
+        capital=CAPITAL_ALLOCATED,
+        frontier_cvar=frontier.cvar if frontier is not None else None,
+        frontier_roi=frontier.roi if frontier is not None else None,
+        chosen=(strategy["cvar"], strategy["roi"]) if strategy is not None else None
     )
+    data_format = st.radio("Recoveries file format", DATA_FORMATS, horizontal=True, disabled=ylt is None,
+                           help="Year-by-year gross loss, layer recoveries and net loss. Parquet needs pyarrow.")
+    if ylt is None:
+        data_format = None
+    # Wait for the pricing and frontier so the packet shows the final figures.
+    if st.button("📦 Build Strategy Packet", disabled=(strategy is not None or ylt is not None) and analysis is None):
+        submit_job("export", export_job, content, result_cache(), data_format, label="Building strategy packet")
+
+    job = current_job("export")
+    if job is not None:
+        if job.active:
+            poll_job(job)
+        if job.status == DONE:
+            st.session_state["export"] = job.result
+        elif job.status == CANCELLED:
+            st.warning("⏹️ Export cancelled.")
+        else:
+            st.error(f"❌ Export failed: {job.error}")
+        finish_job("export")
+
+    export = st.session_state.get("export")
+    if export is not None and export["key"] == (content.key, data_format):
+        packet = export["packet"]
+        reused = "all sections reused" if not packet.rebuilt else "rebuilt: " + ", ".join(packet.rebuilt)
+        st.caption(f"📄 Packet ready ({len(packet.pdf) / 1024:,.0f} KB; {reused}).")
+        col1, col2 = st.columns(2)
+        col1.download_button(
+            label="⬇️ Download Strategy Packet (PDF)",
+            data=packet.pdf,
+            file_name="Retro_Strategy_Packet.pdf",
+            mime="application/pdf"
+        )
+        if export["data"] is not None and os.path.exists(export["data"]):
+            # Read from disk only when clicked, never on a rerun (needs Streamlit 1.52).
+            col2.download_button(
+                label=f"⬇️ Download Recoveries ({export['data_format'].upper()})",
+                data=partial(read_file, export["data"]),
+                file_name=f"Retro_Recoveries.{export['data_format']}",
+                mime="text/csv" if export["data_format"] == "csv" else "application/octet-stream"
+            )
+    elif export is not None:
+        st.caption("The strategy or recovery format changed since the last packet; build it again to include "
+                   "the changes.")
 
     st.success("✅ Your strategy is complete. You’re ready to present or refine further.")
+
+
+PAGES = {
+    "🏠 Home": home_page,
+    "📁 Step 1: Portfolio Input": portfolio_page,
+    "🔄 Step 2: Scenario Simulation": simulation_page,
+    "🧠 Step 3: RL Optimization": optimization_page,
+    "💬 Step 4: LLM Explanation": explanation_page,
+    "✅ Step 5: Final Strategy": strategy_page,
+}
+
+rerun_span = telemetry.begin("rerun", page=page)
+try:
+    PAGES[page]()
+finally:
+    # Also when the page raises or Streamlit stops or reruns the script.
+    telemetry.end(rerun_span)
+diagnostics_panel()
+if refresh_pending:
+    # A job shown above is still running; check on it again shortly.
+    time.sleep(0.5)
+    st.rerun()
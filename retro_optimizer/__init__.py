@@ -0,0 +1,20 @@
+"""Computational engines behind the Retrocession Strategy Optimizer demo."""
+
+from .layers import Layer, LossBasis, ProgramBatch, batch_recoveries, program_recoveries
+from .parallel import simulate_ylt_parallel
+from .portfolio import sample_portfolio
+from .simulation import SimulationParams, YearLossTable, simulate_events, simulate_ylt
+
+__all__ = [
+    "Layer",
+    "LossBasis",
+    "ProgramBatch",
+    "SimulationParams",
+    "YearLossTable",
+    "batch_recoveries",
+    "program_recoveries",
+    "sample_portfolio",
+    "simulate_events",
+    "simulate_ylt",
+    "simulate_ylt_parallel",
+]
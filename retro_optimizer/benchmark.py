@@ -0,0 +1,288 @@
+"""Reproducible throughput benchmarks for the engines behind the app.
+
+Runs without Streamlit::
+
+    python -m retro_optimizer.benchmark --output bench.json
+    python -m retro_optimizer.benchmark --years 10000 100000 --workers 1 4 --compare bench.json
+
+Three kinds of case are measured on the sample portfolio with fixed seeds,
+so two runs on the same machine do the same work:
+
+* ``simulation``: years/second of the Step 2 generator writing a catalog
+  into a scratch YLT store, for every catalog size and worker count.
+* ``evaluation``: program evaluations/second -- layer payouts, premium,
+  expected surplus and net CVaR -- for random programs scored in batches
+  of at most ``MAX_BATCH_CELLS`` program-years, plus the time to tabulate
+  the catalog's rate tables.
+* ``optimization``: wall time of Step 3 training until it reaches a target
+  reward.  The target is written into the results, and ``--compare`` trains
+  each catalog to the baseline's target, so both runs time the same goal
+  (the default target otherwise moves with the optimizer).  Catalogs above
+  ``--optimizer-max-years`` are skipped, since one unbatched iteration
+  there no longer fits in memory.
+
+Each case runs in a fresh process, so the peak resident set size recorded
+with it is its own (and, separately, that of its simulation workers).
+Results go to JSON together with the commit and machine they were measured
+on; ``--compare`` prints each case's speed-up over an earlier file.
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+
+import numpy as np
+
+from .frontier import MAX_BATCH_CELLS
+from .layers import LossBasis
+from .parallel import default_workers
+from .portfolio import sample_portfolio
+from .rl import RetroEnv, train
+from .simulation import SimulationParams
+from .telemetry import peak_rss_mb
+from .ylt import open_ylt, simulate_to_store
+
+BENCHMARK_FORMAT = 1
+DEFAULT_YEARS = (10_000, 100_000, 1_000_000, 10_000_000)
+OPTIMIZER_MAX_YEARS = 1_000_000
+SEED = 2024
+# Program-years scored per evaluation case (programs = this / years).
+EVALUATION_CELLS = 1 << 27
+# Target without --target-reward or a baseline: this share of the improvement
+# a full training run makes.
+TARGET_FRACTION = 0.95
+
+# Throughput metric of each case kind and whether larger is better.
+METRICS = {
+    "simulation": ("years_per_second", True),
+    "evaluation": ("programs_per_second", True),
+    "optimization": ("seconds_to_target", False),
+}
+
+
+def machine() -> dict:
+    """Where and on what code the benchmark ran."""
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "commit": commit,
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "processor": platform.processor() or platform.machine(),
+        "cpus": os.cpu_count(),
+    }
+
+
+def simulation_case(n_years: int, workers: int, root: str) -> dict:
+    """Simulate a catalog into the empty store ``root``."""
+    params = SimulationParams(n_years=n_years, seed=SEED)
+    start = time.perf_counter()
+    path = simulate_to_store(sample_portfolio(), params, root=root, workers=workers)
+    elapsed = time.perf_counter() - start
+    return {"path": path, "seconds": elapsed, "years_per_second": n_years / elapsed}
+
+
+def evaluation_case(path: str) -> dict:
+    """Score random programs on the catalog at ``path``."""
+    start = time.perf_counter()
+    env = RetroEnv(LossBasis.from_ylt(open_ylt(path)))
+    tables = time.perf_counter() - start
+
+    n_years = env.basis.n_years
+    step = max(1, MAX_BATCH_CELLS // n_years)
+    n_programs = max(step, EVALUATION_CELLS // n_years)
+    batch = env.decode(np.random.default_rng(SEED).random((n_programs, env.action_dim)))
+    start = time.perf_counter()
+    for i in range(0, n_programs, step):
+        env.evaluate(batch[i:i + step])
+    elapsed = time.perf_counter() - start
+    return {"programs": n_programs, "seconds": elapsed, "programs_per_second": n_programs / elapsed,
+            "rate_table_seconds": tables}
+
+
+def optimization_case(path: str, iterations: int, target_reward: float = None) -> dict:
+    """Train on the catalog at ``path`` until ``target_reward`` or ``iterations``.
+
+    Without a target, the time to reach ``TARGET_FRACTION`` of the full
+    run's improvement is reported instead.
+    """
+    env = RetroEnv(LossBasis.from_ylt(open_ylt(path)))
+    stamps = []
+    start = time.perf_counter()
+
+    def progress(iteration, best_reward):
+        stamps.append((time.perf_counter() - start, best_reward))
+
+    def should_stop():
+        return target_reward is not None and bool(stamps) and stamps[-1][1] >= target_reward
+
+    result = train(env, iterations, seed=SEED, progress=progress, should_stop=should_stop)
+    elapsed = time.perf_counter() - start
+    target = target_reward
+    if target is None:
+        first, last = stamps[0][1], stamps[-1][1]
+        target = first + TARGET_FRACTION * (last - first)
+    reached = [seconds for seconds, reward in stamps if reward >= target]
+    return {"iterations": len(stamps), "seconds": elapsed, "best_reward": result.best_reward,
+            "target_reward": target, "seconds_to_target": reached[0] if reached else None}
+
+
+def _measured(fn, args) -> dict:
+    result = fn(*args)
+    result["peak_rss_mb"], result["peak_worker_rss_mb"] = peak_rss_mb(), peak_rss_mb(children=True)
+    return result
+
+
+def run_isolated(fn, *args) -> dict:
+    """Run ``fn(*args)`` in a fresh process and add its peak memory."""
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as pool:
+        return pool.submit(_measured, fn, args).result()
+
+
+def baseline_targets(baseline: dict) -> dict:
+    """Target reward of each optimization case in an earlier report, by catalog size."""
+    return {result["n_years"]: result["target_reward"] for result in baseline["results"]
+            if result["case"] == "optimization" and result.get("target_reward") is not None}
+
+
+def run_benchmarks(years=DEFAULT_YEARS, workers=None, cases=tuple(METRICS), iterations: int = 100,
+                   target_reward: float = None, optimizer_max_years: int = OPTIMIZER_MAX_YEARS,
+                   scratch: str = None, progress=None, targets: dict = None) -> dict:
+    """Run every case and return the JSON-ready report.
+
+    ``targets`` maps catalog sizes to the reward their optimization case
+    trains to (see :func:`baseline_targets`); ``target_reward`` applies to
+    the others.  ``progress(result)`` is called as each case finishes.
+    Catalogs are written under ``scratch`` (a temporary directory by
+    default) and removed afterwards.
+    """
+    targets = targets or {}
+    workers = sorted(set(workers or (1, default_workers())))
+    config = {"years": list(years), "workers": workers, "cases": list(cases), "iterations": iterations,
+              "target_reward": target_reward, "optimizer_max_years": optimizer_max_years, "seed": SEED}
+    results = []
+
+    def record(result):
+        results.append(result)
+        if progress is not None:
+            progress(result)
+
+    scratch = tempfile.mkdtemp(prefix="retro-bench-", dir=scratch)
+    try:
+        for n_years in years:
+            # The first worker count's catalog is kept for the later cases.
+            catalog = None
+            for n_workers in workers:
+                root = os.path.join(scratch, f"{n_years}-{n_workers}")
+                result = run_isolated(simulation_case, n_years, n_workers, root)
+                if catalog is None:
+                    catalog = result["path"]
+                else:
+                    shutil.rmtree(root, ignore_errors=True)
+                if "simulation" in cases:
+                    record({"case": "simulation", "n_years": n_years, "workers": n_workers,
+                            **{k: v for k, v in result.items() if k != "path"}})
+            if "evaluation" in cases:
+                record({"case": "evaluation", "n_years": n_years, **run_isolated(evaluation_case, catalog)})
+            if "optimization" in cases and n_years <= optimizer_max_years:
+                record({"case": "optimization", "n_years": n_years,
+                        **run_isolated(optimization_case, catalog, iterations,
+                                       targets.get(n_years, target_reward))})
+            shutil.rmtree(os.path.dirname(catalog), ignore_errors=True)
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+    return {"format": BENCHMARK_FORMAT, "machine": machine(), "config": config, "results": results}
+
+
+def _case_id(result) -> tuple:
+    return result["case"], result["n_years"], result.get("workers")
+
+
+def compare(baseline: dict, current: dict) -> list:
+    """``(case id, metric, baseline, current, speed-up)`` for cases present in both runs.
+
+    Speed-ups above 1 mean ``current`` is faster, whichever way the metric runs.
+    Optimization cases trained to different targets are not comparable and
+    are left out.
+    """
+    before = {_case_id(result): result for result in baseline["results"]}
+    rows = []
+    for result in current["results"]:
+        old = before.get(_case_id(result))
+        metric, higher_is_better = METRICS[result["case"]]
+        if old is None or not old.get(metric) or not result.get(metric):
+            continue
+        if old.get("target_reward") != result.get("target_reward"):
+            continue
+        ratio = result[metric] / old[metric]
+        rows.append((_case_id(result), metric, old[metric], result[metric],
+                     ratio if higher_is_better else 1.0 / ratio))
+    return rows
+
+
+def _describe(result) -> str:
+    case, n_years, n_workers = _case_id(result)
+    metric = METRICS[case][0]
+    value = result.get(metric)
+    where = f"{n_years:>11,} years" + (f", workers={n_workers}" if n_workers else "")
+    shown = "not reached" if value is None else f"{value:,.2f}"
+    memory = "" if result.get("peak_rss_mb") is None else f"  (peak RSS {result['peak_rss_mb']:,.0f} MiB)"
+    return f"{case:<13}{where:<30}{metric} {shown}{memory}"
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="python -m retro_optimizer.benchmark",
+                                     description="Measure simulation, evaluation and optimization throughput.")
+    parser.add_argument("--years", type=int, nargs="+", default=DEFAULT_YEARS, help="catalog sizes")
+    parser.add_argument("--workers", type=int, nargs="+", default=None,
+                        help="simulation worker counts (default: 1 and all CPUs)")
+    parser.add_argument("--cases", nargs="+", choices=tuple(METRICS), default=tuple(METRICS))
+    parser.add_argument("--iterations", type=int, default=100, help="training iterations")
+    parser.add_argument("--target-reward", type=float, default=None,
+                        help=f"stop training at this reward (default: the --compare baseline's, "
+                             f"else {TARGET_FRACTION:.0%} of the improvement)")
+    parser.add_argument("--optimizer-max-years", type=int, default=OPTIMIZER_MAX_YEARS)
+    parser.add_argument("--scratch", default=None, help="directory for temporary catalogs")
+    parser.add_argument("--output", default="benchmark.json", help="where to write the JSON results")
+    parser.add_argument("--compare", default=None, metavar="BASELINE", help="earlier results to compare with")
+    return parser
+
+
+def main(argv=None) -> int:
+    args = build_parser().parse_args(argv)
+    baseline = None
+    if args.compare:
+        with open(args.compare) as fh:
+            baseline = json.load(fh)
+    targets = baseline_targets(baseline) if baseline and args.target_reward is None else None
+    report = run_benchmarks(args.years, args.workers, args.cases, args.iterations, args.target_reward,
+                            args.optimizer_max_years, args.scratch, progress=lambda r: print(_describe(r)),
+                            targets=targets)
+    with open(args.output, "w") as fh:
+        json.dump(report, fh, indent=2)
+    print(f"results written to {args.output}")
+
+    if baseline is not None:
+        print(f"\nspeed-up over {args.compare} ({baseline['machine'].get('commit') or 'unknown commit'}):")
+        for (case, n_years, n_workers), metric, old, new, speedup in compare(baseline, report):
+            where = f"{n_years:,} years" + (f", workers={n_workers}" if n_workers else "")
+            print(f"  {case:<13}{where:<28}{metric}: {old:,.2f} -> {new:,.2f}  x{speedup:.2f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,212 @@
+"""Content-addressed result cache shared across Streamlit reruns and pages.
+
+Keys are SHA-256 digests of the inputs that determine a result -- the
+portfolio, the simulation parameters and the optimizer settings -- built
+with :func:`content_key`.  Two backends share one interface:
+
+* :class:`MemoryCache` keeps values in-process in LRU order, bounded by
+  entry count and by an estimate of their size in bytes.
+* :class:`DiskCache` pickles values into a directory and evicts the least
+  recently used files once the directory exceeds its byte budget, so
+  results survive server restarts and are shared between processes.
+"""
+
+import hashlib
+import json
+import os
+import pickle
+import sys
+import tempfile
+import threading
+from collections import OrderedDict
+from dataclasses import asdict, is_dataclass
+
+import numpy as np
+import pandas as pd
+
+_MISSING = object()
+
+
+def _feed(digest, value) -> None:
+    if isinstance(value, pd.DataFrame):
+        digest.update(b"df")
+        digest.update(json.dumps([str(c) for c in value.columns]).encode())
+        digest.update(pd.util.hash_pandas_object(value, index=False).to_numpy().tobytes())
+    elif isinstance(value, np.ndarray):
+        digest.update(f"nd{value.dtype.str}{value.shape}".encode())
+        digest.update(np.ascontiguousarray(value).tobytes())
+    elif is_dataclass(value) and not isinstance(value, type):
+        digest.update(type(value).__name__.encode())
+        _feed(digest, asdict(value))
+    elif isinstance(value, dict):
+        digest.update(b"{")
+        for k in sorted(value, key=str):
+            _feed(digest, str(k))
+            _feed(digest, value[k])
+        digest.update(b"}")
+    elif isinstance(value, (list, tuple)):
+        digest.update(b"[")
+        for item in value:
+            _feed(digest, item)
+        digest.update(b"]")
+    elif isinstance(value, (np.integer, np.floating)):
+        _feed(digest, value.item())
+    else:
+        digest.update(repr((type(value).__name__, value)).encode())
+
+
+def content_key(*parts) -> str:
+    """Stable hex digest of DataFrames, arrays, dataclasses and plain values."""
+    digest = hashlib.sha256()
+    for part in parts:
+        _feed(digest, part)
+    return digest.hexdigest()
+
+
+def estimate_size(value) -> int:
+    """Rough in-memory footprint of a cached value, in bytes."""
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(deep=True).sum())
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(estimate_size(v) for v in value.values())
+    if isinstance(value, (list, tuple)):
+        return sys.getsizeof(value) + sum(estimate_size(v) for v in value)
+    if is_dataclass(value) and not isinstance(value, type):
+        return estimate_size(vars(value))
+    return sys.getsizeof(value)
+
+
+class MemoryCache:
+    """In-process LRU cache bounded by entries and estimated bytes."""
+
+    def __init__(self, max_entries: int = 256, max_bytes: int = 512 * 2 ** 20):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._data = OrderedDict()
+        self._sizes = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key not in self._data:
+                return default
+            self._data.move_to_end(key)
+            return self._data[key]
+
+    def put(self, key, value) -> None:
+        size = estimate_size(value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._data:
+                self._bytes -= self._sizes.pop(key)
+                del self._data[key]
+            self._data[key] = value
+            self._sizes[key] = size
+            self._bytes += size
+            while len(self._data) > self.max_entries or self._bytes > self.max_bytes:
+                old, _ = self._data.popitem(last=False)
+                self._bytes -= self._sizes.pop(old)
+
+    def __contains__(self, key) -> bool:
+        with self._lock:
+            return key in self._data
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self._sizes.clear()
+            self._bytes = 0
+
+
+class DiskCache:
+    """Pickle-per-key cache in a directory, evicting least recently used files.
+
+    Recency is the file's modification time, refreshed on every hit, so the
+    policy holds across processes sharing the directory.
+    """
+
+    def __init__(self, root: str = None, max_bytes: int = 2 * 2 ** 30):
+        self.root = root or os.environ.get("RETRO_CACHE_DIR", os.path.join(".retro_store", "cache"))
+        self.max_bytes = max_bytes
+        os.makedirs(self.root, exist_ok=True)
+
+    def _path(self, key) -> str:
+        return os.path.join(self.root, f"{key}.pkl")
+
+    def get(self, key, default=None):
+        path = self._path(key)
+        try:
+            with open(path, "rb") as fh:
+                value = pickle.load(fh)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return default
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return value
+
+    def put(self, key, value) -> None:
+        fd, tmp = tempfile.mkstemp(dir=self.root, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as fh:
+                pickle.dump(value, fh, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, self._path(key))
+        except BaseException:
+            if os.path.exists(tmp):
+                os.unlink(tmp)
+            raise
+        self._evict()
+
+    def _evict(self) -> None:
+        entries = []
+        for entry in os.scandir(self.root):
+            if entry.name.endswith(".pkl"):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.unlink(path)
+            except OSError:
+                continue
+            total -= size
+
+    def __contains__(self, key) -> bool:
+        return os.path.exists(self._path(key))
+
+    def __len__(self) -> int:
+        return sum(1 for name in os.listdir(self.root) if name.endswith(".pkl"))
+
+    def clear(self) -> None:
+        for name in os.listdir(self.root):
+            if name.endswith(".pkl"):
+                os.unlink(os.path.join(self.root, name))
+
+
+def get_or_compute(cache, key, compute):
+    """Return the cached value for ``key``, computing and storing it on a miss."""
+    value = cache.get(key, _MISSING)
+    if value is _MISSING:
+        value = compute()
+        cache.put(key, value)
+    return value
+
+
+def make_cache(backend: str = None, **kwargs):
+    """Build a cache; ``backend`` defaults to ``RETRO_CACHE_BACKEND`` or ``"memory"``."""
+    backend = backend or os.environ.get("RETRO_CACHE_BACKEND", "memory")
+    if backend == "memory":
+        return MemoryCache(**kwargs)
+    if backend == "disk":
+        return DiskCache(**kwargs)
+    raise ValueError(f"Unknown cache backend {backend!r}; expected 'memory' or 'disk'.")
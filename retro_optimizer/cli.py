@@ -0,0 +1,93 @@
+"""Command-line entry point for unattended batch runs.
+
+Example::
+
+    python -m retro_optimizer renewals/2026-01/ results/ --years 100000 --workers 8
+
+Rerunning the same command after a crash resumes from the checkpoints in
+the output directory; see :mod:`.pipeline`.
+"""
+
+import argparse
+import sys
+
+from . import telemetry
+from .parallel import default_workers
+from .pipeline import PipelineConfig, run_batch
+from .pricing import PricingModel
+from .simulation import SimulationParams
+from .variance import SAMPLING_MODES
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="python -m retro_optimizer",
+        description="Simulate, optimize and report retro programs for every portfolio in a directory.",
+    )
+    parser.add_argument("source", help="directory of portfolio CSV/XLSX files")
+    parser.add_argument("output", help="directory for per-portfolio results and metrics.csv")
+    parser.add_argument("--workers", type=int, default=default_workers(),
+                        help="portfolios processed in parallel (default: %(default)s)")
+    parser.add_argument("--store", default=None, help="YLT store directory (default: RETRO_YLT_DIR)")
+    parser.add_argument("--trace", default=None, metavar="PATH",
+                        help="record stage timings to a Trace Event JSON file (needs --workers 1: "
+                             "worker processes keep their own timings)")
+
+    sim = parser.add_argument_group("simulation")
+    sim.add_argument("--years", type=int, default=10_000, help="simulated years per portfolio")
+    sim.add_argument("--seed", type=int, default=2024)
+    sim.add_argument("--copula", choices=("independent", "gaussian", "t"), default="independent")
+    sim.add_argument("--correlation", type=float, default=0.5)
+    sim.add_argument("--t-dof", type=float, default=4.0)
+    sim.add_argument("--clustering", type=float, default=0.0)
+    sim.add_argument("--sampling", choices=SAMPLING_MODES, default="monte_carlo")
+    sim.add_argument("--tail-tilt", type=float, default=0.0)
+
+    opt = parser.add_argument_group("optimization")
+    opt.add_argument("--weights", type=float, nargs=3, default=(0.4, 0.4, 0.2),
+                     metavar=("SURPLUS", "CVAR", "COST"), help="reward priorities")
+    opt.add_argument("--max-premium", type=float, default=20.0, help="premium budget ($M)")
+    opt.add_argument("--capital", type=float, default=150.0, help="capital allocated ($M)")
+    opt.add_argument("--iterations", type=int, default=100, help="training iterations")
+    opt.add_argument("--expense-load", type=float, default=PricingModel.expense_load,
+                     help="premium load on expected layer loss (default: %(default)s)")
+    opt.add_argument("--cost-of-capital", type=float, default=PricingModel.cost_of_capital,
+                     help="premium load on each layer's tail capital (default: %(default)s)")
+    opt.add_argument("--screen", action="store_true",
+                     help="screen candidates with the analytical FFT engine (independent regions only)")
+    return parser
+
+
+def config_from_args(args) -> PipelineConfig:
+    params = SimulationParams(
+        n_years=args.years, seed=args.seed, copula=args.copula, correlation=args.correlation,
+        t_dof=args.t_dof, clustering=args.clustering, sampling=args.sampling, tail_tilt=args.tail_tilt,
+    )
+    return PipelineConfig(params=params, weights=tuple(args.weights), max_premium=args.max_premium,
+                          capital=args.capital, iterations=args.iterations, screen=args.screen,
+                          pricing=PricingModel(expense_load=args.expense_load,
+                                               cost_of_capital=args.cost_of_capital))
+
+
+def main(argv=None) -> int:
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.trace and args.workers > 1:
+        parser.error("--trace records only this process; run it with --workers 1")
+    if args.trace:
+        telemetry.enable()
+
+    def progress(report):
+        if "error" in report:
+            print(f"FAILED {report['portfolio']}: {report['error']}", file=sys.stderr)
+        else:
+            print(f"done   {report['portfolio']}: ROI {report['roi']:.1f}%, "
+                  f"net CVaR ${report['net_cvar']:,.1f}M ({report['elapsed']:.1f}s)")
+
+    metrics = run_batch(args.source, args.output, config_from_args(args), workers=args.workers,
+                        store_root=args.store, progress=progress)
+    failed = int(metrics["error"].notna().sum()) if "error" in metrics else 0
+    if args.trace:
+        telemetry.write_trace(args.trace)
+    print(f"{len(metrics) - failed}/{len(metrics)} portfolios completed; metrics in {args.output}")
+    return 1 if failed else 0
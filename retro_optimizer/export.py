@@ -0,0 +1,341 @@
+"""Strategy packet export (Step 5 download).
+
+A packet is a PDF for people -- key metrics, the retro structure, the risk
+vs. return frontier and the draft treaty wording -- plus the program's
+recoveries in every simulated year for machines, as CSV or Parquet.
+
+Each PDF section is rendered into plain, picklable content (table cells,
+text, a PNG of the chart) and stored in the result cache under a content
+key of exactly the inputs it shows.  A rebuild therefore redraws only the
+sections that changed -- a new premium budget leaves the frontier chart
+alone, a new catalog leaves the wording alone -- and laying out cached
+sections with reportlab takes milliseconds.  The finished PDF is cached
+under the key of all its sections.
+
+Recovery files are written ``EXPORT_CHUNK_YEARS`` years at a time, read
+straight from the memory-mapped catalog, so memory stays flat whatever the
+catalog size.  They live in an export directory under their content key, so
+a file already on disk is reused as it is, and the least recently used are
+removed once the directory outgrows ``MAX_EXPORT_BYTES``.
+"""
+
+import io
+import os
+import tempfile
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from . import telemetry
+from .cache import content_key, get_or_compute
+from .layers import LossBasis, ProgramBatch, program_recoveries
+from .metrics import net_losses, return_on_risk_capital
+from .pipeline import program_metrics, structure_table
+from .simulation import chunk_bounds
+from .ylt import open_ylt
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:     # optional: only CSV recovery files without it
+    pa = None
+
+# Bumped when the rendered sections or files change, so caches miss.
+EXPORT_FORMAT = 1
+# Simulated years converted and written per chunk of a recovery file.
+EXPORT_CHUNK_YEARS = 1 << 18
+# Size of the export directory above which the oldest files are removed.
+MAX_EXPORT_BYTES = 4 * 2 ** 30
+DATA_FORMATS = ("csv", "parquet") if pa is not None else ("csv",)
+
+TITLE = "Retrocession Strategy Packet"
+
+
+def default_export_root() -> str:
+    """Export location, overridable with the ``RETRO_EXPORT_DIR`` variable."""
+    return os.environ.get("RETRO_EXPORT_DIR", os.path.join(".retro_store", "exports"))
+
+
+def treaty_wording(program: ProgramBatch, row: int = 0) -> str:
+    """First-pass treaty language for the XoL / ILW / Sidecar layout (Step 4)."""
+    xol, ilw, sidecar = program.layers(row)
+    return f"""Retrocession Agreement — Draft Language:
+
+1. XoL Layer: The Reinsurer agrees to cede losses in excess of ${xol.retention:,.0f} million up to a limit
+   of ${xol.limit:,.0f} million for the Property CAT portfolio concentrated in Florida and Gulf Coast territories.
+
+2. ILW Trigger: An Industry Loss Warranty will activate upon aggregate insured losses exceeding
+   ${ilw.trigger / 1000:,.0f} billion for a named U.S. windstorm season, providing up to ${ilw.limit:,.0f} million coverage.
+
+3. Sidecar Participation: Up to ${sidecar.limit:,.0f} million of additional capital will be sourced via a Sidecar
+   vehicle, attaching at the ${sidecar.retention:,.0f} million portfolio-level loss point, with a {sidecar.share:.0%} quota
+   share ceded."""
+
+
+@dataclass(frozen=True, eq=False)
+class PacketContent:
+    """Everything a strategy packet shows; sections without their inputs are left out."""
+
+    program: ProgramBatch           # priced one-row program
+    payouts: np.ndarray = None      # expected recovery per layer ($M)
+    ylt_path: str = None            # stored catalog the metrics are measured on
+    capital: float = 150.0
+    frontier_cvar: np.ndarray = None
+    frontier_roi: np.ndarray = None
+    chosen: tuple = None            # (CVaR, ROI) of the program, marked on the frontier
+
+    def section_keys(self) -> dict:
+        """Cache key of every section, in packet order."""
+        program = self.program[:1]
+        keys = {}
+        if self.ylt_path is not None:
+            keys["metrics"] = content_key("packet-metrics", EXPORT_FORMAT, self.ylt_path, program, self.capital)
+        keys["structure"] = content_key("packet-structure", EXPORT_FORMAT, program, self.payouts)
+        if self.frontier_cvar is not None:
+            keys["frontier"] = content_key("packet-frontier", EXPORT_FORMAT, self.frontier_cvar,
+                                           self.frontier_roi, self.chosen)
+        keys["wording"] = content_key("packet-wording", EXPORT_FORMAT, program)
+        return keys
+
+    @property
+    def key(self) -> str:
+        return _packet_key(self.section_keys())
+
+
+def _packet_key(section_keys: dict) -> str:
+    return content_key("packet", EXPORT_FORMAT, section_keys)
+
+
+@dataclass(frozen=True)
+class Packet:
+    """A rendered strategy packet and the sections this build had to render."""
+
+    key: str
+    pdf: bytes
+    rebuilt: tuple
+
+
+def _money(value: float, places: int = 1) -> str:
+    return f"${value:,.{places}f}M"
+
+
+def metrics_section(content: PacketContent) -> dict:
+    ylt = open_ylt(content.ylt_path)
+    program = content.program[:1]
+    surplus, tail_loss = program_metrics(ylt, program, content.capital)
+    return {
+        "title": "Key Performance Metrics",
+        "intro": f"Measured on a stored catalog of {ylt.n_years:,} simulated years (seed {ylt.params.seed}) "
+                 f"with {_money(content.capital, 0)} of allocated capital.",
+        "table": [
+            ["Metric", "Description", "Value"],
+            ["Expected Surplus", "Projected capital retained after losses & premiums", _money(surplus)],
+            ["Tail Risk (CVaR 99%)", "Estimated capital needed in worst 1% of years", _money(tail_loss)],
+            ["Total Premium", "Modeled cost of retrocession program", _money(float(program.premiums.sum()))],
+            ["Return on Risk Capital", "ROI across simulations (post-protection)",
+             f"{return_on_risk_capital(surplus, tail_loss):.1f}%"],
+        ],
+    }
+
+
+def structure_section(content: PacketContent) -> dict:
+    table = structure_table(content.program, payouts=content.payouts)
+    cells = [[cover] + [_money(v, 2 if "Premium" in column else 1) for column, v in zip(table.columns[1:], row)]
+             for cover, *row in table.itertuples(index=False)]
+    return {"title": "Final Retrocession Structure", "table": [list(table.columns)] + cells}
+
+
+def frontier_section(content: PacketContent) -> dict:
+    # Figure without pyplot, so jobs on other threads can draw concurrently.
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+
+    fig = Figure(figsize=(6.5, 4.0), dpi=150)
+    FigureCanvasAgg(fig)
+    ax = fig.add_subplot()
+    ax.scatter(content.frontier_cvar, content.frontier_roi, color="teal", s=18, label="Pareto-efficient programs")
+    if content.chosen is not None:
+        ax.scatter(*content.chosen, color="crimson", marker="*", s=160, label="Recommended program")
+    ax.legend()
+    ax.set_xlabel("Tail Risk (CVaR 99%) [$M]")
+    ax.set_ylabel("Return on Risk Capital [%]")
+    ax.set_title("Efficient Frontier: Risk vs. Reward")
+    ax.grid(True)
+    fig.tight_layout()
+    png = io.BytesIO()
+    fig.savefig(png, format="png")
+    return {"title": "Risk vs. Return Frontier", "image": png.getvalue()}
+
+
+def wording_section(content: PacketContent) -> dict:
+    return {
+        "title": "Draft Treaty Wording",
+        "code": treaty_wording(content.program),
+        "note": "This wording is a first-pass draft. Legal teams and brokers should customize and validate "
+                "before use in contracts.",
+    }
+
+
+SECTIONS = {
+    "metrics": metrics_section,
+    "structure": structure_section,
+    "frontier": frontier_section,
+    "wording": wording_section,
+}
+
+
+def render_pdf(sections) -> bytes:
+    """Lay out rendered sections as a PDF."""
+    from reportlab.lib import colors
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib.styles import getSampleStyleSheet
+    from reportlab.lib.units import cm
+    from reportlab.platypus import Image, Paragraph, Preformatted, SimpleDocTemplate, Spacer, Table, TableStyle
+
+    styles = getSampleStyleSheet()
+    grid = TableStyle([
+        ("BACKGROUND", (0, 0), (-1, 0), colors.HexColor("#1f4e79")),
+        ("TEXTCOLOR", (0, 0), (-1, 0), colors.white),
+        ("FONTNAME", (0, 0), (-1, 0), "Helvetica-Bold"),
+        ("GRID", (0, 0), (-1, -1), 0.5, colors.grey),
+        ("ROWBACKGROUNDS", (0, 1), (-1, -1), [colors.white, colors.HexColor("#eef3f8")]),
+        ("FONTSIZE", (0, 0), (-1, -1), 9),
+    ])
+    story = [Paragraph(TITLE, styles["Title"])]
+    for section in sections:
+        story += [Paragraph(section["title"], styles["Heading2"])]
+        if "intro" in section:
+            story += [Paragraph(section["intro"], styles["BodyText"]), Spacer(1, 0.2 * cm)]
+        if "table" in section:
+            story += [Table(section["table"], style=grid, hAlign="LEFT")]
+        if "image" in section:
+            story += [Image(io.BytesIO(section["image"]), width=16 * cm, height=16 * cm * 4.0 / 6.5)]
+        if "code" in section:
+            story += [Preformatted(section["code"], styles["Code"], maxLineLength=110)]
+        if "note" in section:
+            story += [Paragraph(section["note"], styles["Italic"])]
+        story += [Spacer(1, 0.5 * cm)]
+    out = io.BytesIO()
+    SimpleDocTemplate(out, pagesize=A4, title=TITLE, leftMargin=2 * cm, rightMargin=2 * cm).build(story)
+    return out.getvalue()
+
+
+def build_packet(content: PacketContent, cache, progress=None) -> Packet:
+    """Render the packet, reusing every section ``cache`` already holds.
+
+    ``progress(name)`` is called before a section is rendered.
+    """
+    keys = content.section_keys()
+    rebuilt = []
+
+    def render(name):
+        def compute():
+            if progress is not None:
+                progress(name)
+            rebuilt.append(name)
+            with telemetry.span("packet.section", section=name):
+                return SECTIONS[name](content)
+        return compute
+
+    packet_key = _packet_key(keys)
+    cached = cache.get(packet_key)
+    if cached is not None:
+        return Packet(packet_key, cached, ())
+    sections = [get_or_compute(cache, key, render(name)) for name, key in keys.items()]
+    with telemetry.span("packet.pdf", sections=len(sections), rebuilt=len(rebuilt)):
+        pdf = render_pdf(sections)
+    cache.put(packet_key, pdf)
+    telemetry.count("packet_sections_rendered", len(rebuilt))
+    return Packet(packet_key, pdf, tuple(rebuilt))
+
+
+def recovery_frames(ylt, program: ProgramBatch, chunk_years: int = EXPORT_CHUNK_YEARS):
+    """Year-by-year gross loss, layer recoveries and net loss of ``program``, in chunks."""
+    layers = program.layers()
+    for start, stop in chunk_bounds(ylt.n_years, chunk_years):
+        basis = LossBasis.from_ylt(ylt[start:stop])
+        recoveries = program_recoveries(basis, layers)
+        total = recoveries.sum(axis=0)
+        frame = pd.DataFrame({"Year": np.arange(start + 1, stop + 1), "Gross Loss ($M)": basis.total})
+        for layer, recovery in zip(layers, recoveries):
+            frame[f"{layer.cover} Recovery ($M)"] = recovery
+        frame["Total Recovery ($M)"] = total
+        frame["Net Loss ($M)"] = net_losses(basis.total, total)
+        if basis.weights is not None:
+            frame["Weight"] = basis.weights
+        yield frame
+
+
+def write_recoveries(path: str, ylt, program: ProgramBatch, data_format: str = "csv", progress=None) -> None:
+    """Stream :func:`recovery_frames` into a CSV or Parquet file at ``path``.
+
+    ``progress(years)`` is called after each chunk with the years written.
+    """
+    if data_format not in DATA_FORMATS:
+        raise ValueError(f"Unsupported data format {data_format!r}; expected one of {DATA_FORMATS}.")
+    fd, tmp = tempfile.mkstemp(prefix=".partial-", dir=os.path.dirname(path) or ".")
+    os.close(fd)
+    written = 0
+    try:
+        if data_format == "csv":
+            # savetxt formats a chunk about twice as fast as DataFrame.to_csv.
+            with open(tmp, "w", newline="") as fh:
+                for frame in recovery_frames(ylt, program):
+                    np.savetxt(fh, frame.to_numpy(np.float64), fmt=["%d"] + ["%.4f"] * (frame.shape[1] - 1),
+                               delimiter=",", header=",".join(frame.columns) if written == 0 else "", comments="")
+                    written += len(frame)
+                    if progress is not None:
+                        progress(written)
+        else:
+            writer = None
+            try:
+                for frame in recovery_frames(ylt, program):
+                    table = pa.Table.from_pandas(frame, preserve_index=False)
+                    if writer is None:
+                        writer = pq.ParquetWriter(tmp, table.schema)
+                    writer.write_table(table)
+                    written += len(frame)
+                    if progress is not None:
+                        progress(written)
+            finally:
+                if writer is not None:
+                    writer.close()
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+        raise
+
+
+def _prune(root: str, max_bytes: int) -> None:
+    entries = []
+    for entry in os.scandir(root):
+        if entry.is_file() and not entry.name.startswith(".partial-"):
+            stat = entry.stat()
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            os.unlink(path)
+        except OSError:
+            continue
+        total -= size
+
+
+def export_recoveries(ylt_path: str, program: ProgramBatch, data_format: str = "csv", root: str = None,
+                      progress=None) -> str:
+    """Path of the recovery file of ``program`` on the catalog, writing it unless already exported."""
+    root = root or default_export_root()
+    os.makedirs(root, exist_ok=True)
+    key = content_key("recoveries", EXPORT_FORMAT, ylt_path, program[:1])
+    path = os.path.join(root, f"recoveries-{key[:20]}.{data_format}")
+    if os.path.exists(path):
+        os.utime(path)
+        return path
+    with telemetry.span("export.recoveries", format=data_format):
+        write_recoveries(path, open_ylt(ylt_path), program[:1], data_format, progress)
+    _prune(root, MAX_EXPORT_BYTES)
+    return path
@@ -0,0 +1,169 @@
+"""Efficient-frontier sweep over retro programs (Step 3 risk vs. return chart).
+
+Candidate programs are drawn over the :class:`~retro_optimizer.rl.RetroEnv`
+action space and scored in batches on a thread pool -- NumPy releases the
+GIL in the heavy array work and threads share the catalog without copying
+it.  After every batch the survivors are merged into a Pareto archive over
+three objectives: maximise expected surplus, minimise net CVaR and minimise
+premium.  A few refinement rounds then mutate archive members to fill in
+the front.
+
+Every linear reward the Step 3 sliders can express is maximised by some
+program on that front, so the best program for any ``(weights, budget)``
+setting is found by scoring the front alone (:meth:`Frontier.best`).
+Moving a slider therefore re-scores a few hundred programs instead of
+retraining.
+The archive is kept sorted by action, so the front does not depend on the
+order in which parallel batches finish.
+"""
+
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass
+
+import numpy as np
+
+from . import telemetry
+from .metrics import return_on_risk_capital
+from .parallel import default_workers
+
+BUDGET_RANGE = tuple(range(10, 31))     # the Step 3 max_premium slider, $M
+# Upper bound on (programs x years) cells scored per batch, ~128 MB of float32.
+MAX_BATCH_CELLS = 1 << 25
+
+
+def pareto_mask(costs) -> np.ndarray:
+    """Boolean mask of the non-dominated rows of ``costs`` (all minimised).
+
+    Each pass keeps the current point and drops everything it dominates, so
+    the cost is about ``n * front_size`` comparisons.  Exact duplicates are
+    collapsed to one point.
+    """
+    costs = np.asarray(costs, dtype=np.float64)
+    order = np.argsort(costs.sum(axis=1), kind="stable")
+    remaining = order
+    pool = costs[order]
+    i = 0
+    while i < len(pool):
+        keep = np.any(pool < pool[i], axis=1)
+        keep[i] = True
+        remaining, pool = remaining[keep], pool[keep]
+        i = int(keep[:i].sum()) + 1
+    mask = np.zeros(len(costs), dtype=bool)
+    mask[remaining] = True
+    return mask
+
+
+@dataclass
+class Frontier:
+    """Non-dominated programs, one entry per program."""
+
+    actions: np.ndarray
+    surplus: np.ndarray
+    cvar: np.ndarray
+    premium: np.ndarray
+
+    def __len__(self) -> int:
+        return len(self.surplus)
+
+    @property
+    def roi(self) -> np.ndarray:
+        return return_on_risk_capital(self.surplus, self.cvar)
+
+    def best(self, env, weights, max_premium) -> int:
+        """Index of the front's best program for a slider setting, or -1."""
+        total = sum(weights)
+        weights = tuple(w / total for w in weights) if total > 0 else env.weights
+        reward, feasible = env.reward(self.surplus, self.cvar, self.premium, weights, max_premium)
+        if not feasible.any():
+            return -1
+        return int(np.argmax(np.where(feasible, reward, -np.inf)))
+
+
+def _score(env, actions):
+    evaluation = env.evaluate(env.decode(actions))
+    return actions, evaluation.surplus, evaluation.cvar, evaluation.premium
+
+
+def _merge(archive, batch, max_budget):
+    if archive is not None:
+        batch = tuple(np.concatenate(pair) for pair in zip(archive, batch))
+    # Sorting by action first makes the survivors -- including which of two
+    # programs with identical objectives is kept -- independent of the order
+    # batches arrive in.
+    order = np.lexsort(batch[0].T[::-1])
+    affordable = batch[3][order] <= max_budget
+    actions, surplus, tail, premium = (x[order][affordable] for x in batch)
+    mask = pareto_mask(np.column_stack([-surplus, tail, premium]))
+    return actions[mask], surplus[mask], tail[mask], premium[mask]
+
+
+def _latin_hypercube(rng, n: int, dim: int) -> np.ndarray:
+    cells = np.argsort(rng.random((dim, n)), axis=1).T
+    return (cells + rng.random((n, dim))) / n
+
+
+def sweep(env, candidates, batch_size: int = 256, workers: int = None, archive=None,
+          max_budget: float = max(BUDGET_RANGE), progress=None):
+    """Score ``candidates`` in parallel batches and fold them into ``archive``.
+
+    ``progress(n_scored)`` is called as each batch is merged; if it raises,
+    pending batches are cancelled.
+    """
+    workers = workers or default_workers()
+    batch_size = max(1, min(batch_size, MAX_BATCH_CELLS // env.basis.n_years))
+    batches = [candidates[i:i + batch_size] for i in range(0, len(candidates), batch_size)]
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(_score, env, b) for b in batches]
+        try:
+            for future in as_completed(futures):
+                batch = future.result()
+                archive = _merge(archive, batch, max_budget)
+                if progress is not None:
+                    progress(len(batch[0]))
+        except BaseException:
+            for future in futures:
+                future.cancel()
+            raise
+    return archive
+
+
+def frontier_size(n_candidates: int = 2048, refine_rounds: int = 2) -> int:
+    """Number of programs :func:`build_frontier` scores."""
+    return 1 + n_candidates + refine_rounds * (n_candidates // 2)
+
+
+def build_frontier(env, n_candidates: int = 2048, refine_rounds: int = 2, batch_size: int = 256,
+                   workers: int = None, seed: int = 0, budgets=BUDGET_RANGE, progress=None):
+    """Search the program space and return its :class:`Frontier`, sorted by action.
+
+    Programs above the largest of ``budgets`` are never kept.
+    ``progress(programs_scored)`` is called as batches finish, out of
+    :func:`frontier_size` in total.
+    """
+    with telemetry.span("frontier", candidates=n_candidates, rounds=refine_rounds):
+        return _build_frontier(env, n_candidates, refine_rounds, batch_size, workers, seed, budgets, progress)
+
+
+def _build_frontier(env, n_candidates, refine_rounds, batch_size, workers, seed, budgets, progress):
+    rng = np.random.default_rng(seed)
+    max_budget = float(max(budgets))
+
+    # Buying nothing is always affordable and anchors the cheap end.
+    candidates = np.vstack([np.zeros((1, env.action_dim)),
+                            _latin_hypercube(rng, n_candidates, env.action_dim)])
+    scored = 0
+
+    def report(n):
+        nonlocal scored
+        scored += n
+        if progress is not None:
+            progress(scored)
+
+    archive = sweep(env, candidates, batch_size, workers, max_budget=max_budget, progress=report)
+    for round_ in range(refine_rounds):
+        parents = archive[0][rng.integers(0, len(archive[0]), n_candidates // 2)]
+        scale = 0.1 / (round_ + 1)
+        children = np.clip(parents + scale * rng.standard_normal(parents.shape), 0.0, 1.0)
+        archive = sweep(env, children, batch_size, workers, archive, max_budget, progress=report)
+
+    return Frontier(*archive)
@@ -0,0 +1,240 @@
+"""Bulk portfolio ingestion for Step 1 uploads.
+
+Location-level books are parsed in fixed-size chunks so time and memory
+grow linearly with the row count.  CSV files go through the pyarrow
+streaming reader when pyarrow is installed (falling back to chunked
+``pandas.read_csv``); XLSX files are walked row by row with ``openpyxl``
+in read-only mode.  Only the recognised columns are kept: header aliases
+are mapped onto the display names in :mod:`.portfolio`, regions and lines
+of business become categoricals and amounts become float32.
+
+Amounts are taken to be in $M, like the sample portfolio.
+"""
+
+import re
+
+import numpy as np
+import pandas as pd
+
+from .portfolio import EXPECTED_LOSS, LINE_OF_BUSINESS, REGION, TIV
+
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pa_csv
+except ImportError:     # optional: chunked pandas parsing is used instead
+    pa = None
+
+CHUNK_ROWS = 100_000
+UNSPECIFIED_LOB = "Unspecified"
+
+# Accepted spellings of each column, compared after normalising case,
+# whitespace, punctuation and a trailing unit such as "($M)".
+COLUMN_ALIASES = {
+    REGION: ("region", "territory", "zone", "cresta"),
+    TIV: ("tiv", "total insured value", "insured value", "sum insured", "exposure"),
+    EXPECTED_LOSS: ("expected loss", "el", "aal", "average annual loss", "pml"),
+    LINE_OF_BUSINESS: ("line of business", "lob", "line", "business line"),
+}
+REQUIRED_COLUMNS = (REGION, TIV, EXPECTED_LOSS)
+CATEGORY_COLUMNS = (REGION, LINE_OF_BUSINESS)
+AMOUNT_COLUMNS = (TIV, EXPECTED_LOSS)
+
+
+def _normalise(name) -> str:
+    name = re.sub(r"\(.*?\)|\$|usd|\bm\b", " ", str(name).lower())
+    return " ".join(re.sub(r"[^a-z0-9]+", " ", name).split())
+
+
+_ALIAS_LOOKUP = {alias: column for column, aliases in COLUMN_ALIASES.items() for alias in aliases}
+
+
+def resolve_columns(header) -> dict:
+    """Map source header names onto canonical column names.
+
+    The first header matching each canonical column wins; unrecognised
+    columns are ignored.  Raises ``ValueError`` if a required column is
+    missing.
+    """
+    mapping = {}
+    for name in header:
+        column = _ALIAS_LOOKUP.get(_normalise(name))
+        if column is not None and column not in mapping.values():
+            mapping[name] = column
+    missing = [c for c in REQUIRED_COLUMNS if c not in mapping.values()]
+    if missing:
+        raise ValueError(
+            f"Missing required column(s) {missing}. Accepted headers: "
+            + "; ".join(f"{c}: {', '.join(COLUMN_ALIASES[c])}" for c in missing)
+        )
+    return mapping
+
+
+def _category(values: pd.Series, fill=None) -> pd.Categorical:
+    # Strip labels on the (small) category index rather than on every row.
+    if not isinstance(values.dtype, pd.CategoricalDtype):
+        values = values.astype("category")
+    labels = values.cat.categories.astype(str).str.strip()
+    labels = pd.Categorical(labels.where(labels != ""))
+    codes = values.cat.codes.to_numpy()
+    codes = np.where(codes >= 0, labels.codes[np.maximum(codes, 0)] if len(labels) else -1, -1)
+    out = pd.Categorical.from_codes(codes, categories=labels.categories)
+    if fill is not None and (codes < 0).any():
+        out = out.add_categories([fill]).fillna(fill) if fill not in out.categories else out.fillna(fill)
+    return out
+
+
+def _compact(chunk: pd.DataFrame, mapping: dict, rows) -> pd.DataFrame:
+    # ``rows`` are the chunk's row numbers in the source file, kept as index.
+    chunk = chunk.rename(columns=mapping)
+    out = {column: pd.to_numeric(chunk[column], errors="coerce").to_numpy(np.float32)
+           for column in AMOUNT_COLUMNS}
+    out[REGION] = _category(chunk[REGION])
+    out[LINE_OF_BUSINESS] = (_category(chunk[LINE_OF_BUSINESS], fill=UNSPECIFIED_LOB)
+                             if LINE_OF_BUSINESS in chunk
+                             else pd.Categorical.from_codes(np.zeros(len(chunk), dtype=np.int8), [UNSPECIFIED_LOB]))
+    return pd.DataFrame(out, columns=[REGION, TIV, EXPECTED_LOSS, LINE_OF_BUSINESS], index=rows)
+
+
+def _concat(chunks) -> pd.DataFrame:
+    if not chunks:
+        raise ValueError("The uploaded file contains no data rows.")
+    out = {}
+    for column in chunks[0].columns:
+        if column in CATEGORY_COLUMNS:
+            out[column] = pd.api.types.union_categoricals([c[column] for c in chunks])
+        else:
+            out[column] = np.concatenate([c[column].to_numpy() for c in chunks])
+    return pd.DataFrame(out)
+
+
+def _csv_chunks_arrow(source, chunk_rows):
+    header = pa_csv.open_csv(source, read_options=pa_csv.ReadOptions(block_size=1 << 16)).schema.names
+    if hasattr(source, "seek"):
+        source.seek(0)
+    mapping = resolve_columns(header)
+    convert = pa_csv.ConvertOptions(
+        include_columns=list(mapping),
+        column_types={name: pa.dictionary(pa.int32(), pa.string()) if column in CATEGORY_COLUMNS
+                      else pa.float32() for name, column in mapping.items()},
+        strings_can_be_null=True,
+    )
+    first = 2
+    try:
+        # ~100 bytes per row is typical for location-level extracts.  The
+        # first block is converted on open, so a bad value can raise here.
+        reader = pa_csv.open_csv(source, read_options=pa_csv.ReadOptions(block_size=max(chunk_rows * 100, 1 << 20)),
+                                 convert_options=convert)
+        for batch in reader:
+            yield _compact(batch.to_pandas(), mapping, np.arange(first, first + batch.num_rows))
+            first += batch.num_rows
+    except pa.ArrowInvalid as exc:
+        raise ValueError(f"Could not parse the uploaded CSV: {exc}") from None
+
+
+def _csv_chunks_pandas(source, chunk_rows):
+    header = pd.read_csv(source, nrows=0).columns
+    if hasattr(source, "seek"):
+        source.seek(0)
+    mapping = resolve_columns(header)
+    for chunk in pd.read_csv(source, usecols=list(mapping), chunksize=chunk_rows,
+                             dtype={name: "string" for name in mapping}):
+        yield _compact(chunk, mapping, chunk.index.to_numpy() + 2)
+
+
+def _xlsx_chunks(source, chunk_rows):
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(source, read_only=True, data_only=True)
+    try:
+        sheet = workbook.worksheets[0]
+        header = next(sheet.iter_rows(max_row=1, values_only=True), None)
+        if header is None:
+            return
+        mapping = resolve_columns([h for h in header if h is not None])
+        keep = [i for i, name in enumerate(header) if name in mapping]
+        names = [header[i] for i in keep]
+        # Cell parsing dominates XLSX ingestion, so stop at the last used column.
+        rows = sheet.iter_rows(min_row=2, max_col=max(keep) + 1, values_only=True)
+        buffer, numbers = [], []
+        for number, row in enumerate(rows, start=2):
+            if row is None or all(v is None for v in row):
+                continue
+            buffer.append([row[i] if i < len(row) else None for i in keep])
+            numbers.append(number)
+            if len(buffer) >= chunk_rows:
+                yield _compact(pd.DataFrame(buffer, columns=names), mapping, numbers)
+                buffer, numbers = [], []
+        if buffer:
+            yield _compact(pd.DataFrame(buffer, columns=names), mapping, numbers)
+    finally:
+        workbook.close()
+
+
+def iter_portfolio_chunks(source, name: str = None, chunk_rows: int = CHUNK_ROWS):
+    """Yield compact canonical DataFrames of at most about ``chunk_rows`` rows.
+
+    ``source`` is a path or binary file object (such as a Streamlit upload);
+    ``name`` picks the format by extension and defaults to the source's own.
+    Chunks are indexed by their row numbers in the file, the header being
+    row 1: sheet rows for XLSX, where blank rows are skipped but counted,
+    and data lines for CSV.
+    """
+    name = name or getattr(source, "name", None) or str(source)
+    if name.lower().endswith((".xlsx", ".xlsm")):
+        yield from _xlsx_chunks(source, chunk_rows)
+    elif pa is not None:
+        yield from _csv_chunks_arrow(source, chunk_rows)
+    else:
+        yield from _csv_chunks_pandas(source, chunk_rows)
+
+
+def validate_portfolio(portfolio: pd.DataFrame, file_rows=None) -> pd.DataFrame:
+    """Check an ingested portfolio, raising ``ValueError`` on the first problem.
+
+    ``file_rows`` gives each row's number in the source file for the error
+    messages; by default rows follow a single header row.
+    """
+    file_rows = np.arange(2, len(portfolio) + 2) if file_rows is None else np.asarray(file_rows)
+
+    def rows(mask):
+        first = file_rows[np.flatnonzero(mask)[:5]]
+        return f"{int(mask.sum()):,} row(s), e.g. file rows {', '.join(map(str, first))}"
+
+    if portfolio[REGION].isna().any():
+        raise ValueError(f"Missing region in {rows(portfolio[REGION].isna().to_numpy())}.")
+    for column in AMOUNT_COLUMNS:
+        values = portfolio[column].to_numpy()
+        if not np.isfinite(values).all():
+            raise ValueError(f"Non-numeric or missing {column} in {rows(~np.isfinite(values))}.")
+        if (values < 0).any():
+            raise ValueError(f"Negative {column} in {rows(values < 0)}.")
+    excess = portfolio[EXPECTED_LOSS].to_numpy() > portfolio[TIV].to_numpy()
+    if excess.any():
+        raise ValueError(f"{EXPECTED_LOSS} exceeds {TIV} in {rows(excess)}.")
+    # The event model needs positive exposure and loss in every region.
+    totals = portfolio.groupby(REGION, sort=False, observed=True)[list(AMOUNT_COLUMNS)].sum()
+    for column in AMOUNT_COLUMNS:
+        empty = totals.index[totals[column].to_numpy() <= 0]
+        if len(empty):
+            raise ValueError(f"Zero total {column} in region(s) {', '.join(map(str, empty[:5]))}; "
+                             "remove them or give them exposure.")
+    return portfolio
+
+
+def read_portfolio(source, name: str = None, chunk_rows: int = CHUNK_ROWS) -> pd.DataFrame:
+    """Parse and validate an uploaded portfolio into compact canonical columns."""
+    chunks = list(iter_portfolio_chunks(source, name, chunk_rows))
+    portfolio = _concat(chunks)
+    return validate_portfolio(portfolio, np.concatenate([c.index.to_numpy() for c in chunks]))
+
+
+def exposure_table(portfolio: pd.DataFrame, by=(REGION, LINE_OF_BUSINESS)) -> pd.DataFrame:
+    """Sum TIV and expected loss by ``by``, with the number of locations.
+
+    The result keeps the portfolio's column names, so an aggregated table
+    can be fed to the simulation in place of the location-level rows.
+    """
+    grouped = portfolio.groupby(list(by), sort=False, observed=True)
+    table = grouped[list(AMOUNT_COLUMNS)].sum().astype(np.float64)
+    table["Locations"] = grouped.size()
+    return table.reset_index()
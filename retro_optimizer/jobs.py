@@ -0,0 +1,249 @@
+"""Background jobs for long simulations, frontier sweeps and training runs.
+
+The Streamlit script thread only submits work and polls it: a
+:class:`JobManager` runs job functions on a bounded thread pool and keeps
+each :class:`Job`'s status, progress and result under a short id that a
+page stores in ``st.session_state``.  The manager is meant to be created
+once per server (``st.cache_resource``) so every session queues on the same
+pool instead of each starting its own CPU-bound computation; NumPy releases
+the GIL inside the heavy array operations, and catalog simulation can still
+fan out to worker processes from inside a job.
+
+Job functions take the :class:`Job` as their first argument and call
+:meth:`Job.report` as they go.  Cancelling is cooperative: the next
+``report`` raises :class:`JobCancelled`, which unwinds the function (the
+YLT store discards partial catalogs on the way) and marks the job
+cancelled.
+"""
+
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import replace
+
+from . import telemetry
+from .export import build_packet, export_recoveries
+from .frontier import build_frontier, frontier_size
+from .layers import LossBasis
+from .metrics import StreamingTail
+from .parallel import default_workers
+from .pipeline import strategy_from_training
+from .rl import RetroEnv, train
+from .ylt import open_ylt, simulate_to_store, stream_to_store
+
+QUEUED, RUNNING, DONE, FAILED, CANCELLED = "queued", "running", "done", "failed", "cancelled"
+FINISHED = (DONE, FAILED, CANCELLED)
+
+# Finished jobs kept for polling before the oldest are forgotten.
+MAX_FINISHED_JOBS = 256
+# A converging simulation checks its CVaR about this many times per run, on
+# chunks of at least CONVERGENCE_MIN_CHUNK years.
+CONVERGENCE_CHECKS = 20
+CONVERGENCE_MIN_CHUNK = 1_000
+
+
+class JobCancelled(Exception):
+    """Raised inside a job function once cancellation has been requested."""
+
+
+def default_job_workers() -> int:
+    """Pool size, overridable with the ``RETRO_JOB_WORKERS`` variable."""
+    return int(os.environ.get("RETRO_JOB_WORKERS", 0)) or max(1, default_workers() // 2)
+
+
+class Job:
+    """Status, progress and outcome of one submitted function."""
+
+    def __init__(self, kind: str, label: str = "", total: float = None):
+        self.id = uuid.uuid4().hex[:12]
+        self.kind = kind
+        self.label = label
+        self.status = QUEUED
+        self.done = 0.0
+        self.total = total
+        self.detail = ""
+        self.result = None
+        self.error = None
+        self.submitted = time.time()
+        self.started = None
+        self.finished = None
+        self._cancel = threading.Event()
+
+    def report(self, done: float = None, detail: str = None) -> None:
+        """Record progress; raises :class:`JobCancelled` once cancelled."""
+        if done is not None:
+            self.done = done
+        if detail is not None:
+            self.detail = detail
+        if self._cancel.is_set():
+            raise JobCancelled()
+
+    def cancel(self) -> None:
+        self._cancel.set()
+
+    @property
+    def cancel_requested(self) -> bool:
+        return self._cancel.is_set()
+
+    @property
+    def fraction(self) -> float:
+        """Share of the work done, in ``[0, 1]``; 0 when the total is unknown."""
+        if not self.total:
+            return 0.0
+        return min(max(self.done / self.total, 0.0), 1.0)
+
+    @property
+    def active(self) -> bool:
+        return self.status not in FINISHED
+
+    @property
+    def elapsed(self) -> float:
+        if self.started is None:
+            return 0.0
+        return (self.finished or time.time()) - self.started
+
+    def _run(self, fn, args, kwargs) -> None:
+        if self._cancel.is_set():
+            self.status, self.finished = CANCELLED, time.time()
+            return
+        self.status, self.started = RUNNING, time.time()
+        try:
+            with telemetry.span("job", kind=self.kind):
+                self.result = fn(self, *args, **kwargs)
+            self.status = DONE
+        except JobCancelled:
+            self.status = CANCELLED
+        except Exception as exc:     # surfaced to the page through .error
+            self.error = exc
+            self.status = FAILED
+        finally:
+            self.finished = time.time()
+
+
+class JobManager:
+    """Bounded thread pool plus a registry of the jobs submitted to it."""
+
+    def __init__(self, max_workers: int = None):
+        self.max_workers = max_workers or default_job_workers()
+        self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="retro-job")
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+
+    def submit(self, kind: str, fn, *args, label: str = "", total: float = None, **kwargs) -> Job:
+        """Queue ``fn(job, *args, **kwargs)`` and return its :class:`Job`."""
+        job = Job(kind, label, total)
+        with self._lock:
+            self._jobs[job.id] = job
+            self._prune()
+        self._pool.submit(job._run, fn, args, kwargs)
+        return job
+
+    def get(self, job_id):
+        """The job with ``job_id``, or None if unknown or already forgotten."""
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def cancel(self, job_id) -> None:
+        job = self.get(job_id)
+        if job is not None:
+            job.cancel()
+
+    def jobs(self) -> list:
+        """Every tracked job, oldest first."""
+        with self._lock:
+            return list(self._jobs.values())
+
+    def queue_position(self, job: Job) -> int:
+        """Number of queued jobs submitted before ``job``."""
+        return sum(1 for other in self.jobs() if other.status == QUEUED and other.submitted < job.submitted)
+
+    def _prune(self) -> None:
+        finished = [job_id for job_id, job in self._jobs.items() if not job.active]
+        for job_id in finished[:max(0, len(finished) - MAX_FINISHED_JOBS)]:
+            del self._jobs[job_id]
+
+    def shutdown(self, cancel: bool = True) -> None:
+        if cancel:
+            for job in self.jobs():
+                job.cancel()
+        self._pool.shutdown(wait=False, cancel_futures=cancel)
+
+
+def simulation_job(job: Job, portfolio, params, workers: int = 1, root: str = None) -> str:
+    """Simulate a catalog into the YLT store and return its directory."""
+    job.total = params.n_years
+    return simulate_to_store(portfolio, params, root=root, workers=workers,
+                             progress=lambda years: job.report(years, f"{years:,} years simulated"))
+
+
+def converging_simulation_job(job: Job, portfolio, params, level: float = 0.99, rel_tol: float = 0.01,
+                              root: str = None) -> str:
+    """Simulate chunk by chunk until the CVaR interval is within ``rel_tol``.
+
+    Convergence is checked after every chunk, so ``chunk_years`` is lowered
+    to about ``n_years / CONVERGENCE_CHECKS``; it is part of the catalog's
+    params, and the truncated catalog is stored under its own year count,
+    exactly as a run with those params would have produced it.  Nothing
+    stops before :meth:`~.metrics.StreamingTail.min_years`.
+    """
+    chunk_years = max(CONVERGENCE_MIN_CHUNK, -(-params.n_years // CONVERGENCE_CHECKS))
+    params = replace(params, chunk_years=min(params.chunk_years, chunk_years))
+    job.total = params.n_years
+    tail = StreamingTail(level=level)
+
+    def stop(years, annual, weights):
+        estimate = tail.update(annual.sum(axis=1), weights).estimate()
+        low, high = estimate.cvar_interval
+        job.report(years, f"{years:,} years simulated — {level:.0%} CVaR ≈ ${estimate.cvar:,.1f}M "
+                          f"(95% CI ${low:,.1f}M – ${high:,.1f}M)")
+        return tail.converged(rel_tol=rel_tol)
+
+    return stream_to_store(portfolio, params, stop=stop, root=root)
+
+
+def frontier_job(job: Job, ylt_path: str, capital: float, **kwargs) -> dict:
+    """Price a stored catalog's layers and sweep its efficient frontier.
+
+    Returns the :class:`~.rl.RetroEnv` (whose rate tables training runs
+    share) and its :class:`~.frontier.Frontier`.
+    """
+    job.total = frontier_size(kwargs.get("n_candidates", 2048), kwargs.get("refine_rounds", 2))
+    job.report(0, "pricing layers")
+    env = RetroEnv(LossBasis.from_ylt(open_ylt(ylt_path)), capital=capital)
+    frontier = build_frontier(
+        env, progress=lambda n: job.report(n, f"{n:,} of {job.total:,} programs scored"), **kwargs)
+    return {"env": env, "frontier": frontier}
+
+
+def training_job(job: Job, env, iterations: int = 100, **kwargs) -> dict:
+    """Train the RL agent on ``env`` and return the chosen strategy."""
+    job.total = iterations
+
+    def progress(iteration, best_reward):
+        job.report(iteration, f"iteration {iteration}/{iterations}, best reward {best_reward:.4f}")
+
+    began = time.perf_counter()
+    result = train(env, iterations, progress=progress, **kwargs)
+    return strategy_from_training(env, result, time.perf_counter() - began)
+
+
+def export_job(job: Job, content, cache, data_format: str = None, root: str = None) -> dict:
+    """Build the strategy packet PDF and, given a catalog and ``data_format``, its recovery file.
+
+    The result's ``key`` is ``(content.key, data_format)``: a packet only
+    matches the strategy and recovery format it was built for.
+    """
+    job.total = 1.0
+    packet = build_packet(content, cache, progress=lambda name: job.report(0.0, f"rendering {name} section"))
+    path = None
+    if data_format is not None and content.ylt_path is not None:
+        n_years = open_ylt(content.ylt_path).n_years
+        path = export_recoveries(
+            content.ylt_path, content.program, data_format, root=root,
+            progress=lambda years: job.report(years / n_years, f"{years:,} of {n_years:,} years exported"),
+        )
+    job.report(1.0)
+    return {"key": (content.key, data_format), "packet": packet, "data": path, "data_format": data_format}
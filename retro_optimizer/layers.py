@@ -0,0 +1,305 @@
+"""Vectorized recovery engine for XoL, ILW and sidecar retro layers.
+
+Every function works on whole arrays.  Layer terms broadcast against the
+year axis of the year loss table, so one call returns recoveries for every
+simulated year of one program or -- with terms shaped ``(programs, 1)`` --
+for a whole candidate population as a ``(programs, years)`` matrix.
+
+Cover conventions:
+
+* **XoL** is a per-occurrence layer.  Each of the year's largest events
+  recovers ``min(max(event - retention, 0), limit)`` and the annual total is
+  capped at the aggregate limit ``limit * (1 + reinstatements)``.  Every
+  event counts: the ``TOP_EVENTS`` largest of a year come from the dense
+  top-event block and the rest from the catalog's sparse
+  :class:`~.simulation.EventOverflow`, which is only read when some of its
+  events pierce the lowest retention being scored.
+* **ILW** is a dual-trigger cover: the reinsurer's annual loss in excess of
+  the retention is recovered up to the limit, but only in years where the
+  industry loss reaches the trigger.
+* **Sidecar** takes a quota share of the reinsurer's annual aggregate loss
+  between retention and retention + limit.
+"""
+
+from dataclasses import dataclass, replace
+
+import numpy as np
+
+from .metrics import weighted_mean
+from .simulation import EventOverflow
+
+COVER_TYPES = ("XoL", "ILW", "Sidecar")
+
+# One layer of a program as a packed 25-byte record; a population is an
+# array of shape (programs, layers).  ``cover`` indexes COVER_TYPES and
+# ``rate`` is the premium rate on line (premium / limit).
+LAYER_DTYPE = np.dtype([
+    ("cover", np.int8),
+    ("retention", np.float32),
+    ("limit", np.float32),
+    ("reinstatements", np.float32),
+    ("trigger", np.float32),
+    ("share", np.float32),
+    ("rate", np.float32),
+])
+TERMS = ("retention", "limit", "reinstatements", "trigger", "share")
+
+# Portfolio share of industry losses used to derive the ILW index; 0.5%
+# puts the sample portfolio's mean year at roughly a $20B industry season.
+DEFAULT_MARKET_SHARE = 0.005
+
+
+@dataclass(frozen=True)
+class Layer:
+    """Terms of one retro layer; all amounts in $M."""
+
+    cover: str
+    retention: float
+    limit: float
+    reinstatements: int = 0     # XoL: paid reinstatements of the occurrence limit
+    trigger: float = 0.0        # ILW: industry loss trigger
+    share: float = 1.0          # proportion of the layer ceded (sidecar quota share)
+
+    def __post_init__(self):
+        if self.cover not in COVER_TYPES:
+            raise ValueError(f"Unknown cover type {self.cover!r}; expected one of {COVER_TYPES}.")
+        if self.retention < 0 or self.limit < 0 or self.reinstatements < 0:
+            raise ValueError("Retention, limit and reinstatements must be non-negative.")
+        if not 0.0 <= self.share <= 1.0:
+            raise ValueError("share must lie in [0, 1].")
+
+    @property
+    def aggregate_limit(self) -> float:
+        return self.limit * (1 + self.reinstatements)
+
+
+@dataclass
+class LossBasis:
+    """The YLT-derived arrays layer evaluation reads, computed once per catalog."""
+
+    total: np.ndarray           # (years,) reinsurer aggregate annual loss
+    top_events: np.ndarray      # (years, k) largest event losses, descending
+    industry: np.ndarray        # (years,) industry loss index for ILW triggers
+    weights: np.ndarray = None  # (years,) likelihood ratios of an importance-sampled catalog
+    overflow: EventOverflow = None  # events below the top block; None when there are none
+
+    @classmethod
+    def from_ylt(cls, ylt, market_share=DEFAULT_MARKET_SHARE) -> "LossBasis":
+        return cls(
+            total=np.ascontiguousarray(ylt.total, dtype=np.float32),
+            top_events=np.ascontiguousarray(ylt.top_events, dtype=np.float32),
+            industry=industry_loss(ylt.annual, market_share),
+            weights=None if ylt.weights is None else np.ascontiguousarray(ylt.weights, dtype=np.float32),
+            overflow=None if ylt.overflow is None else EventOverflow(
+                np.ascontiguousarray(ylt.overflow.years), np.ascontiguousarray(ylt.overflow.losses)),
+        )
+
+    @property
+    def n_years(self) -> int:
+        return self.total.shape[0]
+
+    def __getitem__(self, years) -> "LossBasis":
+        weights = None if self.weights is None else self.weights[years]
+        overflow = None if self.overflow is None else self.overflow.select(self.n_years, years)
+        return LossBasis(self.total[years], self.top_events[years], self.industry[years], weights, overflow)
+
+
+def industry_loss(annual: np.ndarray, market_share=DEFAULT_MARKET_SHARE) -> np.ndarray:
+    """Industry loss index grossed up from regional losses by market share."""
+    weights = 1.0 / np.broadcast_to(np.asarray(market_share, dtype=np.float64), annual.shape[1:])
+    return np.asarray(annual @ weights, dtype=np.float32)
+
+
+def _terms(value) -> np.ndarray:
+    return np.asarray(value, dtype=np.float32)
+
+
+def layer_loss(loss, retention, limit, out=None) -> np.ndarray:
+    """``min(max(loss - retention, 0), limit)`` with broadcasting."""
+    out = np.subtract(loss, _terms(retention), out=out, dtype=np.float32)
+    return np.clip(out, 0.0, _terms(limit), out=out)
+
+
+def xol_recoveries(top_events, retention, limit, aggregate_limit, share=1.0,
+                   overflow: EventOverflow = None) -> np.ndarray:
+    """Per-occurrence XoL recoveries with an annual aggregate cap.
+
+    ``overflow`` holds the events below ``top_events`` of each year; without
+    it only the top block is counted.
+    """
+    retention = _terms(retention)
+    shape = np.broadcast_shapes(retention.shape, np.shape(limit), top_events.shape[:1])
+    total = np.zeros(shape, dtype=np.float32)
+    scratch = np.empty(shape, dtype=np.float32)
+    floor = retention.min(initial=np.inf)
+    for k in range(top_events.shape[1]):
+        events = top_events[:, k]
+        # Events are sorted, so once none pierces the lowest retention
+        # neither will any smaller one, nor any overflow event.
+        if events.max(initial=0.0) <= floor:
+            break
+        total += layer_loss(events, retention, limit, out=scratch)
+    else:
+        if overflow is not None and len(overflow):
+            hit = overflow.losses > floor
+            if hit.any():
+                years = overflow.years[hit]
+                excess = np.clip(overflow.losses[hit] - retention, 0.0, _terms(limit))
+                runs = np.flatnonzero(np.concatenate(([True], years[1:] != years[:-1])))
+                total[..., years[runs]] += np.add.reduceat(excess, runs, axis=-1)
+    np.minimum(total, _terms(aggregate_limit), out=total)
+    total *= _terms(share)
+    return total
+
+
+def ilw_recoveries(total, industry, retention, limit, trigger, share=1.0) -> np.ndarray:
+    """Dual-trigger ILW: indemnity layer paid only when the industry trigger is hit."""
+    out = layer_loss(total, retention, limit)
+    out *= industry >= _terms(trigger)
+    out *= _terms(share)
+    return out
+
+
+def sidecar_recoveries(total, retention, limit, share) -> np.ndarray:
+    """Quota share of the annual aggregate layer."""
+    out = layer_loss(total, retention, limit)
+    out *= _terms(share)
+    return out
+
+
+def _cover_recoveries(basis: LossBasis, cover, retention, limit, reinstatements, trigger, share):
+    if cover == "XoL":
+        return xol_recoveries(basis.top_events, retention, limit,
+                              _terms(limit) * (1 + _terms(reinstatements)), share, basis.overflow)
+    if cover == "ILW":
+        return ilw_recoveries(basis.total, basis.industry, retention, limit, trigger, share)
+    if cover == "Sidecar":
+        return sidecar_recoveries(basis.total, retention, limit, share)
+    raise ValueError(f"Unknown cover type {cover!r}.")
+
+
+def layer_recoveries(basis: LossBasis, layer: Layer) -> np.ndarray:
+    """Recoveries of one layer in every simulated year, shape ``(years,)``."""
+    return _cover_recoveries(basis, layer.cover, layer.retention, layer.limit,
+                             layer.reinstatements, layer.trigger, layer.share)
+
+
+def program_recoveries(basis: LossBasis, layers) -> np.ndarray:
+    """Per-layer recoveries of one program, shape ``(layers, years)``."""
+    return np.stack([layer_recoveries(basis, layer) for layer in layers])
+
+
+@dataclass
+class ProgramBatch:
+    """A population of programs sharing one layer layout.
+
+    ``covers`` names the cover type of each layer slot; every term array has
+    shape ``(programs, layers)``.  A zero limit switches a slot off.  This
+    is the working format of the optimizer: a candidate is a row of a few
+    contiguous float32 arrays, and :class:`Layer` objects or tables are only
+    built for the handful of programs that get displayed.  ``rate`` holds
+    premium rates on line once the batch has been priced.
+    """
+
+    covers: tuple
+    retention: np.ndarray
+    limit: np.ndarray
+    reinstatements: np.ndarray
+    trigger: np.ndarray
+    share: np.ndarray
+    rate: np.ndarray = None
+
+    @classmethod
+    def from_programs(cls, programs, premiums=None) -> "ProgramBatch":
+        """Build a batch from lists of :class:`Layer` with a common layout.
+
+        ``premiums``, shaped like the layers, prices the batch.
+        """
+        covers = tuple(layer.cover for layer in programs[0])
+        if any(tuple(layer.cover for layer in p) != covers for p in programs):
+            raise ValueError("All programs in a batch must share the same layer layout.")
+
+        def column(name):
+            return np.array([[getattr(layer, name) for layer in p] for p in programs], dtype=np.float32)
+
+        batch = cls(covers, *(column(name) for name in TERMS))
+        return batch if premiums is None else batch.priced(premiums)
+
+    @classmethod
+    def from_records(cls, records: np.ndarray) -> "ProgramBatch":
+        """Batch view of a ``(programs, layers)`` array of :data:`LAYER_DTYPE` records."""
+        records = np.atleast_2d(records)
+        codes = records["cover"]
+        if np.any(codes != codes[:1]):
+            raise ValueError("All programs in a batch must share the same layer layout.")
+        rate = records["rate"]
+        return cls(tuple(COVER_TYPES[code] for code in codes[0]),
+                   *(np.ascontiguousarray(records[name]) for name in TERMS),
+                   rate=None if np.isnan(rate).all() else np.ascontiguousarray(rate))
+
+    def to_records(self) -> np.ndarray:
+        """Pack the batch into one contiguous :data:`LAYER_DTYPE` array; unpriced rates are NaN."""
+        records = np.empty(self.retention.shape, dtype=LAYER_DTYPE)
+        records["cover"] = [COVER_TYPES.index(cover) for cover in self.covers]
+        for name in TERMS:
+            records[name] = getattr(self, name)
+        records["rate"] = np.nan if self.rate is None else self.rate
+        return records
+
+    @property
+    def n_programs(self) -> int:
+        return self.retention.shape[0]
+
+    @property
+    def premiums(self) -> np.ndarray:
+        """Premium of every layer slot, ``rate * limit``; None until priced."""
+        return None if self.rate is None else self.rate * self.limit
+
+    def priced(self, premiums) -> "ProgramBatch":
+        """Copy of the batch carrying the rates on line of ``premiums``."""
+        premiums = np.broadcast_to(np.asarray(premiums, dtype=np.float32), self.limit.shape)
+        rate = np.divide(premiums, self.limit, out=np.zeros_like(self.limit), where=self.limit > 0)
+        return replace(self, rate=rate)
+
+    def layers(self, row: int = 0) -> list:
+        """The :class:`Layer` list of one program."""
+        return [
+            Layer(cover, retention=float(self.retention[row, j]), limit=float(self.limit[row, j]),
+                  reinstatements=int(self.reinstatements[row, j]), trigger=float(self.trigger[row, j]),
+                  share=float(self.share[row, j]))
+            for j, cover in enumerate(self.covers)
+        ]
+
+    def __getitem__(self, rows) -> "ProgramBatch":
+        rate = None if self.rate is None else self.rate[rows]
+        return ProgramBatch(self.covers, self.retention[rows], self.limit[rows],
+                            self.reinstatements[rows], self.trigger[rows], self.share[rows], rate)
+
+
+def batch_recoveries(basis: LossBasis, batch: ProgramBatch, out=None) -> np.ndarray:
+    """Total recovery of every program in every year, shape ``(programs, years)``.
+
+    The matrix is ``programs * years * 4`` bytes; slice large populations
+    (``batch[i:j]``) to keep it within memory, or pass a reusable ``out``.
+    """
+    if out is None:
+        out = np.empty((batch.n_programs, basis.n_years), dtype=np.float32)
+    out.fill(0.0)
+    for j, cover in enumerate(batch.covers):
+        col = (slice(None), slice(j, j + 1))
+        out += _cover_recoveries(basis, cover, batch.retention[col], batch.limit[col],
+                                 batch.reinstatements[col], batch.trigger[col], batch.share[col])
+    return out
+
+
+def expected_recoveries(basis: LossBasis, batch: ProgramBatch) -> np.ndarray:
+    """Expected recovery of every layer slot, shape ``(programs, layers)``."""
+    out = np.empty(batch.limit.shape, dtype=np.float64)
+    for j, cover in enumerate(batch.covers):
+        col = (slice(None), slice(j, j + 1))
+        out[:, j] = weighted_mean(
+            _cover_recoveries(basis, cover, batch.retention[col], batch.limit[col],
+                              batch.reinstatements[col], batch.trigger[col], batch.share[col]),
+            basis.weights,
+        )
+    return out
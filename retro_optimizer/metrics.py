@@ -0,0 +1,321 @@
+"""Tail-risk statistics over simulated years.
+
+All estimators use partial selection (``np.partition``) rather than a full
+sort: only the worst ``ceil(n * (1 - level))`` years matter for VaR and
+CVaR, so the cost is linear in the number of years.  The functions reduce
+over the last axis, so a ``(programs, years)`` matrix yields one figure per
+program.
+
+Conventions: with ``m = ceil(n * (1 - level))`` tail years, VaR is the
+smallest of the ``m`` largest losses and CVaR (TVaR) is their mean.  The
+loss at return period ``T`` is VaR at level ``1 - 1/T``.
+
+Importance-sampled catalogs carry a likelihood-ratio weight per year (mean
+one under the sampling distribution).  Passing ``weights`` switches to the
+weighted estimators: year ``i`` has probability ``weights[i] / n``, VaR is
+the loss where that mass first reaches ``1 - level`` and CVaR is the
+Rockafellar-Uryasev tail mean, splitting the VaR year where needed.  Only
+the largest losses are sorted, so these stay close to linear time too.
+"""
+
+import math
+from dataclasses import dataclass
+
+import numpy as np
+
+DEFAULT_RETURN_PERIODS = (10, 25, 50, 100, 250, 500, 1000)
+
+
+def tail_count(n: int, level: float) -> int:
+    """Number of years in the ``1 - level`` tail of an ``n``-year sample."""
+    if not 0.0 <= level < 1.0:
+        raise ValueError("level must lie in [0, 1).")
+    return max(1, math.ceil(round(n * (1.0 - level), 9)))
+
+
+def weighted_mean(values, weights=None):
+    """Mean along the last axis, likelihood-ratio weighted when ``weights`` is given."""
+    values = np.asarray(values)
+    if weights is None:
+        return values.mean(axis=-1, dtype=np.float64)
+    return values.astype(np.float64, copy=False) @ np.asarray(weights, dtype=np.float64) / values.shape[-1]
+
+
+def _sorted_tail(losses, weights, mass):
+    # Largest losses in descending order with their weights, growing the
+    # candidate set until it holds ``mass`` of weight in every row.
+    n = losses.shape[-1]
+    k = min(n, max(1, math.ceil(mass)))
+    while True:
+        idx = np.argpartition(losses, n - k, axis=-1)[..., n - k:]
+        top = np.take_along_axis(losses, idx, axis=-1)
+        order = np.argsort(-top, axis=-1, kind="stable")
+        top = np.take_along_axis(top, order, axis=-1).astype(np.float64)
+        w = weights[np.take_along_axis(idx, order, axis=-1)].astype(np.float64)
+        cum = np.cumsum(w, axis=-1)
+        if k == n or np.all(cum[..., -1] >= mass):
+            return top, w, cum
+        # Size the next attempt from the weight found so far, with headroom.
+        found = max(float(cum[..., -1].min()), 1e-12)
+        k = min(n, max(4 * k, math.ceil(1.25 * k * mass / found)))
+
+
+def _weighted_tail(losses, weights, level):
+    n = losses.shape[-1]
+    # Rounded like tail_count, so unit weights reproduce the unweighted tail.
+    mass = round(n * (1.0 - level), 9)
+    top, w, cum = _sorted_tail(losses, weights, mass)
+    j = np.minimum((cum < mass).sum(axis=-1, keepdims=True), top.shape[-1] - 1)
+    value_at_risk = np.take_along_axis(top, j, axis=-1)
+    excess = (w * np.maximum(top - value_at_risk, 0.0)).sum(axis=-1, keepdims=True)
+    tail_loss = value_at_risk + excess / mass
+    return value_at_risk[..., 0], tail_loss[..., 0], top, w
+
+
+def var_cvar(losses, level: float = 0.99, weights=None):
+    """VaR and CVaR at ``level`` along the last axis, from one partition."""
+    losses = np.asarray(losses)
+    if weights is not None:
+        return _weighted_tail(losses, np.asarray(weights), level)[:2]
+    n = losses.shape[-1]
+    m = tail_count(n, level)
+    part = np.partition(losses, n - m, axis=-1)
+    return part[..., n - m], part[..., n - m:].mean(axis=-1, dtype=np.float64)
+
+
+def var(losses, level: float = 0.99, weights=None):
+    return var_cvar(losses, level, weights)[0]
+
+
+def cvar(losses, level: float = 0.99, weights=None):
+    return var_cvar(losses, level, weights)[1]
+
+
+def exceedance_curve(losses, return_periods=DEFAULT_RETURN_PERIODS, weights=None) -> np.ndarray:
+    """Losses at the given return periods along the last axis.
+
+    Return periods longer than the sample are reported as ``nan``.
+    """
+    losses = np.asarray(losses)
+    n = losses.shape[-1]
+    periods = np.asarray(return_periods, dtype=np.float64)
+    if weights is not None:
+        top, _, cum = _sorted_tail(losses, np.asarray(weights), n / periods.min())
+        j = np.stack([np.minimum((cum < n / t).sum(axis=-1), top.shape[-1] - 1) for t in periods], axis=-1)
+        curve = np.take_along_axis(top, j, axis=-1)
+        curve[..., periods > n] = np.nan
+        return curve
+    kth = np.array([n - max(1, math.ceil(n / t)) for t in periods])
+    part = np.partition(losses, np.unique(kth), axis=-1)
+    curve = part[..., kth].astype(np.float64)
+    curve[..., periods > n] = np.nan
+    return curve
+
+
+def aep_curve(ylt, return_periods=DEFAULT_RETURN_PERIODS) -> np.ndarray:
+    """Aggregate exceedance curve of the portfolio's annual loss."""
+    return exceedance_curve(ylt.total, return_periods, ylt.weights)
+
+
+def oep_curve(ylt, return_periods=DEFAULT_RETURN_PERIODS) -> np.ndarray:
+    """Occurrence exceedance curve of the largest event in each year."""
+    return exceedance_curve(ylt.max_event, return_periods, ylt.weights)
+
+
+def tail_estimate(losses, level: float = 0.99, weights=None, z: float = 1.96) -> "TailEstimate":
+    """VaR and CVaR of a complete sample with normal-approximation intervals.
+
+    The CVaR interval comes from the variance of ``w * (X - VaR)+``, which
+    for unit weights is the :class:`StreamingTail` formula; the VaR interval
+    maps the standard error of the tail mass back onto the loss axis.
+    """
+    losses = np.asarray(losses)
+    n = losses.shape[-1]
+    w = np.ones(n) if weights is None else np.asarray(weights, dtype=np.float64)
+    beta = 1.0 - level
+    value_at_risk, tail_loss, top, tw = _weighted_tail(losses, w, level)
+    excess = tw * np.maximum(top - value_at_risk, 0.0)
+    spread = (excess ** 2).sum() / n - (excess.sum() / n) ** 2
+    half = z * math.sqrt(max(spread, 0.0) / n) / beta
+
+    exceed = top > value_at_risk
+    mass_sd = math.sqrt(max((tw[exceed] ** 2).sum() / n - beta ** 2, 0.0) / n)
+    low_t, high_t = (1.0 / min(beta + z * mass_sd, 1.0), 1.0 / max(beta - z * mass_sd, 1.0 / n))
+    low, high = exceedance_curve(losses, (low_t, high_t), weights=w)
+    return TailEstimate(
+        n_years=n,
+        mean=float(weighted_mean(losses, weights)),
+        var=float(value_at_risk),
+        cvar=float(tail_loss),
+        var_interval=(float(low), float(high)),
+        cvar_interval=(float(tail_loss) - half, float(tail_loss) + half),
+    )
+
+
+def cvar_difference(net_a, net_b, level: float = 0.99, weights=None, z: float = 1.96):
+    """CVaR of ``net_a`` minus CVaR of ``net_b`` and the half-width of its interval.
+
+    Both programs must be scored on the same simulated years (common random
+    numbers); the interval then reflects the paired per-year influence, so
+    shared scenario noise cancels instead of adding up.
+    """
+    n = np.shape(net_a)[-1]
+    w = np.ones(n) if weights is None else np.asarray(weights, dtype=np.float64)
+    influence = []
+    tails = []
+    for net in (np.asarray(net_a), np.asarray(net_b)):
+        value_at_risk, tail_loss = var_cvar(net, level, w)
+        influence.append(w * np.maximum(net - value_at_risk, 0.0) / (1.0 - level))
+        tails.append(tail_loss)
+    paired = influence[0] - influence[1]
+    return float(tails[0] - tails[1]), z * float(paired.std()) / math.sqrt(n)
+
+
+def catalog_summary(ylt, level: float = 0.99, return_periods=DEFAULT_RETURN_PERIODS) -> dict:
+    """Headline gross statistics of a year loss table."""
+    total = ylt.total
+    estimate = tail_estimate(total, level, ylt.weights)
+    return {
+        "n_years": ylt.n_years,
+        "mean": estimate.mean,
+        "var": estimate.var,
+        "cvar": estimate.cvar,
+        "cvar_interval": estimate.cvar_interval,
+        "return_periods": tuple(return_periods),
+        "aep": exceedance_curve(total, return_periods, ylt.weights),
+        "oep": exceedance_curve(ylt.max_event, return_periods, ylt.weights),
+    }
+
+
+def net_losses(gross, recoveries) -> np.ndarray:
+    """Retained annual loss after retro recoveries (broadcasts over programs)."""
+    return np.subtract(gross, recoveries, dtype=np.float32)
+
+
+def expected_surplus(net, premium, capital: float, weights=None):
+    """Capital left on average after retained losses and retro premium."""
+    return capital - weighted_mean(net, weights) - premium
+
+
+def return_on_risk_capital(surplus, tail):
+    """Expected surplus per unit of tail risk capital (net CVaR), in percent."""
+    return 100.0 * np.asarray(surplus) / np.asarray(tail)
+
+
+@dataclass
+class TailEstimate:
+    """Snapshot of a :class:`StreamingTail` with normal-approximation intervals."""
+
+    n_years: int
+    mean: float
+    var: float
+    cvar: float
+    var_interval: tuple
+    cvar_interval: tuple
+
+    @property
+    def cvar_rel_halfwidth(self) -> float:
+        low, high = self.cvar_interval
+        return (high - low) / (2 * abs(self.cvar)) if self.cvar else math.inf
+
+
+class StreamingTail:
+    """Incremental mean, VaR and CVaR for years arriving chunk by chunk.
+
+    Only the largest years are retained: the current tail plus a margin wide
+    enough to read off the VaR confidence bound, so memory is about
+    ``n * (1 - level)`` values rather than ``n``.
+
+    The CVaR interval uses the asymptotic variance
+    ``(Var[X | X >= VaR] + level * (CVaR - VaR)**2) / (1 - level)``; the VaR
+    interval comes from binomial bounds on the order-statistic index.
+
+    Importance-sampled chunks pass their ``weights``; the retained years
+    then cover twice the tail's weight and :func:`tail_estimate` is applied
+    to them, which is exact because only years above VaR enter it.
+    """
+
+    def __init__(self, level: float = 0.99, z: float = 1.96):
+        self.level = level
+        self.z = z
+        self.n = 0
+        self._sum = 0.0
+        self._top = np.empty(0, dtype=np.float64)
+        self._weights = None
+
+    def _margin(self, n: int) -> int:
+        return math.ceil(self.z * math.sqrt(n * self.level * (1.0 - self.level))) + 1
+
+    def update(self, chunk, weights=None) -> "StreamingTail":
+        chunk = np.asarray(chunk, dtype=np.float64).ravel()
+        if weights is None and self._weights is not None:
+            raise ValueError("A weighted StreamingTail needs weights for every chunk.")
+        self.n += chunk.size
+        pool = np.concatenate([self._top, chunk])
+        if weights is None:
+            self._sum += float(chunk.sum())
+            keep = min(pool.size, tail_count(self.n, self.level) + self._margin(self.n))
+            self._top = np.partition(pool, pool.size - keep)[pool.size - keep:]
+            return self
+
+        weights = np.asarray(weights, dtype=np.float64).ravel()
+        if self._weights is None:
+            if self.n > chunk.size:
+                raise ValueError("Cannot switch a StreamingTail to weighted chunks midway.")
+            self._weights = np.empty(0, dtype=np.float64)
+        self._sum += float(chunk @ weights)
+        pool_w = np.concatenate([self._weights, weights])
+        order = np.argsort(-pool)
+        covered = np.searchsorted(np.cumsum(pool_w[order]), 2.0 * self.n * (1.0 - self.level))
+        keep = order[:min(pool.size, max(covered + 1, tail_count(self.n, self.level) + self._margin(self.n)))]
+        self._top, self._weights = pool[keep], pool_w[keep]
+        return self
+
+    def estimate(self) -> TailEstimate:
+        if self.n == 0:
+            raise ValueError("No years have been added yet.")
+        if self._weights is not None:
+            return self._weighted_estimate()
+        top = np.sort(self._top)[::-1]
+        m = tail_count(self.n, self.level)
+        tail = top[:m]
+        value_at_risk, tail_mean = float(tail[-1]), float(tail.mean())
+
+        spread = tail.var() + self.level * (tail_mean - value_at_risk) ** 2
+        half = self.z * math.sqrt(spread / ((1.0 - self.level) * self.n))
+
+        margin = self._margin(self.n)
+        upper = top[max(m - margin, 1) - 1]
+        lower = top[min(m - 1 + margin, top.size - 1)]
+        return TailEstimate(
+            n_years=self.n,
+            mean=self._sum / self.n,
+            var=value_at_risk,
+            cvar=tail_mean,
+            var_interval=(float(lower), float(upper)),
+            cvar_interval=(tail_mean - half, tail_mean + half),
+        )
+
+    def _weighted_estimate(self) -> TailEstimate:
+        # Years below the retained set have zero excess over VaR, so padding
+        # the sample with zero-weight years reproduces the full-sample figures.
+        padded = np.zeros(self.n)
+        padded_w = np.zeros(self.n)
+        padded[:self._top.size], padded_w[:self._top.size] = self._top, self._weights
+        padded[self._top.size:] = self._top.min(initial=0.0)
+        estimate = tail_estimate(padded, self.level, padded_w, self.z)
+        estimate.mean = self._sum / self.n
+        return estimate
+
+    def min_years(self, min_tail: int = 100) -> int:
+        """Fewest years before :meth:`converged` can be true (10,000 at the 99% level)."""
+        return math.ceil(round(min_tail / (1.0 - self.level), 9))
+
+    def converged(self, rel_tol: float = 0.01, min_tail: int = 100) -> bool:
+        """True once the CVaR interval is within ``rel_tol`` of the estimate.
+
+        Never before :meth:`min_years`, so the interval rests on at least ``min_tail`` tail years.
+        """
+        if self.n == 0 or self.n < self.min_years(min_tail):
+            return False
+        return self.estimate().cvar_rel_halfwidth <= rel_tol
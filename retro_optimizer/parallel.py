@@ -0,0 +1,165 @@
+"""Process-pool sharded catalog simulation.
+
+The catalog is split into the same fixed-size chunks used by
+:func:`~retro_optimizer.simulation.simulate_ylt`, each with its own
+``SeedSequence`` child, so the result is bit-identical to the serial run for
+any number of workers.  Workers write their shard straight into a block the
+parent owns -- ``multiprocessing.shared_memory`` for in-memory tables or the
+``.npy`` files of the on-disk store -- so only chunk bounds and seeds travel
+to the workers, never the loss arrays.  What comes back is each chunk's
+:class:`~.simulation.EventOverflow`, the sparse events below its dense
+top-event block, whose size is not known until the chunk is drawn.
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+
+from . import telemetry
+from .portfolio import REGION
+from .simulation import (
+    TOP_EVENTS,
+    EventOverflow,
+    SimulationParams,
+    YearLossTable,
+    chunk_bounds,
+    chunk_seeds,
+    event_model,
+    fill_chunk,
+    simulate_into,
+    simulate_ylt,
+)
+
+
+def _open_target(target, n_years: int, n_regions: int):
+    """Map a picklable target description to ``(annual, top_events, weights, close)``.
+
+    ``weights`` is None when the target has no weights block.
+    """
+    kind, annual_ref, top_ref, weights_ref = target
+    shapes = [(annual_ref, (n_years, n_regions)), (top_ref, (n_years, TOP_EVENTS)), (weights_ref, (n_years,))]
+    if kind == "shm":
+        blocks = [shared_memory.SharedMemory(name=ref) if ref else None for ref, _ in shapes]
+        arrays = [np.ndarray(shape, dtype=np.float32, buffer=block.buf) if block else None
+                  for block, (_, shape) in zip(blocks, shapes)]
+
+        def close():
+            for block in blocks:
+                if block is not None:
+                    block.close()
+    elif kind == "npy":
+        arrays = [np.load(ref, mmap_mode="r+") if ref else None for ref, _ in shapes]
+
+        def close():
+            for array in arrays:
+                if array is not None:
+                    array.flush()
+    else:
+        raise ValueError(f"Unknown shard target {kind!r}.")
+    return (*arrays, close)
+
+
+def _simulate_shard(target, n_years, shards, model):
+    """Worker entry point: simulate ``shards``, write them in place and return their overflow."""
+    annual, top_events, weights, close = _open_target(target, n_years, len(model.regions))
+    try:
+        return [fill_chunk(seq, start, stop, model, annual, top_events, weights) for start, stop, seq in shards]
+    finally:
+        del annual, top_events, weights
+        close()
+
+
+def default_workers() -> int:
+    """Number of CPUs available to this process."""
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def run_shards(target, portfolio: pd.DataFrame, params: SimulationParams, workers: int,
+               progress=None):
+    """Simulate every chunk of the catalog into ``target`` on a process pool.
+
+    ``target`` is ``("shm", annual_name, top_name, weights_name)`` or
+    ``("npy", annual_path, top_path, weights_path)``, with a None weights
+    reference for untilted catalogs.  Chunks are submitted one by one so
+    the pool balances them and ``progress(years_done)`` can be called as
+    each finishes; if it raises, pending chunks are cancelled.  Returns the
+    region names and the catalog's overflow events, in year order.
+    """
+    model = event_model(portfolio, params)
+    jobs = [(start, stop, seq) for (start, stop), seq in
+            zip(chunk_bounds(params.n_years, params.chunk_years), chunk_seeds(params))]
+    workers = max(1, min(workers, len(jobs)))
+    with telemetry.span("simulate", years=params.n_years, workers=workers), \
+            ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(_simulate_shard, target, params.n_years, [job], model): job for job in jobs}
+        overflow = {}
+        done = 0
+        try:
+            for future in as_completed(futures):
+                start, stop, _ = futures[future]
+                overflow[start], = future.result()
+                done += stop - start
+                telemetry.count("simulated_years", stop - start)
+                if progress is not None:
+                    progress(done)
+        except BaseException:
+            for future in futures:
+                future.cancel()
+            raise
+    return model.regions, EventOverflow.concatenate(overflow[start] for start in sorted(overflow))
+
+
+def simulate_into_parallel(portfolio: pd.DataFrame, params: SimulationParams,
+                           annual_path: str, top_events_path: str, workers: int = None,
+                           weights_path: str = None, progress=None):
+    """Parallel counterpart of :func:`simulate_into` for preallocated ``.npy`` files."""
+    workers = workers or default_workers()
+    if workers <= 1 or len(chunk_bounds(params.n_years, params.chunk_years)) == 1:
+        annual = np.load(annual_path, mmap_mode="r+")
+        top_events = np.load(top_events_path, mmap_mode="r+")
+        weights = np.load(weights_path, mmap_mode="r+") if weights_path else None
+        regions, overflow = simulate_into(portfolio, params, annual, top_events, weights, progress)
+        for array in (annual, top_events, weights):
+            if array is not None:
+                array.flush()
+        return regions, overflow
+    return run_shards(("npy", annual_path, top_events_path, weights_path), portfolio, params, workers,
+                      progress)
+
+
+def simulate_ylt_parallel(portfolio: pd.DataFrame,
+                          params: SimulationParams = SimulationParams(),
+                          workers: int = None) -> YearLossTable:
+    """Simulate an in-memory year loss table across a process pool.
+
+    ``workers`` defaults to the available CPUs.  With a single worker or a
+    single chunk this falls back to the in-process :func:`simulate_ylt`.
+    """
+    workers = workers or default_workers()
+    if workers <= 1 or len(chunk_bounds(params.n_years, params.chunk_years)) == 1:
+        return simulate_ylt(portfolio, params)
+
+    n_regions = portfolio[REGION].nunique()
+    shapes = [(params.n_years, n_regions), (params.n_years, TOP_EVENTS)]
+    if params.tail_tilt > 0:
+        shapes.append((params.n_years,))
+    item = np.dtype(np.float32).itemsize
+    blocks = [shared_memory.SharedMemory(create=True, size=int(np.prod(shape)) * item) for shape in shapes]
+    try:
+        names = [block.name for block in blocks] + [None] * (3 - len(blocks))
+        regions, overflow = run_shards(("shm", *names), portfolio, params, workers)
+        # One local copy so the table outlives the shared blocks.
+        arrays = [np.ndarray(shape, dtype=np.float32, buffer=block.buf).copy()
+                  for block, shape in zip(blocks, shapes)]
+    finally:
+        for block in blocks:
+            block.close()
+            block.unlink()
+    annual, top_events, *weights = arrays
+    return YearLossTable(regions=regions, annual=annual, top_events=top_events, params=params,
+                         weights=weights[0] if weights else None, overflow=overflow)
@@ -0,0 +1,286 @@
+"""Headless simulate -> optimize -> report pipeline.
+
+Runs Steps 1-3 and 5 of the app for one portfolio file, and for a whole
+directory of them on a process pool, writing everything to disk::
+
+    <out>/
+        metrics.csv             one row of headline figures per portfolio
+        <portfolio file name>/
+            exposure.csv        Step 1: exposure by region and line of business
+            catalog.json        Step 2: stored catalog path and gross statistics
+            strategy.json       Step 3: optimized program and its scores
+            structure.csv       Step 5: final retro structure table
+            report.json         Step 5: key performance metrics
+            error.txt           traceback of the last failed attempt, if any
+
+Every stage file is a checkpoint: it is written atomically once its stage
+has finished and records the key of the inputs it was computed from.  A
+rerun skips stages whose checkpoint matches, so a crashed or interrupted
+batch carries on where it stopped and a changed setting recomputes only
+what depends on it.  Catalogs themselves are reused from the YLT store.
+"""
+
+import json
+import os
+import tempfile
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import asdict, dataclass, field, fields
+
+import numpy as np
+import pandas as pd
+
+from . import telemetry
+from .aggregate import ProgramScreen, aggregate_distribution
+from .cache import content_key
+from .ingest import exposure_table, read_portfolio
+from .layers import LossBasis, ProgramBatch, batch_recoveries, expected_recoveries
+from .metrics import catalog_summary, expected_surplus, net_losses, return_on_risk_capital, var_cvar
+from .parallel import default_workers
+from .pricing import PricingModel
+from .rl import RetroEnv, train
+from .simulation import SimulationParams
+from .ylt import open_ylt, portfolio_hash, simulate_to_store
+
+PORTFOLIO_SUFFIXES = (".csv", ".xlsx")
+METRICS_FILE = "metrics.csv"
+ERROR_FILE = "error.txt"
+# Bumped when strategy.json changes shape, so older checkpoints recompute.
+STRATEGY_FORMAT = 1
+
+
+@dataclass(frozen=True)
+class PipelineConfig:
+    """Settings shared by every portfolio of a batch."""
+
+    params: SimulationParams = field(default_factory=SimulationParams)
+    weights: tuple = (0.4, 0.4, 0.2)    # surplus, CVaR and cost priorities
+    max_premium: float = 20.0
+    capital: float = 150.0
+    iterations: int = 100
+    n_envs: int = 48
+    agent_seed: int = 0
+    screen: bool = False                # screen candidates analytically, confirm on the catalog
+    pricing: PricingModel = field(default_factory=PricingModel)
+
+
+def strategy_from_training(env: RetroEnv, result, elapsed: float) -> dict:
+    """Program chosen by a training run (a priced one-row batch), with its payouts and scores."""
+    batch = env.decode(np.asarray(result.best_action)[None, :])
+    payouts = expected_recoveries(env.basis, batch)[0]
+    program = env.price(batch)
+    chosen = env.evaluate(program)
+    return {
+        "program": program,
+        "payouts": payouts,
+        "surplus": float(chosen.surplus[0]),
+        "cvar": float(chosen.cvar[0]),
+        "roi": float(return_on_risk_capital(chosen.surplus[0], chosen.cvar[0])),
+        "elapsed": elapsed,
+        "iterations": result.iterations,
+    }
+
+
+def program_metrics(ylt, program: ProgramBatch, capital: float, level: float = 0.99):
+    """Expected surplus and CVaR of the net position under a priced one-row ``program``."""
+    basis = LossBasis.from_ylt(ylt)
+    net = net_losses(basis.total, batch_recoveries(basis, program[:1])[0])
+    surplus = float(expected_surplus(net, float(program.premiums[0].sum()), capital, basis.weights))
+    return surplus, float(var_cvar(net, level, basis.weights)[1])
+
+
+def structure_table(program: ProgramBatch, row: int = 0, payouts=None) -> pd.DataFrame:
+    """Retro structure of one program of a batch, one row per layer, amounts in $M.
+
+    Values stay numeric; formatting is left to whoever renders the table.
+    """
+    table = pd.DataFrame({
+        "Cover Type": list(program.covers),
+        "Retention ($M)": program.retention[row].astype(np.float64),
+        "Limit ($M)": program.limit[row].astype(np.float64),
+    })
+    if program.rate is not None:
+        table["Premium ($M)"] = program.premiums[row].astype(np.float64)
+    if payouts is not None:
+        table["Expected Payout ($M)"] = np.asarray(payouts, dtype=np.float64)
+    return table
+
+
+def _write_atomic(path: str, write) -> None:
+    # Write through a temporary file in the same directory, then rename, so
+    # a checkpoint on disk is always complete.
+    fd, tmp = tempfile.mkstemp(prefix=".partial-", dir=os.path.dirname(path))
+    os.close(fd)
+    try:
+        write(tmp)
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+        raise
+
+
+def _to_json(value):
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, (np.integer, np.floating)):
+        return value.item()
+    if isinstance(value, ProgramBatch):
+        return asdict(value)
+    raise TypeError(f"Cannot serialise {type(value).__name__}.")
+
+
+def _program_from_json(columns: dict) -> ProgramBatch:
+    return ProgramBatch(**{
+        f.name: tuple(columns[f.name]) if f.name == "covers"
+        else None if columns[f.name] is None else np.asarray(columns[f.name], dtype=np.float32)
+        for f in fields(ProgramBatch)
+    })
+
+
+def _save_json(path: str, payload: dict) -> None:
+    def write(tmp):
+        with open(tmp, "w") as fh:
+            json.dump(payload, fh, indent=2, default=_to_json)
+    _write_atomic(path, write)
+
+
+def _load_checkpoint(path: str, key: str):
+    """The stage payload saved at ``path`` if it was computed from ``key``."""
+    try:
+        with open(path) as fh:
+            payload = json.load(fh)
+    except (OSError, ValueError):
+        return None
+    return payload if payload.get("key") == key else None
+
+
+def run_portfolio(source: str, out_dir: str, config: PipelineConfig = PipelineConfig(),
+                  store_root: str = None) -> dict:
+    """Run Steps 1-3 and 5 for one portfolio file and return its report.
+
+    Completed stages with a matching checkpoint in ``out_dir`` are loaded
+    instead of recomputed.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    start = time.perf_counter()
+
+    # Step 1: parsing is cheap next to the later stages, so it always reruns
+    # and its content hash decides whether the other checkpoints still hold.
+    with telemetry.span("pipeline.ingest", portfolio=os.path.basename(source)):
+        portfolio = read_portfolio(source)
+        exposure = exposure_table(portfolio)
+        _write_atomic(os.path.join(out_dir, "exposure.csv"), lambda tmp: exposure.to_csv(tmp, index=False))
+    catalog_key = content_key("catalog", portfolio_hash(portfolio), config.params)
+
+    # Step 2: scenario simulation into the shared YLT store.
+    catalog_path = os.path.join(out_dir, "catalog.json")
+    with telemetry.span("pipeline.simulate", portfolio=os.path.basename(source)):
+        catalog = _load_checkpoint(catalog_path, catalog_key)
+        if catalog is None or not os.path.isdir(catalog["ylt_path"]):
+            ylt_path = simulate_to_store(portfolio, config.params, root=store_root)
+            summary = catalog_summary(open_ylt(ylt_path))
+            catalog = {"key": catalog_key, "ylt_path": os.path.abspath(ylt_path),
+                       **{k: summary[k] for k in ("n_years", "mean", "var", "cvar")}}
+            _save_json(catalog_path, catalog)
+    ylt = open_ylt(catalog["ylt_path"])
+
+    # Step 3: RL optimization against the catalog.
+    strategy_key = content_key("strategy", STRATEGY_FORMAT, catalog_key, config)
+    strategy_path = os.path.join(out_dir, "strategy.json")
+    with telemetry.span("pipeline.optimize", portfolio=os.path.basename(source)):
+        strategy = _load_checkpoint(strategy_path, strategy_key)
+        if strategy is None:
+            env = RetroEnv(LossBasis.from_ylt(ylt), weights=config.weights, max_premium=config.max_premium,
+                           capital=config.capital, pricing=config.pricing)
+            screen = ProgramScreen(aggregate_distribution(portfolio, config.params)) if config.screen else None
+            began = time.perf_counter()
+            result = train(env, config.iterations, n_envs=config.n_envs, seed=config.agent_seed, screen=screen)
+            strategy = {"key": strategy_key,
+                        **strategy_from_training(env, result, time.perf_counter() - began)}
+            _save_json(strategy_path, strategy)
+            strategy = _load_checkpoint(strategy_path, strategy_key)
+    program = _program_from_json(strategy["program"])
+
+    # Step 5: final structure and key performance metrics.
+    report_path = os.path.join(out_dir, "report.json")
+    with telemetry.span("pipeline.report", portfolio=os.path.basename(source)):
+        report = _load_checkpoint(report_path, strategy_key)
+        if report is None:
+            total_premium = float(program.premiums.sum())
+            surplus, tail_loss = program_metrics(ylt, program, config.capital)
+            table = structure_table(program, payouts=strategy["payouts"])
+            _write_atomic(os.path.join(out_dir, "structure.csv"), lambda tmp: table.to_csv(tmp, index=False))
+            report = {
+                "key": strategy_key,
+                "portfolio": os.path.basename(source),
+                "n_years": ylt.n_years,
+                "seed": ylt.params.seed,
+                "gross_mean": catalog["mean"],
+                "gross_cvar": catalog["cvar"],
+                "total_premium": total_premium,
+                "expected_surplus": surplus,
+                "net_cvar": tail_loss,
+                "roi": float(return_on_risk_capital(surplus, tail_loss)),
+            }
+            _save_json(report_path, report)
+
+    error_path = os.path.join(out_dir, ERROR_FILE)
+    if os.path.exists(error_path):
+        os.unlink(error_path)
+    return {**report, "elapsed": time.perf_counter() - start}
+
+
+def find_portfolios(directory: str) -> list:
+    """Portfolio files directly inside ``directory``, sorted by name."""
+    return sorted(
+        os.path.join(directory, name) for name in os.listdir(directory)
+        if name.lower().endswith(PORTFOLIO_SUFFIXES) and not name.startswith((".", "~$"))
+    )
+
+
+def _run_one(source, out_dir, config, store_root):
+    # Pool entry point: failures are recorded next to the portfolio's output
+    # and reported instead of aborting the rest of the batch.
+    try:
+        return run_portfolio(source, out_dir, config, store_root)
+    except Exception as exc:
+        os.makedirs(out_dir, exist_ok=True)
+        with open(os.path.join(out_dir, ERROR_FILE), "w") as fh:
+            fh.write(traceback.format_exc())
+        return {"portfolio": os.path.basename(source), "error": f"{type(exc).__name__}: {exc}"}
+
+
+def run_batch(source_dir: str, out_root: str, config: PipelineConfig = PipelineConfig(),
+              workers: int = None, store_root: str = None, progress=None) -> pd.DataFrame:
+    """Run every portfolio in ``source_dir`` on a pool of ``workers`` processes.
+
+    Each portfolio simulates on a single process; the pool spreads
+    portfolios across cores instead.  ``progress(report)`` is called as each
+    portfolio finishes.  Returns the batch metrics, also written to
+    ``<out_root>/metrics.csv``; failed portfolios carry an ``error``.
+    """
+    sources = find_portfolios(source_dir)
+    os.makedirs(out_root, exist_ok=True)
+    workers = max(1, min(workers or default_workers(), len(sources) or 1))
+    jobs = [(source, os.path.join(out_root, os.path.basename(source)), config, store_root)
+            for source in sources]
+
+    reports = {}
+    if workers == 1:
+        for job in jobs:
+            reports[job[0]] = _run_one(*job)
+            if progress is not None:
+                progress(reports[job[0]])
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = {pool.submit(_run_one, *job): job[0] for job in jobs}
+            for future in as_completed(futures):
+                reports[futures[future]] = future.result()
+                if progress is not None:
+                    progress(reports[futures[future]])
+
+    metrics = pd.DataFrame([reports[source] for source in sources]).drop(columns="key", errors="ignore")
+    _write_atomic(os.path.join(out_root, METRICS_FILE), lambda tmp: metrics.to_csv(tmp, index=False))
+    return metrics
@@ -0,0 +1,38 @@
+"""Portfolio definitions shared by the Streamlit pages and the engines.
+
+The portfolio is a plain DataFrame using the display column names shown on
+the Step 1 page, so the same frame can be rendered and simulated.
+"""
+
+import numpy as np
+import pandas as pd
+
+REGION = "Region"
+TIV = "TIV ($M)"
+EXPECTED_LOSS = "Expected Loss ($M)"
+LINE_OF_BUSINESS = "Line of Business"
+
+
+def sample_portfolio() -> pd.DataFrame:
+    """Return the placeholder portfolio used when no file is uploaded."""
+    return pd.DataFrame({
+        REGION: ["Florida", "Gulf Coast", "Northeast"],
+        TIV: [300, 250, 180],
+        EXPECTED_LOSS: [45, 38, 20],
+        LINE_OF_BUSINESS: ["Property CAT", "Property All Risk", "Commercial Lines"]
+    })
+
+
+def region_exposure(portfolio: pd.DataFrame):
+    """Aggregate a portfolio to one row per region.
+
+    Returns ``(regions, tiv, expected_loss)`` where ``regions`` is a list of
+    region names in first-seen order and the other two are float64 arrays.
+    """
+    grouped = portfolio.groupby(REGION, sort=False, observed=True)[[TIV, EXPECTED_LOSS]].sum()
+    regions = [str(r) for r in grouped.index]
+    tiv = grouped[TIV].to_numpy(dtype=np.float64)
+    expected_loss = grouped[EXPECTED_LOSS].to_numpy(dtype=np.float64)
+    if np.any(tiv <= 0) or np.any(expected_loss <= 0):
+        raise ValueError("Every region needs a positive TIV and Expected Loss.")
+    return regions, tiv, expected_loss
@@ -0,0 +1,194 @@
+"""Layer pricing from the simulated catalog (Step 3 premiums).
+
+A layer's premium is its expected loss plus a risk load on the capital its
+tail consumes::
+
+    premium = (1 + expense_load) * EL + cost_of_capital * (TVaR - EL)
+
+where EL and TVaR are the expected and tail (CVaR at ``level``) annual
+recovery of the layer over the catalog.  Both depend only on a cover's
+retention and limit once its reinstatements and ILW trigger are fixed, and
+both scale with the ceded share, so :class:`LayerPricer` scores a
+``(retention, limit)`` grid per cover type once per catalog.  Pricing any
+candidate afterwards is a bilinear interpolation in those tables --
+constant time per layer, with no pass over the simulated years.
+
+Tabulation cost grows with the catalog (about 13 s at 100k years, a few
+minutes at 1M), so catalogs above ``max_years`` (default
+:data:`MAX_TABLE_YEARS`, overridable with the ``RETRO_TABLE_YEARS`` variable;
+0 uses every year) are tabulated on a stratified subsample of that many
+years (:func:`table_basis`): every year in the tail of the annual total or
+of the largest event, which is where TVaR and most of EL come from, plus
+an even stride through the rest, reweighted so every estimate stays
+unbiased.  On the sample portfolio, 20k-year tables price layers within 2%
+of full 100k-year tables (within 7% at 1M years), where a plain strided
+subsample was off by up to 20%.
+"""
+
+import math
+import os
+from dataclasses import dataclass, replace
+
+import numpy as np
+
+from . import telemetry
+from .layers import LossBasis, ProgramBatch, batch_recoveries
+from .metrics import var_cvar, weighted_mean
+
+# Grid points per axis of each rate table.
+DEFAULT_GRID_SIZE = 33
+# Upper bound on (layers x years) cells scored at once while tabulating.
+MAX_TABLE_CELLS = 1 << 24
+# Larger catalogs are tabulated on a stratified subsample of this many years.
+MAX_TABLE_YEARS = 20_000
+
+
+def default_table_years() -> int:
+    """Tabulation subsample size, overridable with ``RETRO_TABLE_YEARS`` (0: no cap)."""
+    return int(os.environ.get("RETRO_TABLE_YEARS", MAX_TABLE_YEARS))
+
+
+@dataclass(frozen=True)
+class PricingModel:
+    """Market pricing assumptions."""
+
+    expense_load: float = 0.10      # brokerage and expenses, on expected loss
+    cost_of_capital: float = 0.05   # return required on the tail capital (TVaR - EL)
+    level: float = 0.99             # tail level of the TVaR
+
+    def premium(self, expected, tail):
+        return (1.0 + self.expense_load) * expected + self.cost_of_capital * (tail - expected)
+
+
+@dataclass(frozen=True, eq=False)
+class RateTable:
+    """Expected loss and premium of one cover type on a uniform ``(retention, limit)`` grid.
+
+    Values are for a 100% share; grid index ``[i, j]`` is retention
+    ``i * max_retention / (n - 1)`` and limit ``j * max_limit / (n - 1)``.
+    """
+
+    cover: str
+    reinstatements: float
+    trigger: float
+    max_retention: float
+    max_limit: float
+    expected: np.ndarray
+    premium: np.ndarray
+
+    def lookup(self, table: np.ndarray, retention, limit) -> np.ndarray:
+        """Bilinear interpolation of ``table``; terms beyond the grid are clamped to its edge."""
+        n = table.shape[0] - 1
+        x = np.clip(np.asarray(retention, dtype=np.float32) * (n / max(self.max_retention, 1e-12)), 0, n)
+        y = np.clip(np.asarray(limit, dtype=np.float32) * (n / max(self.max_limit, 1e-12)), 0, n)
+        i = np.minimum(x.astype(np.intp), n - 1)
+        j = np.minimum(y.astype(np.intp), n - 1)
+        fx, fy = x - i, y - j
+        return ((table[i, j] * (1 - fx) + table[i + 1, j] * fx) * (1 - fy)
+                + (table[i, j + 1] * (1 - fx) + table[i + 1, j + 1] * fx) * fy)
+
+
+def table_basis(basis: LossBasis, max_years: int = None, level: float = 0.99) -> LossBasis:
+    """The years rate tables are scored on: the whole catalog, or a stratified subsample.
+
+    Up to half of ``max_years`` go to the largest years by annual total and
+    by largest event -- at least 1.5 times the ``1 - level`` tail of each
+    where that fits -- and the rest to an even stride through the other
+    years.  Weights (times any the catalog already has) make the subsample's
+    weighted estimates match the catalog's.
+    """
+    max_years = default_table_years() if max_years is None else max_years
+    n = basis.n_years
+    if not 0 < max_years < n:
+        return basis
+    k = min(max_years // 2, max(max_years // 4, math.ceil(1.5 * n * (1.0 - level))))
+    tail = np.zeros(n, dtype=bool)
+    for losses in (basis.total, basis.top_events[:, 0]):
+        tail[np.argpartition(losses, n - k)[n - k:]] = True
+    rest = np.flatnonzero(~tail)
+    # Every stride-th body year, rounding the stride up to stay within the budget.
+    stride = -(-rest.size // max(max_years - int(tail.sum()), 1))
+    picked = rest[::stride]
+    years = np.flatnonzero(tail)
+    years = np.sort(np.concatenate([years, picked]))
+    weights = np.where(tail[years], 1.0, rest.size / picked.size) * (years.size / n)
+    if basis.weights is not None:
+        weights *= basis.weights[years]
+    return replace(basis[years], weights=weights.astype(np.float32))
+
+
+def rate_table(basis: LossBasis, cover: str, max_retention: float, max_limit: float,
+               reinstatements: float = 0, trigger: float = 0.0, model: PricingModel = PricingModel(),
+               grid_size: int = DEFAULT_GRID_SIZE, max_years: int = None) -> RateTable:
+    """Score ``grid_size ** 2`` layers of ``cover`` on the catalog and tabulate their price.
+
+    Catalogs above ``max_years`` are scored on their :func:`table_basis`.
+    """
+    basis = table_basis(basis, max_years, model.level)
+    retention, limit = np.meshgrid(np.linspace(0.0, max_retention, grid_size, dtype=np.float32),
+                                   np.linspace(0.0, max_limit, grid_size, dtype=np.float32), indexing="ij")
+    retention, limit = retention.reshape(-1, 1), limit.reshape(-1, 1)
+    layers = ProgramBatch(
+        covers=(cover,), retention=retention, limit=limit,
+        reinstatements=np.full_like(limit, reinstatements), trigger=np.full_like(limit, trigger),
+        share=np.ones_like(limit),
+    )
+    expected = np.empty(layers.n_programs)
+    tail = np.empty(layers.n_programs)
+    step = max(1, MAX_TABLE_CELLS // max(basis.n_years, 1))
+    for start in range(0, layers.n_programs, step):
+        rows = slice(start, start + step)
+        recoveries = batch_recoveries(basis, layers[rows])
+        expected[rows] = weighted_mean(recoveries, basis.weights)
+        tail[rows] = var_cvar(recoveries, model.level, basis.weights)[1]
+    shape = (grid_size, grid_size)
+    return RateTable(cover, float(reinstatements), float(trigger), float(max_retention), float(max_limit),
+                     expected.reshape(shape), model.premium(expected, tail).reshape(shape))
+
+
+class LayerPricer:
+    """Rate tables for every cover type of a program layout, looked up per slot."""
+
+    def __init__(self, tables, model: PricingModel = PricingModel()):
+        self.tables = {table.cover: table for table in tables}
+        self.model = model
+
+    @classmethod
+    def from_basis(cls, basis: LossBasis, covers, max_retention, max_limit, reinstatements, trigger,
+                   model: PricingModel = PricingModel(), grid_size: int = DEFAULT_GRID_SIZE,
+                   max_years: int = None) -> "LayerPricer":
+        """Tabulate each of ``covers`` up to its maximum retention and limit.
+
+        The per-cover sequences give the grid extent and the fixed
+        reinstatements and trigger every priced layer of that cover must have.
+        """
+        with telemetry.span("rate_tables", years=basis.n_years, grid=grid_size):
+            basis = table_basis(basis, max_years, model.level)
+            return cls([rate_table(basis, cover, *terms, model=model, grid_size=grid_size, max_years=0)
+                        for cover, *terms in zip(covers, max_retention, max_limit, reinstatements, trigger)],
+                       model)
+
+    def _slots(self, batch: ProgramBatch):
+        for j, cover in enumerate(batch.covers):
+            table = self.tables.get(cover)
+            if table is None:
+                raise ValueError(f"No rate table for cover type {cover!r}.")
+            if (np.any(batch.reinstatements[:, j] != table.reinstatements)
+                    or np.any(batch.trigger[:, j] != table.trigger)):
+                raise ValueError(f"{cover} layers must have the tabulated reinstatements and trigger "
+                                 f"({table.reinstatements:g}, {table.trigger:g}).")
+            yield j, table
+
+    def _lookup(self, batch: ProgramBatch, field: str) -> np.ndarray:
+        out = np.empty(batch.limit.shape, dtype=np.float32)
+        for j, table in self._slots(batch):
+            out[:, j] = table.lookup(getattr(table, field), batch.retention[:, j], batch.limit[:, j])
+        return out * batch.share
+
+    def expected_loss(self, batch: ProgramBatch) -> np.ndarray:
+        """Interpolated expected recovery of every layer slot, shape ``(programs, layers)``."""
+        return self._lookup(batch, "expected")
+
+    def premiums(self, batch: ProgramBatch) -> np.ndarray:
+        """Premium of every layer slot, shape ``(programs, layers)``."""
+        return self._lookup(batch, "premium")
@@ -0,0 +1,278 @@
+"""Retro purchasing environment and policy-gradient agent (Step 3).
+
+Each episode is one renewal decision: the agent picks retention and limit
+for the XoL, ILW and sidecar layers (plus the sidecar share) and receives a
+reward scored against every simulated year of the catalog.  The
+environment is batched -- ``step`` takes an ``(n_envs, action_dim)`` array
+and scores all programs with a single :func:`batch_recoveries` call -- so
+one training iteration is a few large NumPy operations.
+
+The agent is a diagonal Gaussian policy in logit space trained with
+REINFORCE (normalised advantages, Adam updates).  The app runs
+:func:`train` as a background job (:mod:`.jobs`) so the Streamlit script
+thread never blocks; NumPy releases the GIL inside the heavy array
+operations.
+"""
+
+from dataclasses import dataclass, field
+
+import numpy as np
+
+from . import telemetry
+from .layers import LossBasis, ProgramBatch, batch_recoveries
+from .metrics import exceedance_curve, var_cvar, weighted_mean
+from .pricing import LayerPricer, PricingModel
+
+COVERS = ("XoL", "ILW", "Sidecar")
+ACTION_LABELS = (
+    "XoL retention", "XoL limit",
+    "ILW retention", "ILW limit",
+    "Sidecar retention", "Sidecar limit", "Sidecar share",
+)
+# Action coordinates holding the layer limits.
+LIMIT_ACTIONS = [1, 3, 5]
+# Bisection steps when scaling limits back onto the premium budget.
+BUDGET_BISECTIONS = 24
+# Reward deducted from programs over budget, plus the relative overspend.
+BUDGET_PENALTY = 1.0
+
+
+@dataclass
+class Evaluation:
+    """Scores of a batch of programs, one entry per program."""
+
+    reward: np.ndarray
+    surplus: np.ndarray
+    cvar: np.ndarray
+    premium: np.ndarray
+    feasible: np.ndarray
+
+
+class RetroEnv:
+    """Batched one-step retro purchasing environment.
+
+    Actions live in ``[0, 1]`` and are scaled to layer terms.  Retentions
+    and limits range up to the 1-in-250 loss of the variable each layer
+    responds to (largest event for XoL, annual aggregate otherwise).
+    Layers are priced from rate tables tabulated over that range
+    (:mod:`.pricing`), and :meth:`step` holds every program to the premium
+    budget by scaling its limits back (:meth:`constrain`).
+    """
+
+    action_dim = len(ACTION_LABELS)
+
+    def __init__(self, basis: LossBasis, weights=(0.4, 0.4, 0.2), max_premium: float = 20.0,
+                 capital: float = 150.0, level: float = 0.99, pricing: PricingModel = PricingModel(),
+                 ilw_trigger: float = 20_000.0, reinstatements: int = 1, pricer: LayerPricer = None):
+        total = sum(weights)
+        self.weights = tuple(w / total for w in weights) if total > 0 else (0.4, 0.4, 0.2)
+        self.basis = basis
+        self.max_premium = max_premium
+        self.capital = capital
+        self.level = level
+        self.ilw_trigger = ilw_trigger
+        self.reinstatements = reinstatements
+
+        self.gross_cvar = float(var_cvar(basis.total, level, basis.weights)[1])
+        event_cap, total_cap = (float(exceedance_curve(x, (250,), basis.weights)[0])
+                                for x in (basis.top_events[:, 0], basis.total))
+        self.upper = np.array([event_cap, event_cap, total_cap, total_cap,
+                               total_cap, total_cap, 1.0], dtype=np.float32)
+        # Tabulating the rates is the costly part of construction; envs on
+        # the same catalog and terms can share one pricer.
+        self.pricer = pricer or LayerPricer.from_basis(
+            basis, COVERS, self.upper[[0, 2, 4]], self.upper[LIMIT_ACTIONS],
+            reinstatements=(reinstatements, 0, 0), trigger=(0.0, ilw_trigger, 0.0), model=pricing,
+        )
+
+    def reset(self, n_envs: int) -> np.ndarray:
+        """Observation for each environment: the catalog's normalised gross profile."""
+        obs = np.array([weighted_mean(self.basis.total, self.basis.weights) / self.capital,
+                        self.gross_cvar / self.capital],
+                       dtype=np.float32)
+        return np.tile(obs, (n_envs, 1))
+
+    def decode(self, actions) -> ProgramBatch:
+        """Scale ``[0, 1]`` actions to a :class:`ProgramBatch`."""
+        terms = np.clip(np.asarray(actions, dtype=np.float32), 0.0, 1.0) * self.upper
+        n = terms.shape[0]
+        ones = np.ones((n, 1), dtype=np.float32)
+        return ProgramBatch(
+            covers=COVERS,
+            retention=terms[:, [0, 2, 4]],
+            limit=terms[:, [1, 3, 5]],
+            reinstatements=np.hstack([ones * self.reinstatements, 0 * ones, 0 * ones]),
+            trigger=np.hstack([0 * ones, ones * self.ilw_trigger, 0 * ones]),
+            share=np.hstack([ones, ones, terms[:, 6:7]]),
+        )
+
+    def premium(self, batch: ProgramBatch) -> np.ndarray:
+        """Total premium of every program, from the rate tables."""
+        return self.pricer.premiums(batch).sum(axis=1)
+
+    def constrain(self, actions) -> np.ndarray:
+        """Scale each action's limits back until its program fits the premium budget.
+
+        Premiums grow with the limits, so a bisection on one common factor
+        per program finds the largest scaled program within budget; programs
+        already within budget are returned unchanged.
+        """
+        actions = np.clip(np.array(actions, dtype=np.float64), 0.0, 1.0)
+        over = np.flatnonzero(self.premium(self.decode(actions)) > self.max_premium)
+        if over.size == 0:
+            return actions
+        low, high = np.zeros(over.size), np.ones(over.size)
+        for _ in range(BUDGET_BISECTIONS):
+            mid = 0.5 * (low + high)
+            trial = actions[over]
+            trial[:, LIMIT_ACTIONS] *= mid[:, None]
+            fits = self.premium(self.decode(trial)) <= self.max_premium
+            low, high = np.where(fits, mid, low), np.where(fits, high, mid)
+        actions[np.ix_(over, LIMIT_ACTIONS)] *= low[:, None]
+        return actions
+
+    def evaluate(self, batch: ProgramBatch, screen=None) -> Evaluation:
+        """Score ``batch`` on the catalog, or approximately on an analytical ``screen``.
+
+        ``screen`` is an :class:`~.aggregate.ProgramScreen` of the same
+        portfolio; see :func:`train` for screening with confirmation.
+        """
+        with telemetry.span("evaluate", programs=batch.n_programs, screened=screen is not None):
+            if screen is None:
+                basis, recoveries = self.basis, batch_recoveries(self.basis, batch)
+            else:
+                basis, recoveries = screen, screen.recoveries(batch)
+            weights = basis.weights
+            premium = self.premium(batch)
+            np.subtract(basis.total, recoveries, out=recoveries)   # now net losses
+            surplus = self.capital - weighted_mean(recoveries, weights) - premium
+            tail = var_cvar(recoveries, self.level, weights)[1]
+        telemetry.count("screened_programs" if screen is not None else "evaluated_programs", batch.n_programs)
+
+        reward, feasible = self.reward(surplus, tail, premium)
+        return Evaluation(reward, surplus, tail, premium, feasible)
+
+    def reward(self, surplus, tail, premium, weights=None, max_premium=None):
+        """Scalarised reward and budget feasibility of scored programs.
+
+        ``weights`` and ``max_premium`` default to the environment's own and
+        broadcast against the program axis, so one call can score the same
+        programs under many slider settings.
+        """
+        weights = self.weights if weights is None else weights
+        w_surplus, w_cvar, w_cost = (np.asarray(w) for w in weights)
+        max_premium = np.asarray(self.max_premium if max_premium is None else max_premium)
+        reward = (w_surplus * surplus / self.capital
+                  - w_cvar * tail / self.gross_cvar
+                  - w_cost * premium / max_premium)
+        feasible = premium <= max_premium
+        overspend = np.maximum(premium - max_premium, 0.0) / max_premium
+        return np.where(feasible, reward, reward - BUDGET_PENALTY - overspend), feasible
+
+    def step(self, actions):
+        """Score one action per environment, within budget; every episode ends after one step."""
+        evaluation = self.evaluate(self.decode(self.constrain(actions)))
+        done = np.ones(len(evaluation.reward), dtype=bool)
+        return self.reset(len(done)), evaluation.reward, done, evaluation
+
+    def program(self, action) -> ProgramBatch:
+        """The priced one-program batch encoded by a single action."""
+        return self.price(self.decode(np.asarray(action)[None, :]))
+
+    def price(self, batch: ProgramBatch) -> ProgramBatch:
+        """``batch`` with every layer priced from the rate tables."""
+        return batch.priced(self.pricer.premiums(batch))
+
+
+@dataclass
+class TrainingResult:
+    best_action: np.ndarray
+    best_reward: float
+    iterations: int
+    history: list = field(default_factory=list)     # best reward per iteration
+
+
+class GaussianPolicyAgent:
+    """Diagonal Gaussian policy over action logits, trained with REINFORCE."""
+
+    def __init__(self, action_dim: int, seed: int = 0, lr: float = 0.1, init_std: float = 1.0):
+        self.rng = np.random.default_rng(seed)
+        self.mean = np.zeros(action_dim)
+        self.log_std = np.full(action_dim, np.log(init_std))
+        self.lr = lr
+        self._m = np.zeros(2 * action_dim)
+        self._v = np.zeros(2 * action_dim)
+        self._t = 0
+
+    def sample(self, n: int):
+        """Return ``(logits, actions)`` for ``n`` environments."""
+        logits = self.mean + np.exp(self.log_std) * self.rng.standard_normal((n, self.mean.size))
+        return logits, 1.0 / (1.0 + np.exp(-logits))
+
+    def update(self, logits, rewards) -> None:
+        advantage = rewards - rewards.mean()
+        scale = advantage.std()
+        if scale == 0:
+            return
+        advantage /= scale
+        std = np.exp(self.log_std)
+        eps = (logits - self.mean) / std
+        grad = np.concatenate([
+            (advantage[:, None] * eps / std).mean(axis=0),
+            (advantage[:, None] * (eps ** 2 - 1.0)).mean(axis=0),
+        ])
+        # Adam ascent step.
+        self._t += 1
+        self._m = 0.9 * self._m + 0.1 * grad
+        self._v = 0.999 * self._v + 0.001 * grad ** 2
+        step = self.lr * (self._m / (1 - 0.9 ** self._t)) / (np.sqrt(self._v / (1 - 0.999 ** self._t)) + 1e-8)
+        d = self.mean.size
+        self.mean += step[:d]
+        self.log_std = np.clip(self.log_std + step[d:], np.log(0.02), np.log(3.0))
+
+
+def _score_actions(env: RetroEnv, actions, screen, confirm: int):
+    # Rewards the policy learns from, plus the candidates eligible as the
+    # best program with their catalog rewards (-inf when over budget).
+    actions = env.constrain(actions)
+    if screen is None:
+        _, rewards, _, evaluation = env.step(actions)
+        return rewards, actions, np.where(evaluation.feasible, rewards, -np.inf)
+    screened = env.evaluate(env.decode(actions), screen)
+    ranked = np.argsort(np.where(screened.feasible, screened.reward, -np.inf))[::-1][:confirm]
+    confirmed = env.evaluate(env.decode(actions[ranked]))
+    return screened.reward, actions[ranked], np.where(confirmed.feasible, confirmed.reward, -np.inf)
+
+
+def train(env: RetroEnv, iterations: int = 100, n_envs: int = 48, seed: int = 0,
+          progress=None, should_stop=None, screen=None, confirm: int = 4) -> TrainingResult:
+    """Train a :class:`GaussianPolicyAgent` on ``env``.
+
+    ``progress(iteration, best_reward)`` is called after every iteration and
+    training ends early when ``should_stop()`` returns true.  With an
+    analytical ``screen`` the policy learns from screened rewards and only
+    the ``confirm`` best programs of each iteration are scored on the
+    catalog, so the reported best reward is always a catalog figure.
+    """
+    agent = GaussianPolicyAgent(env.action_dim, seed=seed)
+    best_action, best_reward = None, -np.inf
+    history = []
+    iteration = 0
+    with telemetry.span("train", iterations=iterations, n_envs=n_envs, screened=screen is not None):
+        for iteration in range(1, iterations + 1):
+            if should_stop is not None and should_stop():
+                break
+            logits, actions = agent.sample(n_envs)
+            rewards, pool, candidates = _score_actions(env, actions, screen, confirm)
+            i = int(np.argmax(candidates))
+            if candidates[i] > best_reward:
+                best_reward, best_action = float(candidates[i]), pool[i].copy()
+            agent.update(logits, rewards)
+            history.append(best_reward)
+            if progress is not None:
+                progress(iteration, best_reward)
+        if best_action is None:
+            # Nothing affordable was sampled; buying no cover is always feasible.
+            best_action = np.zeros(env.action_dim)
+            best_reward = float(env.step(best_action[None, :])[1][0])
+    return TrainingResult(best_action, best_reward, iteration, history)
@@ -0,0 +1,431 @@
+"""Event-level catastrophe loss simulation (Step 2 stochastic generator).
+
+Every region draws a Poisson number of events per year and a lognormal
+severity per event, capped at the region's TIV.  The lognormal location is
+calibrated so that the uncapped mean annual loss of a region equals its
+Expected Loss from the Step 1 portfolio.
+
+All draws for a block of years are made with a handful of batched NumPy
+calls; there is no per-year Python loop.  The catalog is cut into fixed
+size chunks and every chunk gets its own child of
+``np.random.SeedSequence(seed)``, so a given ``(seed, chunk_years)`` always
+reproduces the same catalog no matter how the chunks are scheduled.
+
+By default regions are independent.  Setting ``copula`` to ``"gaussian"``
+or ``"t"`` correlates regional severities within a year and ``clustering``
+makes counts negative binomial through a shared season multiplier; see
+:mod:`.copula`.  Both keep every region's mean annual loss unchanged.
+``sampling`` and ``tail_tilt`` select the variance-reduction schemes of
+:mod:`.variance`; tilted catalogs carry a likelihood-ratio weight per year.
+"""
+
+import math
+from dataclasses import dataclass, field
+
+import numpy as np
+import pandas as pd
+
+from . import telemetry
+from .copula import COPULAS, Dependence, cholesky_factor, copula_draws, copula_transform, season_multiplier
+from .portfolio import REGION, region_exposure
+from .variance import likelihood_ratio, sampling_scheme, stratified_normals
+
+# Largest events of a year kept in a dense (years, TOP_EVENTS) block, the
+# fast path of occurrence-layer evaluation.  A year can have any number of
+# events (the sample portfolio averages 6 and reaches 18, far more with
+# clustering); those ranked below the block go to the year's EventOverflow,
+# so per-occurrence recoveries remain exact for any retention.
+TOP_EVENTS = 8
+
+
+@dataclass(frozen=True)
+class SimulationParams:
+    """Knobs of the frequency/severity generator."""
+
+    n_years: int = 10_000
+    seed: int = 2024
+    frequency: float = 2.0          # mean events per region-year
+    severity_sigma: float = 1.0     # lognormal shape of a single event
+    chunk_years: int = 50_000       # years drawn per batched block
+    copula: str = "independent"     # cross-region severity dependence: "independent", "gaussian" or "t"
+    correlation: float = 0.5        # copula correlation, a scalar or a nested-tuple matrix
+    t_dof: float = 4.0              # degrees of freedom of the t copula
+    shock_weight: float = 0.5       # share of log-severity variance from the shared region-year shock
+    clustering: float = 0.0         # variance of the season rate multiplier; 0 gives Poisson counts
+    sampling: str = "monte_carlo"   # "monte_carlo", "antithetic" or "stratified" severities
+    tail_tilt: float = 0.0          # importance-sampling tilt toward bad years; 0 disables weights
+
+
+@dataclass
+class EventOverflow:
+    """Events ranked below the dense top-event block of their year, in year order.
+
+    ``years[i]`` is the year index of the event with loss ``losses[i]``.
+    """
+
+    years: np.ndarray               # (events,) int64, non-decreasing
+    losses: np.ndarray              # (events,) float32
+
+    @classmethod
+    def empty(cls) -> "EventOverflow":
+        return cls(np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32))
+
+    @classmethod
+    def concatenate(cls, parts) -> "EventOverflow":
+        """Join overflows of consecutive year blocks, already in absolute year indices."""
+        parts = list(parts)
+        if not parts:
+            return cls.empty()
+        return cls(np.concatenate([p.years for p in parts]), np.concatenate([p.losses for p in parts]))
+
+    def __len__(self) -> int:
+        return self.losses.shape[0]
+
+    def shifted(self, offset: int) -> "EventOverflow":
+        return EventOverflow(self.years + offset, self.losses)
+
+    def select(self, n_years: int, years) -> "EventOverflow":
+        """The overflow of ``table[years]`` for a table of ``n_years`` rows.
+
+        Forward slices are cut with a binary search or arithmetic; other
+        selections gather each picked year's run of events.
+        """
+        if isinstance(years, slice):
+            start, stop, step = years.indices(n_years)
+            if step == 1:
+                lo, hi = np.searchsorted(self.years, [start, stop])
+                return EventOverflow(self.years[lo:hi] - start, self.losses[lo:hi])
+            if step > 0:
+                offset = self.years - start
+                keep = (offset >= 0) & (self.years < stop) & (offset % step == 0)
+                return EventOverflow(offset[keep] // step, self.losses[keep])
+        index = np.arange(n_years)[years]
+        # Gather each selected year's run of events; a year picked twice
+        # contributes its events twice.
+        counts = np.bincount(self.years, minlength=n_years)
+        starts = np.cumsum(counts) - counts
+        picked = counts[index]
+        first = np.cumsum(picked) - picked
+        rows = np.repeat(np.arange(index.size), picked)
+        events = np.repeat(starts[index] - first, picked) + np.arange(rows.size)
+        return EventOverflow(rows.astype(np.int64), self.losses[events])
+
+
+@dataclass
+class EventCatalog:
+    """Dense year x event x region loss tensor.
+
+    ``losses[y, k, r]`` is the loss of the k-th event of year ``y`` in region
+    ``r`` and is zero for ``k >= counts[y, r]``.
+    """
+
+    regions: list
+    counts: np.ndarray
+    losses: np.ndarray
+    weights: np.ndarray = None      # (years,) likelihood ratios of a tilted catalog
+
+    @property
+    def n_years(self) -> int:
+        return self.losses.shape[0]
+
+    @property
+    def annual(self) -> np.ndarray:
+        """Aggregate loss per year and region, shape ``(years, regions)``."""
+        return self.losses.sum(axis=1)
+
+    @property
+    def max_event(self) -> np.ndarray:
+        """Largest single event loss in each year."""
+        return self.losses.max(axis=(1, 2), initial=0.0)
+
+    @property
+    def top_events(self) -> np.ndarray:
+        """The ``TOP_EVENTS`` largest event losses of each year, descending."""
+        return top_k_events(self.losses)
+
+    @property
+    def overflow(self) -> EventOverflow:
+        """Every event below the ``TOP_EVENTS`` largest of its year."""
+        return split_events(self.losses)[1]
+
+
+@dataclass
+class YearLossTable:
+    """Per-year aggregate losses, the input to layer evaluation and metrics."""
+
+    regions: list
+    annual: np.ndarray              # (years, regions) aggregate loss by region
+    top_events: np.ndarray          # (years, TOP_EVENTS) largest events, descending
+    params: SimulationParams = field(default_factory=SimulationParams)
+    weights: np.ndarray = None      # (years,) likelihood ratios of a tilted catalog, else None
+    overflow: EventOverflow = None  # events below the top block; None when there are none
+
+    @property
+    def n_years(self) -> int:
+        return self.annual.shape[0]
+
+    @property
+    def max_event(self) -> np.ndarray:
+        """Largest single event loss in each year (the OEP variable)."""
+        return self.top_events[:, 0]
+
+    @property
+    def total(self) -> np.ndarray:
+        """Portfolio aggregate loss per year."""
+        return self.annual.sum(axis=1)
+
+    def __getitem__(self, years: slice) -> "YearLossTable":
+        """The table restricted to a slice of years; memory maps stay memory maps."""
+        return YearLossTable(
+            self.regions, self.annual[years], self.top_events[years], self.params,
+            None if self.weights is None else self.weights[years],
+            None if self.overflow is None else self.overflow.select(self.n_years, years),
+        )
+
+
+def severity_mu(expected_loss, frequency, sigma: float) -> np.ndarray:
+    """Lognormal location giving ``frequency * E[severity] == expected_loss``."""
+    mean_severity = np.asarray(expected_loss, dtype=np.float64) / frequency
+    return np.log(mean_severity) - 0.5 * sigma ** 2
+
+
+def chunk_bounds(n_years: int, chunk_years: int) -> list:
+    """Split ``range(n_years)`` into ``(start, stop)`` blocks."""
+    if n_years <= 0 or chunk_years <= 0:
+        raise ValueError("n_years and chunk_years must be positive.")
+    starts = range(0, n_years, chunk_years)
+    return [(s, min(s + chunk_years, n_years)) for s in starts]
+
+
+def chunk_seeds(params: SimulationParams) -> list:
+    """One independent ``SeedSequence`` per chunk of the catalog."""
+    n_chunks = len(chunk_bounds(params.n_years, params.chunk_years))
+    return np.random.SeedSequence(params.seed).spawn(n_chunks)
+
+
+def dependence_model(params: SimulationParams, n_regions: int):
+    """The :class:`~.copula.Dependence` of ``params``, or None when regions are independent."""
+    if params.copula not in COPULAS:
+        raise ValueError(f"Unknown copula {params.copula!r}; expected one of {COPULAS}.")
+    if params.t_dof <= 0 or params.clustering < 0 or not 0.0 <= params.shock_weight <= 1.0:
+        raise ValueError("t_dof must be positive, clustering non-negative and shock_weight in [0, 1].")
+    if params.copula == "independent" and params.clustering == 0:
+        return None
+    chol = cholesky_factor(params.correlation, n_regions) if params.copula != "independent" else None
+    return Dependence(params.copula, chol, params.t_dof, params.shock_weight, params.clustering)
+
+
+@dataclass(frozen=True, eq=False)
+class EventModel:
+    """Calibrated generator inputs shared by every chunk of a catalog."""
+
+    regions: list
+    frequency: np.ndarray
+    mu: np.ndarray
+    sigma: float
+    tiv: np.ndarray
+    dependence: Dependence = None
+    sampling: object = None         # a variance.Sampling, or None for plain Monte Carlo
+
+    @property
+    def weighted(self) -> bool:
+        return self.sampling is not None and self.sampling.tail_tilt > 0
+
+
+def event_model(portfolio: pd.DataFrame, params: SimulationParams) -> EventModel:
+    regions, tiv, expected_loss = region_exposure(portfolio)
+    frequency = np.broadcast_to(np.asarray(params.frequency, dtype=np.float64), tiv.shape)
+    if np.any(frequency <= 0):
+        raise ValueError("frequency must be positive.")
+    mu = severity_mu(expected_loss, frequency, params.severity_sigma)
+    return EventModel(regions, frequency, mu, params.severity_sigma, tiv,
+                      dependence_model(params, len(regions)),
+                      sampling_scheme(params.sampling, params.tail_tilt))
+
+
+def simulate_chunk(seed_seq, n_years: int, model: EventModel):
+    """Draw one block of years and return ``(counts, losses, weights)``.
+
+    ``counts`` has shape ``(n_years, regions)`` and ``losses`` is the dense
+    ``(n_years, max_events, regions)`` float32 tensor, where ``max_events``
+    is the largest event count of any region-year in the block.
+    ``weights`` holds per-year likelihood ratios when the model is tilted
+    and is None otherwise.  Plain independent models draw exactly the
+    streams of the original generator.
+    """
+    rng = np.random.default_rng(seed_seq)
+    dependence, sampling = model.dependence, model.sampling
+    n_regions = len(model.tiv)
+    antithetic = sampling is not None and sampling.antithetic
+    n_draw = (n_years + 1) // 2 if antithetic else n_years
+    tilt = sampling.tail_tilt if sampling is not None else 0.0
+
+    rate = model.frequency
+    if dependence is not None and dependence.clustering > 0:
+        rate = model.frequency * season_multiplier(rng, n_draw, dependence.clustering)
+    counts = rng.poisson(rate * (1.0 + tilt) if tilt else rate, size=(n_draw, n_regions)).astype(np.int32)
+    n_drawn = int(counts.sum())
+    if sampling is not None and sampling.stratified:
+        noise = stratified_normals(rng, n_drawn)
+    else:
+        noise = rng.standard_normal(n_drawn)
+    raw = mixing = None
+    if dependence is not None and dependence.correlated_severity:
+        raw, mixing = copula_draws(rng, n_draw, dependence)
+
+    if antithetic:
+        # Replay the leading years with every normal draw negated.
+        mirrored = n_years - n_draw
+        noise = np.concatenate([noise, -noise[:int(counts[:mirrored].sum())]])
+        counts = np.concatenate([counts, counts[:mirrored]])
+        if raw is not None:
+            raw = np.concatenate([raw, -raw[:mirrored]])
+            mixing = None if mixing is None else np.concatenate([mixing, mixing[:mirrored]])
+        if np.ndim(rate) == 2:
+            rate = np.concatenate([rate, rate[:mirrored]])
+
+    # One flat draw for every event in the block, ordered by (year, region).
+    flat_counts = counts.ravel()
+    n_events = int(flat_counts.sum())
+    cell = np.repeat(np.arange(flat_counts.size), flat_counts)
+    region = cell % n_regions
+
+    weights = None
+    if tilt:
+        noise += tilt
+        if raw is not None:
+            raw += tilt
+        weights = likelihood_ratio(counts, rate, noise, cell // n_regions, tilt, raw)
+    if raw is not None:
+        w = dependence.shock_weight
+        shock = copula_transform(raw, mixing, dependence)
+        noise = math.sqrt(w) * shock.ravel()[cell] + math.sqrt(1.0 - w) * noise
+    severity = np.exp(noise * model.sigma + model.mu[region])
+    np.minimum(severity, model.tiv[region], out=severity)
+
+    # Position of each event inside its (year, region) cell.
+    starts = np.cumsum(flat_counts) - flat_counts
+    k = np.arange(n_events) - np.repeat(starts, flat_counts)
+
+    width = int(flat_counts.max(initial=0))
+    losses = np.zeros((n_years, width, n_regions), dtype=np.float32)
+    losses[cell // n_regions, k, region] = severity
+    return counts, losses, weights
+
+
+def top_k_events(losses: np.ndarray, k: int = TOP_EVENTS) -> np.ndarray:
+    """Largest ``k`` event losses per year of a dense event tensor, descending."""
+    return split_events(losses, k)[0]
+
+
+def split_events(losses: np.ndarray, k: int = TOP_EVENTS):
+    """``(top, overflow)``: the ``k`` largest events of each year, descending, and the rest.
+
+    Together they hold every non-zero event of the tensor exactly once.
+    """
+    flat = losses.reshape(losses.shape[0], -1)
+    top = np.zeros((flat.shape[0], k), dtype=np.float32)
+    width = min(k, flat.shape[1])
+    if width == 0:
+        return top, EventOverflow.empty()
+    part = np.partition(flat, flat.shape[1] - width, axis=1)
+    ranked = part[:, -width:]
+    ranked.sort(axis=1)
+    top[:, :width] = ranked[:, ::-1]
+    rest = part[:, :-width]
+    years, slots = np.nonzero(rest > 0)
+    return top, EventOverflow(years.astype(np.int64), rest[years, slots])
+
+
+def fill_chunk(seq, start: int, stop: int, model: EventModel,
+               annual: np.ndarray, top_events: np.ndarray, weights: np.ndarray = None) -> EventOverflow:
+    """Simulate years ``start:stop``, write their aggregate, top events and weights.
+
+    Returns the chunk's overflow events in absolute year indices.
+    """
+    _, losses, chunk_weights = simulate_chunk(seq, stop - start, model)
+    losses.sum(axis=1, out=annual[start:stop])
+    top_events[start:stop], overflow = split_events(losses, top_events.shape[1])
+    if weights is not None:
+        weights[start:stop] = chunk_weights
+    return overflow.shifted(start)
+
+
+def simulate_events(portfolio: pd.DataFrame, params: SimulationParams = SimulationParams()) -> EventCatalog:
+    """Simulate the full year x event x region tensor.
+
+    Meant for inspection and moderate catalog sizes; use
+    :func:`simulate_ylt` when only annual and occurrence losses are needed.
+    """
+    model = event_model(portfolio, params)
+    bounds = chunk_bounds(params.n_years, params.chunk_years)
+    blocks = [simulate_chunk(seq, stop - start, model)
+              for (start, stop), seq in zip(bounds, chunk_seeds(params))]
+    width = max(losses.shape[1] for _, losses, _ in blocks)
+    counts = np.concatenate([c for c, _, _ in blocks])
+    losses = np.zeros((params.n_years, width, len(model.regions)), dtype=np.float32)
+    for (start, stop), (_, block, _) in zip(bounds, blocks):
+        losses[start:stop, :block.shape[1]] = block
+    weights = np.concatenate([w for _, _, w in blocks]) if model.weighted else None
+    return EventCatalog(regions=model.regions, counts=counts, losses=losses, weights=weights)
+
+
+def simulate_into(portfolio: pd.DataFrame, params: SimulationParams,
+                  annual: np.ndarray, top_events: np.ndarray, weights: np.ndarray = None,
+                  progress=None):
+    """Fill preallocated ``annual``/``top_events`` (and ``weights``) arrays chunk by chunk.
+
+    The targets can be any writable arrays of the right shape, including
+    memory maps, so a catalog larger than RAM can be streamed to disk.
+    ``weights`` is required exactly when ``params`` is tilted.
+    ``progress(years_done)`` is called after every chunk.  Returns the
+    region names in column order and the catalog's :class:`EventOverflow`,
+    whose size is only known once simulated.
+    """
+    model = event_model(portfolio, params)
+    if model.weighted != (weights is not None):
+        raise ValueError("A weights array must be given exactly when tail_tilt > 0.")
+    bounds = chunk_bounds(params.n_years, params.chunk_years)
+    overflow = []
+    with telemetry.span("simulate", years=params.n_years, workers=1):
+        for (start, stop), seq in zip(bounds, chunk_seeds(params)):
+            overflow.append(fill_chunk(seq, start, stop, model, annual, top_events, weights))
+            telemetry.count("simulated_years", stop - start)
+            if progress is not None:
+                progress(stop)
+    return model.regions, EventOverflow.concatenate(overflow)
+
+
+def iter_ylt_chunks(portfolio: pd.DataFrame, params: SimulationParams = SimulationParams()):
+    """Yield ``(start, stop, annual, top_events, weights, overflow)`` for each chunk in order.
+
+    Lets callers consume a catalog while it is being simulated, e.g. to
+    update streaming tail estimates and stop early.  Because each chunk has
+    its own seed, stopping after chunk ``i`` leaves exactly the catalog a
+    run with ``n_years = stop`` would have produced.  ``weights`` is None
+    for untilted catalogs; ``overflow`` is in absolute year indices.
+    """
+    model = event_model(portfolio, params)
+    for (start, stop), seq in zip(chunk_bounds(params.n_years, params.chunk_years), chunk_seeds(params)):
+        annual = np.empty((stop - start, len(model.regions)), dtype=np.float32)
+        top_events = np.empty((stop - start, TOP_EVENTS), dtype=np.float32)
+        weights = np.empty(stop - start, dtype=np.float32) if model.weighted else None
+        with telemetry.span("simulate_chunk", years=stop - start):
+            overflow = fill_chunk(seq, 0, stop - start, model, annual, top_events, weights)
+        telemetry.count("simulated_years", stop - start)
+        yield start, stop, annual, top_events, weights, overflow.shifted(start)
+
+
+def simulate_ylt(portfolio: pd.DataFrame, params: SimulationParams = SimulationParams()) -> YearLossTable:
+    """Simulate a year loss table chunk by chunk.
+
+    Only one chunk's event tensor is alive at a time, so peak memory is set
+    by ``chunk_years`` rather than by ``n_years``.
+    """
+    n_regions = portfolio[REGION].nunique()
+    annual = np.empty((params.n_years, n_regions), dtype=np.float32)
+    top_events = np.empty((params.n_years, TOP_EVENTS), dtype=np.float32)
+    weights = np.empty(params.n_years, dtype=np.float32) if params.tail_tilt > 0 else None
+    regions, overflow = simulate_into(portfolio, params, annual, top_events, weights)
+    return YearLossTable(regions=regions, annual=annual, top_events=top_events, params=params, weights=weights,
+                         overflow=overflow)
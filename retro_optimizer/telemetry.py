@@ -0,0 +1,183 @@
+"""Opt-in timing spans, counters and memory high-water marks.
+
+The engines wrap their hot stages in :func:`span` and report work done
+with :func:`count`::
+
+    with telemetry.span("evaluate", programs=len(actions)):
+        ...
+    telemetry.count("evaluated_programs", len(actions))
+
+Recording is off unless ``RETRO_TELEMETRY=1`` is set or :func:`enable` is
+called.  While off, ``span`` hands back one shared no-op context manager
+and ``count`` returns at once, so instrumented code pays a global lookup
+per call.  While on, every finished span is kept -- with its thread and
+the process's peak RSS at that point -- in a bounded in-memory log that
+:func:`summary` aggregates and :func:`chrome_trace` exports in the Trace
+Event format read by ``chrome://tracing`` and Perfetto.
+
+The log is per process: spans recorded inside simulation worker processes
+are not collected, but the parent times and counts their chunks.
+"""
+
+import json
+import os
+import sys
+import threading
+import time
+from collections import deque
+from contextlib import nullcontext
+from dataclasses import dataclass
+
+# Finished spans kept before the oldest are dropped.
+MAX_SPANS = 20_000
+
+_enabled = os.environ.get("RETRO_TELEMETRY", "") not in ("", "0")
+_spans = deque(maxlen=MAX_SPANS)
+_counters = {}
+_lock = threading.Lock()
+_origin = time.perf_counter()
+_NOOP = nullcontext()
+
+
+def peak_rss_mb(children: bool = False):
+    """Peak resident set size of this process (or of its largest child) in MiB.
+
+    None where the ``resource`` module is unavailable (Windows).
+    """
+    try:
+        import resource
+    except ImportError:
+        return None
+    # ru_maxrss is in bytes on macOS and KiB elsewhere.
+    scale = 1 if sys.platform == "darwin" else 1024
+    who = resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF
+    return resource.getrusage(who).ru_maxrss * scale / 2 ** 20
+
+
+@dataclass(frozen=True)
+class SpanRecord:
+    """One finished span; times in seconds since the module was imported."""
+
+    name: str
+    start: float
+    duration: float
+    thread: str
+    attrs: dict
+    peak_rss_mb: float = None
+    error: str = None
+
+
+class _Span:
+    __slots__ = ("name", "attrs", "start", "open")
+
+    def __init__(self, name, attrs):
+        self.name, self.attrs = name, attrs
+        self.start, self.open = time.perf_counter(), True
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.finish(None if exc_type is None else exc_type.__name__)
+        return False
+
+    def finish(self, error: str = None) -> None:
+        if not self.open:
+            return
+        self.open = False
+        now = time.perf_counter()
+        _spans.append(SpanRecord(self.name, self.start - _origin, now - self.start,
+                                 threading.current_thread().name, self.attrs, peak_rss_mb(), error))
+
+
+def enabled() -> bool:
+    return _enabled
+
+
+def enable(on: bool = True) -> None:
+    """Switch recording on or off for the whole process."""
+    global _enabled
+    _enabled = bool(on)
+
+
+def span(name: str, **attrs):
+    """Context manager timing the enclosed block as ``name``."""
+    if not _enabled:
+        return _NOOP
+    return _Span(name, attrs)
+
+
+def begin(name: str, **attrs):
+    """Start a span that :func:`end` closes, for code that cannot use ``with``."""
+    return _Span(name, attrs) if _enabled else None
+
+
+def end(token) -> None:
+    """Close a span from :func:`begin`; None and already closed spans are ignored."""
+    if token is not None:
+        token.finish()
+
+
+def count(name: str, n: float = 1) -> None:
+    """Add ``n`` to the counter ``name``."""
+    if not _enabled:
+        return
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + n
+
+
+def spans() -> list:
+    return list(_spans)
+
+
+def counters() -> dict:
+    with _lock:
+        return dict(_counters)
+
+
+def reset() -> None:
+    """Forget every recorded span and counter."""
+    _spans.clear()
+    with _lock:
+        _counters.clear()
+
+
+def summary() -> list:
+    """Calls, total, mean and max time of each span name, slowest total first."""
+    groups = {}
+    for record in spans():
+        groups.setdefault(record.name, []).append(record.duration)
+    rows = [{"span": name, "calls": len(d), "total_s": sum(d), "mean_ms": 1e3 * sum(d) / len(d),
+             "max_ms": 1e3 * max(d)} for name, d in groups.items()]
+    return sorted(rows, key=lambda row: row["total_s"], reverse=True)
+
+
+def chrome_trace() -> dict:
+    """The log in Trace Event format, with counters and peak RSS as counter tracks."""
+    pid = os.getpid()
+    records = spans()
+    threads = {name: tid for tid, name in enumerate(dict.fromkeys(r.thread for r in records))}
+    events = [{"name": "thread_name", "ph": "M", "pid": pid, "tid": tid, "args": {"name": name}}
+              for name, tid in threads.items()]
+    for record in records:
+        args = dict(record.attrs)
+        if record.error is not None:
+            args["error"] = record.error
+        finished = (record.start + record.duration) * 1e6
+        events.append({"name": record.name, "cat": "retro", "ph": "X", "pid": pid, "tid": threads[record.thread],
+                       "ts": record.start * 1e6, "dur": record.duration * 1e6, "args": args})
+        if record.peak_rss_mb is not None:
+            events.append({"name": "peak RSS (MiB)", "ph": "C", "pid": pid, "ts": finished,
+                           "args": {"MiB": round(record.peak_rss_mb, 1)}})
+    last = max((r.start + r.duration for r in records), default=time.perf_counter() - _origin)
+    events.extend({"name": name, "ph": "C", "pid": pid, "ts": last * 1e6, "args": {"total": total}}
+                  for name, total in counters().items())
+    return {"traceEvents": events, "displayTimeUnit": "ms",
+            "otherData": {"counters": counters(), "peak_rss_mb": peak_rss_mb()}}
+
+
+def write_trace(path: str) -> None:
+    """Write :func:`chrome_trace` to ``path`` as JSON."""
+    with open(path, "w") as fh:
+        json.dump(chrome_trace(), fh, default=str)
@@ -0,0 +1,281 @@
+"""On-disk, memory-mapped year loss table (YLT) store.
+
+A stored catalog is a directory named after its content key::
+
+    <root>/<key>/
+        meta.json       format version, seed, simulation params, portfolio hash
+                        and the per-region exposure it was simulated from
+        annual.npy      float32 (years, regions), column-major so every
+                        region is one contiguous column
+        top_events.npy  float32 (years, TOP_EVENTS), largest events per year
+        weights.npy     float32 (years,), likelihood ratios; tilted catalogs only
+        overflow_years.npy   int64 (events,), year of every event below the
+        overflow_losses.npy  float32 (events,)  top block, in year order
+
+The dense arrays are written chunk by chunk straight from the simulator into
+``.npy`` memory maps; the overflow, whose length is only known at the end,
+is saved once every chunk is done.  ``meta.json`` is written last, inside a temporary
+directory that is renamed into place, so a directory with a header is always
+complete.  Readers open the arrays with ``mmap_mode="r"``: every process and
+browser session reading the same catalog shares the OS page cache instead of
+holding a private copy.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from dataclasses import asdict, replace
+
+import numpy as np
+import pandas as pd
+
+from .parallel import simulate_into_parallel
+from .portfolio import EXPECTED_LOSS, REGION, TIV, region_exposure
+from .simulation import TOP_EVENTS, EventOverflow, SimulationParams, YearLossTable, iter_ylt_chunks
+
+FORMAT_VERSION = 1
+READABLE_VERSIONS = (1,)
+META_FILE = "meta.json"
+ANNUAL_FILE = "annual.npy"
+TOP_EVENTS_FILE = "top_events.npy"
+WEIGHTS_FILE = "weights.npy"
+OVERFLOW_YEARS_FILE = "overflow_years.npy"
+OVERFLOW_LOSSES_FILE = "overflow_losses.npy"
+
+
+def default_root() -> str:
+    """Store location, overridable with the ``RETRO_YLT_DIR`` variable."""
+    return os.environ.get("RETRO_YLT_DIR", os.path.join(".retro_store", "ylt"))
+
+
+def portfolio_hash(portfolio: pd.DataFrame) -> str:
+    """Content hash of the exposure that drives the simulation."""
+    regions, tiv, expected_loss = region_exposure(portfolio)
+    digest = hashlib.sha256()
+    digest.update(json.dumps(regions).encode())
+    digest.update(tiv.tobytes())
+    digest.update(expected_loss.tobytes())
+    return digest.hexdigest()
+
+
+def catalog_key(portfolio: pd.DataFrame, params: SimulationParams) -> str:
+    """Directory name identifying a ``(portfolio, params)`` catalog."""
+    payload = json.dumps({"format": FORMAT_VERSION, "portfolio": portfolio_hash(portfolio),
+                          "params": asdict(params)}, sort_keys=True)
+    return hashlib.sha256(payload.encode()).hexdigest()[:20]
+
+
+def read_meta(path: str) -> dict:
+    with open(os.path.join(path, META_FILE)) as fh:
+        return json.load(fh)
+
+
+def stored_portfolio(path: str) -> pd.DataFrame:
+    """Per-region exposure the stored catalog was simulated from.
+
+    One row per region, so it has the same :func:`portfolio_hash` and event
+    model as the original book.
+    """
+    meta = read_meta(path)
+    return pd.DataFrame({REGION: meta["regions"], TIV: meta["tiv"], EXPECTED_LOSS: meta["expected_loss"]})
+
+
+def _write_meta(path: str, regions, params: SimulationParams, portfolio: pd.DataFrame) -> None:
+    _, tiv, expected_loss = region_exposure(portfolio)
+    meta = {
+        "format_version": FORMAT_VERSION,
+        "n_years": params.n_years,
+        "seed": params.seed,
+        "regions": list(regions),
+        "params": asdict(params),
+        "portfolio_hash": portfolio_hash(portfolio),
+        "tiv": tiv.tolist(),
+        "expected_loss": expected_loss.tolist(),
+    }
+    with open(os.path.join(path, META_FILE), "w") as fh:
+        json.dump(meta, fh, indent=2)
+
+
+def _allocate(path: str, n_years: int, n_regions: int, weighted: bool = False) -> None:
+    np.lib.format.open_memmap(os.path.join(path, ANNUAL_FILE), mode="w+", dtype=np.float32,
+                              shape=(n_years, n_regions), fortran_order=True).flush()
+    np.lib.format.open_memmap(os.path.join(path, TOP_EVENTS_FILE), mode="w+", dtype=np.float32,
+                              shape=(n_years, TOP_EVENTS)).flush()
+    if weighted:
+        np.lib.format.open_memmap(os.path.join(path, WEIGHTS_FILE), mode="w+", dtype=np.float32,
+                                  shape=(n_years,)).flush()
+
+
+def _truncate(path: str, n_years: int, weighted: bool) -> None:
+    # Keep the first ``n_years`` rows of the dense arrays.  annual.npy is
+    # column-major, so its rows are not a prefix of the file: copy into a new one.
+    names = [ANNUAL_FILE, TOP_EVENTS_FILE] + ([WEIGHTS_FILE] if weighted else [])
+    for name in names:
+        source = np.load(os.path.join(path, name), mmap_mode="r")
+        partial = os.path.join(path, "truncated-" + name)
+        target = np.lib.format.open_memmap(partial, mode="w+", dtype=source.dtype,
+                                           shape=(n_years,) + source.shape[1:],
+                                           fortran_order=source.flags.f_contiguous and source.ndim > 1)
+        target[:] = source[:n_years]
+        target.flush()
+        del source, target
+        os.replace(partial, os.path.join(path, name))
+
+
+def _save_overflow(path: str, overflow: EventOverflow) -> None:
+    overflow = overflow if overflow is not None else EventOverflow.empty()
+    np.save(os.path.join(path, OVERFLOW_YEARS_FILE), np.asarray(overflow.years, dtype=np.int64))
+    np.save(os.path.join(path, OVERFLOW_LOSSES_FILE), np.asarray(overflow.losses, dtype=np.float32))
+
+
+def _publish(tmp: str, final: str) -> str:
+    try:
+        os.replace(tmp, final)
+    except OSError:
+        # Another writer published the same catalog first; keep theirs.
+        shutil.rmtree(tmp, ignore_errors=True)
+    return final
+
+
+def is_complete(path: str) -> bool:
+    return os.path.isfile(os.path.join(path, META_FILE))
+
+
+def simulate_to_store(portfolio: pd.DataFrame, params: SimulationParams = SimulationParams(),
+                      root: str = None, workers: int = 1, progress=None) -> str:
+    """Simulate a catalog directly into the store and return its directory.
+
+    An existing complete catalog with the same key is reused as is.
+    ``progress(years_done)`` is called as chunks finish; an exception raised
+    from it abandons the partial catalog.
+    """
+    root = root or default_root()
+    final = os.path.join(root, catalog_key(portfolio, params))
+    if is_complete(final):
+        return final
+
+    os.makedirs(root, exist_ok=True)
+    tmp = tempfile.mkdtemp(prefix=".partial-", dir=root)
+    try:
+        weighted = params.tail_tilt > 0
+        _allocate(tmp, params.n_years, portfolio[REGION].nunique(), weighted)
+        weights_path = os.path.join(tmp, WEIGHTS_FILE) if weighted else None
+        regions, overflow = simulate_into_parallel(portfolio, params, os.path.join(tmp, ANNUAL_FILE),
+                                                   os.path.join(tmp, TOP_EVENTS_FILE), workers=workers,
+                                                   weights_path=weights_path, progress=progress)
+        _save_overflow(tmp, overflow)
+        _write_meta(tmp, regions, params, portfolio)
+    except BaseException:
+        shutil.rmtree(tmp, ignore_errors=True)
+        raise
+    return _publish(tmp, final)
+
+
+def stream_to_store(portfolio: pd.DataFrame, params: SimulationParams = SimulationParams(),
+                    stop=None, root: str = None) -> str:
+    """Simulate chunk by chunk into the store, optionally stopping early.
+
+    ``stop(years_done, annual, weights)`` is called with each chunk's rows as
+    it is written; once it returns true the catalog ends with that chunk
+    and is stored under ``n_years = years_done``, exactly as a run of that
+    length would have produced it.  Only one chunk is held in memory; the
+    overflow events go to raw files and become ``.npy`` arrays at the end.
+    An exception raised from ``stop`` abandons the partial catalog.
+    """
+    root = root or default_root()
+    os.makedirs(root, exist_ok=True)
+    tmp = tempfile.mkdtemp(prefix=".partial-", dir=root)
+    try:
+        weighted = params.tail_tilt > 0
+        regions = region_exposure(portfolio)[0]
+        _allocate(tmp, params.n_years, len(regions), weighted)
+        annual = np.load(os.path.join(tmp, ANNUAL_FILE), mmap_mode="r+")
+        top_events = np.load(os.path.join(tmp, TOP_EVENTS_FILE), mmap_mode="r+")
+        weights = np.load(os.path.join(tmp, WEIGHTS_FILE), mmap_mode="r+") if weighted else None
+        raw = [os.path.join(tmp, "raw-" + name) for name in (OVERFLOW_YEARS_FILE, OVERFLOW_LOSSES_FILE)]
+        n_events = done = 0
+        with open(raw[0], "wb") as years_out, open(raw[1], "wb") as losses_out:
+            for start, done, chunk_annual, chunk_top, chunk_weights, overflow in iter_ylt_chunks(portfolio, params):
+                annual[start:done] = chunk_annual
+                top_events[start:done] = chunk_top
+                if weighted:
+                    weights[start:done] = chunk_weights
+                np.asarray(overflow.years, dtype=np.int64).tofile(years_out)
+                np.asarray(overflow.losses, dtype=np.float32).tofile(losses_out)
+                n_events += len(overflow.years)
+                if stop is not None and stop(done, chunk_annual, chunk_weights):
+                    break
+        for array in (annual, top_events, weights):
+            if array is not None:
+                array.flush()
+        del annual, top_events, weights
+        if done < params.n_years:
+            _truncate(tmp, done, weighted)
+            params = replace(params, n_years=done)
+
+        if not n_events:
+            _save_overflow(tmp, None)
+        else:
+            for source, name, dtype in zip(raw, (OVERFLOW_YEARS_FILE, OVERFLOW_LOSSES_FILE), (np.int64, np.float32)):
+                target = np.lib.format.open_memmap(os.path.join(tmp, name), mode="w+", dtype=dtype,
+                                                   shape=(n_events,))
+                target[:] = np.memmap(source, dtype=dtype, mode="r", shape=(n_events,))
+                target.flush()
+                del target
+        for source in raw:
+            os.remove(source)
+        _write_meta(tmp, regions, params, portfolio)
+    except BaseException:
+        shutil.rmtree(tmp, ignore_errors=True)
+        raise
+    return _publish(tmp, os.path.join(root, catalog_key(portfolio, params)))
+
+
+def write_ylt(ylt: YearLossTable, portfolio: pd.DataFrame, root: str = None) -> str:
+    """Persist an in-memory table and return its directory."""
+    root = root or default_root()
+    final = os.path.join(root, catalog_key(portfolio, ylt.params))
+    if is_complete(final):
+        return final
+
+    os.makedirs(root, exist_ok=True)
+    tmp = tempfile.mkdtemp(prefix=".partial-", dir=root)
+    try:
+        _allocate(tmp, ylt.n_years, len(ylt.regions), ylt.weights is not None)
+        files = [(ANNUAL_FILE, ylt.annual), (TOP_EVENTS_FILE, ylt.top_events), (WEIGHTS_FILE, ylt.weights)]
+        for name, values in files:
+            if values is not None:
+                target = np.load(os.path.join(tmp, name), mmap_mode="r+")
+                target[:] = values
+                target.flush()
+                del target
+        _save_overflow(tmp, ylt.overflow)
+        _write_meta(tmp, ylt.regions, ylt.params, portfolio)
+    except BaseException:
+        shutil.rmtree(tmp, ignore_errors=True)
+        raise
+    return _publish(tmp, final)
+
+
+def open_ylt(path: str) -> YearLossTable:
+    """Memory-map a stored catalog read-only."""
+    meta = read_meta(path)
+    if meta.get("format_version") not in READABLE_VERSIONS:
+        raise ValueError(f"Unsupported YLT format version {meta.get('format_version')!r} in {path}.")
+    params = meta["params"]
+    if isinstance(params.get("frequency"), list):
+        params["frequency"] = tuple(params["frequency"])
+    if isinstance(params.get("correlation"), list):
+        params["correlation"] = tuple(tuple(row) for row in params["correlation"])
+    weights = os.path.join(path, WEIGHTS_FILE)
+    return YearLossTable(
+        regions=meta["regions"],
+        annual=np.load(os.path.join(path, ANNUAL_FILE), mmap_mode="r"),
+        top_events=np.load(os.path.join(path, TOP_EVENTS_FILE), mmap_mode="r"),
+        params=SimulationParams(**params),
+        weights=np.load(weights, mmap_mode="r") if os.path.isfile(weights) else None,
+        overflow=EventOverflow(np.load(os.path.join(path, OVERFLOW_YEARS_FILE), mmap_mode="r"),
+                               np.load(os.path.join(path, OVERFLOW_LOSSES_FILE), mmap_mode="r")),
+    )
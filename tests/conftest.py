@@ -0,0 +1,15 @@
+import pytest
+
+from retro_optimizer.portfolio import sample_portfolio
+from retro_optimizer.simulation import SimulationParams
+
+
+@pytest.fixture
+def portfolio():
+    return sample_portfolio()
+
+
+@pytest.fixture
+def small_params():
+    # Several chunks, so sharding and chunk seeding are exercised.
+    return SimulationParams(n_years=20_000, chunk_years=4_000)
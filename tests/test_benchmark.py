@@ -0,0 +1,24 @@
+import json
+import os
+
+from retro_optimizer.benchmark import BENCHMARK_FORMAT, METRICS, baseline_targets, compare, main
+
+
+def test_writes_comparable_json(tmp_path, capsys):
+    output, scratch = tmp_path / "bench.json", tmp_path / "scratch"
+    scratch.mkdir()
+    assert main(["--years", "2000", "--workers", "1", "--iterations", "3",
+                 "--scratch", str(scratch), "--output", str(output)]) == 0
+    with open(output) as fh:
+        report = json.load(fh)
+    assert report["format"] == BENCHMARK_FORMAT
+    assert report["config"]["years"] == [2000]
+    assert [result["case"] for result in report["results"]] == list(METRICS)
+    for result in report["results"]:
+        metric, _ = METRICS[result["case"]]
+        assert result[metric] > 0 and result["peak_rss_mb"] > 0
+    assert os.listdir(scratch) == []
+
+    assert list(baseline_targets(report)) == [2000]
+    assert [speedup for *_, speedup in compare(report, report)] == [1.0] * len(METRICS)
+    assert "results written to" in capsys.readouterr().out
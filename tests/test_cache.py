@@ -0,0 +1,80 @@
+from dataclasses import replace
+
+import numpy as np
+import pytest
+
+from retro_optimizer import export, ylt as store
+from retro_optimizer.cache import DiskCache, MemoryCache, content_key, get_or_compute
+from retro_optimizer.export import PacketContent, build_packet
+from retro_optimizer.jobs import Job, export_job
+from retro_optimizer.layers import Layer, ProgramBatch
+from retro_optimizer.simulation import SimulationParams
+
+
+@pytest.fixture
+def program():
+    layers = [Layer("XoL", 20, 40, reinstatements=1), Layer("ILW", 60, 50, trigger=20_000),
+              Layer("Sidecar", 50, 100, share=0.3)]
+    return ProgramBatch.from_programs([layers], premiums=[[4.0, 1.0, 2.5]])
+
+
+def test_content_key_tracks_inputs(portfolio):
+    params = SimulationParams()
+    key = content_key("ylt", portfolio, params, 0.4)
+    assert key == content_key("ylt", portfolio.copy(), SimulationParams(), 0.4)
+    assert key != content_key("ylt", portfolio, replace(params, seed=params.seed + 1), 0.4)
+    assert key != content_key("ylt", portfolio, params, 0.5)
+    edited = portfolio.copy()
+    edited.iloc[0, 1] += 1
+    assert key != content_key("ylt", edited, params, 0.4)
+
+
+def test_catalog_key_tracks_format_version(portfolio, monkeypatch):
+    params = SimulationParams()
+    key = store.catalog_key(portfolio, params)
+    assert key != store.catalog_key(portfolio, replace(params, n_years=params.n_years + 1))
+    monkeypatch.setattr(store, "FORMAT_VERSION", store.FORMAT_VERSION + 1)
+    assert key != store.catalog_key(portfolio, params)
+
+
+@pytest.mark.parametrize("make_cache", [MemoryCache, DiskCache], ids=["memory", "disk"])
+def test_get_or_compute_computes_once(make_cache, tmp_path):
+    cache = make_cache() if make_cache is MemoryCache else make_cache(root=str(tmp_path))
+    calls = []
+
+    def compute():
+        calls.append(1)
+        return np.arange(3)
+
+    for _ in range(2):
+        np.testing.assert_array_equal(get_or_compute(cache, "key", compute), [0, 1, 2])
+    assert len(calls) == 1
+
+
+def test_packet_rebuilds_only_changed_sections(program):
+    cache = MemoryCache()
+    content = PacketContent(program, payouts=np.array([3.0, 0.5, 1.5]))
+    first = build_packet(content, cache)
+    assert set(first.rebuilt) == set(content.section_keys())
+    assert build_packet(content, cache).rebuilt == ()
+
+    edited = replace(content, payouts=np.array([3.0, 0.5, 1.6]))
+    assert edited.key != content.key
+    assert build_packet(edited, cache).rebuilt == ("structure",)
+
+
+def test_packet_key_tracks_export_format(program, monkeypatch):
+    content = PacketContent(program)
+    key = content.key
+    monkeypatch.setattr(export, "EXPORT_FORMAT", export.EXPORT_FORMAT + 1)
+    assert content.key != key
+
+
+def test_export_result_keys_on_recovery_format(program, portfolio, tmp_path):
+    path = store.simulate_to_store(portfolio, SimulationParams(n_years=2_000), root=str(tmp_path / "ylt"))
+    content = PacketContent(program, ylt_path=path)
+    cache = MemoryCache()
+    csv = export_job(Job("export"), content, cache, "csv", root=str(tmp_path / "exports"))
+    packet_only = export_job(Job("export"), content, cache, None, root=str(tmp_path / "exports"))
+    assert csv["key"] == (content.key, "csv") and csv["data"].endswith(".csv")
+    assert packet_only["key"] != csv["key"] and packet_only["data"] is None
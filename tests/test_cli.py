@@ -0,0 +1,10 @@
+import pytest
+
+from retro_optimizer.cli import main
+
+
+def test_trace_needs_a_single_worker(tmp_path, capsys):
+    with pytest.raises(SystemExit) as exit_info:
+        main([str(tmp_path), str(tmp_path / "out"), "--workers", "2", "--trace", str(tmp_path / "trace.json")])
+    assert exit_info.value.code == 2
+    assert "--workers 1" in capsys.readouterr().err
@@ -0,0 +1,41 @@
+import math
+from statistics import NormalDist
+
+import numpy as np
+import pytest
+
+from retro_optimizer.copula import betainc, normal_cdf, normal_ppf, student_t_to_normal
+
+STANDARD = NormalDist()
+
+
+def test_normal_ppf_matches_exact_quantiles():
+    p = np.concatenate([np.geomspace(1e-15, 0.02, 40), np.linspace(0.02, 0.98, 97),
+                        1.0 - np.geomspace(1e-10, 0.02, 40)])
+    expected = [STANDARD.inv_cdf(value) for value in p]
+    np.testing.assert_allclose(normal_ppf(p), expected, rtol=2e-9, atol=1e-12)
+
+
+def test_normal_cdf_matches_erfc():
+    x = np.linspace(-12.0, 12.0, 481)
+    expected = [0.5 * math.erfc(-value / math.sqrt(2.0)) for value in x]
+    np.testing.assert_allclose(normal_cdf(x), expected, rtol=2e-7)
+
+
+@pytest.mark.parametrize("a, b, exact", [
+    (1.0, 1.0, lambda x: x),
+    (2.5, 1.0, lambda x: x ** 2.5),
+    (1.0, 3.5, lambda x: -np.expm1(3.5 * np.log1p(-x))),
+    (0.5, 0.5, lambda x: 2.0 / np.pi * np.arcsin(np.sqrt(x))),
+], ids=["uniform", "power", "reflected-power", "arcsine"])
+def test_betainc_matches_closed_forms(a, b, exact):
+    x = np.concatenate([np.geomspace(1e-12, 0.5, 30), 1.0 - np.geomspace(1e-9, 0.5, 30)])
+    np.testing.assert_allclose(betainc(a, b, x), exact(x), rtol=1e-10, atol=1e-300)
+    np.testing.assert_array_equal(betainc(a, b, [0.0, 1.0]), [0.0, 1.0])
+
+
+def test_cauchy_maps_to_normal_quantiles():
+    # One degree of freedom is the Cauchy distribution: tail atan(1/|t|) / pi.
+    t = np.array([-1e8, -30.0, -2.0, -0.1, 0.0, 0.1, 2.0, 30.0, 1e8])
+    expected = [math.copysign(STANDARD.inv_cdf(math.atan2(1.0, abs(v)) / math.pi), v) if v else 0.0 for v in t]
+    np.testing.assert_allclose(student_t_to_normal(t, 1.0), expected, rtol=1e-8, atol=1e-12)
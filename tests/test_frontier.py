@@ -0,0 +1,41 @@
+import numpy as np
+import pytest
+
+from retro_optimizer.frontier import build_frontier, pareto_mask, sweep
+from retro_optimizer.layers import LossBasis
+from retro_optimizer.portfolio import sample_portfolio
+from retro_optimizer.rl import RetroEnv
+from retro_optimizer.simulation import SimulationParams, simulate_ylt
+
+
+@pytest.fixture(scope="module")
+def env():
+    ylt = simulate_ylt(sample_portfolio(), SimulationParams(n_years=5_000))
+    return RetroEnv(LossBasis.from_ylt(ylt))
+
+
+def test_pareto_mask_matches_pairwise_dominance():
+    costs = np.random.default_rng(0).integers(0, 6, size=(300, 3)).astype(float)
+    dominated = [np.any(np.all(costs <= c, axis=1) & np.any(costs < c, axis=1)) for c in costs]
+    mask = pareto_mask(costs)
+    assert {tuple(c) for c in costs[mask]} == {tuple(c) for c, d in zip(costs, dominated) if not d}
+    assert len(costs[mask]) == len({tuple(c) for c in costs[mask]})
+
+
+def test_front_does_not_depend_on_batch_order(env):
+    candidates = np.random.default_rng(1).uniform(size=(512, env.action_dim))
+    forward = sweep(env, candidates, batch_size=64, workers=4)
+    # Same batches merged in reverse order, duplicating some programs.
+    backward = None
+    for start in range(448, -1, -64):
+        backward = sweep(env, candidates[start:start + 64], workers=1, archive=backward)
+    backward = sweep(env, candidates[:100], workers=1, archive=backward)
+    for a, b in zip(forward, backward):
+        np.testing.assert_array_equal(a, b)
+
+
+def test_build_frontier_is_reproducible(env):
+    first = build_frontier(env, n_candidates=256, refine_rounds=1, batch_size=32, workers=4)
+    second = build_frontier(env, n_candidates=256, refine_rounds=1, batch_size=32, workers=2)
+    np.testing.assert_array_equal(first.actions, second.actions)
+    np.testing.assert_array_equal(first.cvar, second.cvar)
@@ -0,0 +1,62 @@
+import io
+import re
+
+import pandas as pd
+import pytest
+
+from retro_optimizer.ingest import read_portfolio
+from retro_optimizer.portfolio import EXPECTED_LOSS, LINE_OF_BUSINESS, REGION, TIV
+
+
+def csv(text: str) -> io.BytesIO:
+    return io.BytesIO(text.encode())
+
+
+def test_reads_aliased_columns():
+    portfolio = read_portfolio(csv("Territory,Sum Insured ($M),AAL\nFlorida,300,45\nTexas,120,9\n"), "book.csv")
+    assert list(portfolio.columns) == [REGION, TIV, EXPECTED_LOSS, LINE_OF_BUSINESS]
+    assert portfolio[TIV].tolist() == [300, 120]
+    assert isinstance(portfolio[REGION].dtype, pd.CategoricalDtype)
+
+
+@pytest.mark.parametrize("text, message", [
+    ("Region,TIV\nFlorida,300\n", EXPECTED_LOSS),
+    ("Region,TIV,Expected Loss\n", "no data rows"),
+    ("Region,TIV,Expected Loss\nFlorida,300,45\n,120,9\n", "Missing region in 1 row(s), e.g. file rows 3"),
+    ("Region,TIV,Expected Loss\nFlorida,300,45\nTexas,-1,0\n", f"Negative {TIV} in 1 row(s), e.g. file rows 3"),
+    ("Region,TIV,Expected Loss\nFlorida,300,450\n", f"{EXPECTED_LOSS} exceeds {TIV} in 1 row(s), e.g. file rows 2"),
+], ids=["missing-column", "empty", "missing-region", "negative", "excess"])
+def test_rejects_invalid_books(text, message):
+    with pytest.raises(ValueError, match=re.escape(message)):
+        read_portfolio(csv(text), "book.csv")
+
+
+@pytest.mark.parametrize("text, column", [
+    ("Region,TIV,Expected Loss\nFlorida,300,45\nTexas,0,0\nTexas,0,0\n", TIV),
+    ("Region,TIV,Expected Loss\nFlorida,300,45\nTexas,120,0\n", EXPECTED_LOSS),
+], ids=["tiv", "expected-loss"])
+def test_rejects_regions_without_exposure(text, column):
+    with pytest.raises(ValueError, match=re.escape(f"Zero total {column} in region(s) Texas")):
+        read_portfolio(csv(text), "book.csv")
+
+
+def test_rejects_non_numeric_amounts():
+    # The pyarrow reader reports the conversion error, the pandas one the rows.
+    with pytest.raises(ValueError, match=r"Could not parse the uploaded CSV|Non-numeric or missing TIV"):
+        read_portfolio(csv("Region,TIV,Expected Loss\nFlorida,300,45\nTexas,abc,9\n"), "book.csv")
+
+
+def test_xlsx_errors_report_sheet_rows():
+    openpyxl = pytest.importorskip("openpyxl")
+    workbook = openpyxl.Workbook()
+    sheet = workbook.active
+    sheet.append(["Region", "TIV", "Expected Loss"])
+    sheet.append(["Florida", 300, 45])
+    sheet.append([])
+    sheet.append([])
+    sheet.append(["Texas", -5, 1])
+    buffer = io.BytesIO()
+    workbook.save(buffer)
+    buffer.seek(0)
+    with pytest.raises(ValueError, match=re.escape(f"Negative {TIV} in 1 row(s), e.g. file rows 5")):
+        read_portfolio(buffer, "book.xlsx")
@@ -0,0 +1,92 @@
+import os
+import threading
+import time
+
+import pytest
+
+from retro_optimizer import jobs
+from retro_optimizer.jobs import (
+    CANCELLED, DONE, FAILED, QUEUED, Job, JobCancelled, JobManager, converging_simulation_job
+)
+from retro_optimizer.simulation import SimulationParams, simulate_ylt
+from retro_optimizer.ylt import open_ylt
+
+from .test_simulation import assert_same_catalog
+
+
+@pytest.fixture
+def manager():
+    manager = JobManager(max_workers=1)
+    yield manager
+    manager.shutdown()
+
+
+def wait(job, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while job.active:
+        assert time.monotonic() < deadline, f"{job.kind} job still {job.status}"
+        time.sleep(0.01)
+
+
+def blocker(job, release):
+    while not release.wait(0.01):
+        job.report()
+    return "released"
+
+
+def test_job_reports_result_and_error(manager):
+    def fails(job):
+        raise ValueError("bad book")
+
+    done = manager.submit("ok", lambda job, x: x * 2, 21, total=1)
+    failed = manager.submit("bad", fails)
+    wait(done)
+    wait(failed)
+    assert (done.status, done.result, done.error) == (DONE, 42, None)
+    assert failed.status == FAILED and str(failed.error) == "bad book"
+    assert manager.get(done.id) is done
+
+
+def test_cancel_stops_running_and_queued_jobs(manager):
+    release = threading.Event()
+    running = manager.submit("running", blocker, release)
+    queued = manager.submit("queued", blocker, release)
+    while running.status == QUEUED:
+        time.sleep(0.01)
+    assert queued.status == QUEUED and manager.queue_position(queued) == 0
+    manager.cancel(queued.id)
+    manager.cancel(running.id)
+    wait(running)
+    wait(queued)
+    assert running.status == queued.status == CANCELLED
+    assert queued.started is None and running.result is None
+
+
+def test_finished_jobs_are_pruned_oldest_first(manager, monkeypatch):
+    monkeypatch.setattr(jobs, "MAX_FINISHED_JOBS", 2)
+    finished = [manager.submit("quick", lambda job: None) for _ in range(4)]
+    for job in finished:
+        wait(job)
+    latest = manager.submit("quick", lambda job: None)
+    assert manager.jobs()[:2] == finished[2:]
+    assert manager.get(finished[0].id) is None
+    assert latest in manager.jobs()
+
+
+@pytest.mark.parametrize("rel_tol, converges", [(0.05, True), (1e-6, False)], ids=["early", "full"])
+def test_converging_catalog_matches_a_run_of_its_length(portfolio, tmp_path, rel_tol, converges):
+    params = SimulationParams(n_years=40_000, tail_tilt=0.5)
+    path = converging_simulation_job(Job("simulation"), portfolio, params, rel_tol=rel_tol, root=str(tmp_path))
+    stored = open_ylt(path)
+    assert (stored.n_years < params.n_years) == converges
+    assert stored.params.chunk_years == 2_000
+    assert_same_catalog(simulate_ylt(portfolio, stored.params), stored)
+    assert os.listdir(tmp_path) == [os.path.basename(path)]
+
+
+def test_cancelled_converging_run_leaves_no_catalog(portfolio, tmp_path):
+    job = Job("simulation")
+    job.cancel()
+    with pytest.raises(JobCancelled):
+        converging_simulation_job(job, portfolio, SimulationParams(n_years=20_000), root=str(tmp_path))
+    assert os.listdir(tmp_path) == []
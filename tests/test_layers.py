@@ -0,0 +1,113 @@
+import numpy as np
+import pytest
+
+from retro_optimizer.layers import (
+    LAYER_DTYPE,
+    Layer,
+    LossBasis,
+    ProgramBatch,
+    batch_recoveries,
+    layer_recoveries,
+    xol_recoveries,
+)
+from retro_optimizer.simulation import EventOverflow, YearLossTable
+
+
+@pytest.fixture
+def ylt():
+    # Three years with two dense top events each; the rest sit in the overflow.
+    #   year 0: events 30, 12, 8, 4    total  54
+    #   year 1: event 5                 total   5
+    #   year 2: events 60, 25, 15       total 100
+    return YearLossTable(
+        regions=["A", "B"],
+        annual=np.array([[40, 14], [5, 0], [70, 30]], dtype=np.float32),
+        top_events=np.array([[30, 12], [5, 0], [60, 25]], dtype=np.float32),
+        overflow=EventOverflow(np.array([0, 0, 2]), np.array([8, 4, 15], dtype=np.float32)),
+    )
+
+
+@pytest.fixture
+def basis(ylt):
+    return LossBasis.from_ylt(ylt)
+
+
+def test_xol_counts_every_event(basis):
+    # 10 xs 20 with one reinstatement: occurrence losses 20+2, 0 and 20+15+5
+    # capped at the 40 aggregate.
+    layer = Layer("XoL", retention=10, limit=20, reinstatements=1)
+    np.testing.assert_allclose(layer_recoveries(basis, layer), [22, 0, 40])
+
+
+def test_xol_aggregate_limit_and_share(basis):
+    # 10 xs 3: occurrences 10+9+5+1, 2 and 10+10+10, capped at 10, half placed.
+    layer = Layer("XoL", retention=3, limit=10, share=0.5)
+    np.testing.assert_allclose(layer_recoveries(basis, layer), [5, 1, 5])
+
+
+def test_xol_without_overflow_counts_top_events_only(basis):
+    out = xol_recoveries(basis.top_events, 3, 100, 1000)
+    np.testing.assert_allclose(out, [27 + 9, 2, 57 + 22])
+
+
+def test_ilw_pays_only_when_triggered(basis):
+    # Industry index at a 0.5% share is 200x the total: 10,800, 1,000, 20,000.
+    layer = Layer("ILW", retention=50, limit=30, trigger=15_000)
+    np.testing.assert_allclose(layer_recoveries(basis, layer), [0, 0, 30])
+
+
+def test_sidecar_quota_share(basis):
+    layer = Layer("Sidecar", retention=20, limit=50, share=0.4)
+    np.testing.assert_allclose(layer_recoveries(basis, layer), [13.6, 0, 20])
+
+
+def test_batch_matches_single_programs(basis):
+    programs = [
+        [Layer("XoL", 10, 20, reinstatements=1), Layer("ILW", 50, 30, trigger=15_000),
+         Layer("Sidecar", 20, 50, share=0.4)],
+        [Layer("XoL", 3, 10, share=0.5), Layer("ILW", 0, 0), Layer("Sidecar", 0, 100, share=1.0)],
+    ]
+    batch = ProgramBatch.from_programs(programs)
+    expected = [sum(layer_recoveries(basis, layer) for layer in program) for program in programs]
+    np.testing.assert_allclose(batch_recoveries(basis, batch), expected, rtol=1e-6)
+    np.testing.assert_allclose(expected[0], [22 + 13.6, 0, 40 + 30 + 20])
+
+
+@pytest.mark.parametrize("premiums", [None, [[3.0, 1.5, 8.0], [0.5, 0.0, 12.0]]], ids=["unpriced", "priced"])
+def test_records_round_trip(premiums):
+    batch = ProgramBatch.from_programs([
+        [Layer("XoL", 10, 20, reinstatements=1), Layer("ILW", 50, 30, trigger=15_000),
+         Layer("Sidecar", 20, 50, share=0.4)],
+        [Layer("XoL", 3, 10, share=0.5), Layer("ILW", 0, 0), Layer("Sidecar", 0, 100, share=1.0)],
+    ])
+    if premiums is not None:
+        batch = batch.priced(premiums)
+    records = batch.to_records()
+    assert records.dtype == LAYER_DTYPE and records.shape == (2, 3)
+    restored = ProgramBatch.from_records(records)
+    assert restored.covers == batch.covers
+    for name in ("retention", "limit", "reinstatements", "trigger", "share", "rate"):
+        np.testing.assert_array_equal(getattr(restored, name), getattr(batch, name), err_msg=name)
+    assert ProgramBatch.from_records(records[1]).layers() == batch.layers(1)
+
+
+def test_records_need_one_layout():
+    records = ProgramBatch.from_programs([[Layer("XoL", 10, 20)], [Layer("XoL", 5, 20)]]).to_records()
+    records["cover"][1] = 1
+    with pytest.raises(ValueError):
+        ProgramBatch.from_records(records)
+
+
+def test_sliced_basis_keeps_overflow(basis):
+    layer = Layer("XoL", retention=3, limit=100, reinstatements=9)
+    np.testing.assert_allclose(layer_recoveries(basis[::2], layer), [27 + 9 + 5 + 1, 57 + 22 + 12])
+    np.testing.assert_allclose(layer_recoveries(basis[[2, 0]], layer), [57 + 22 + 12, 27 + 9 + 5 + 1])
+
+
+def test_layer_rejects_invalid_terms():
+    with pytest.raises(ValueError):
+        Layer("Quota", 0, 10)
+    with pytest.raises(ValueError):
+        Layer("XoL", -1, 10)
+    with pytest.raises(ValueError):
+        Layer("Sidecar", 0, 10, share=1.5)
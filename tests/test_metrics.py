@@ -0,0 +1,94 @@
+import math
+
+import numpy as np
+import pytest
+
+from retro_optimizer.metrics import StreamingTail, exceedance_curve, tail_count, var_cvar, weighted_mean
+
+LEVELS = [0.9, 0.99, 0.996]
+
+
+def sorted_var_cvar(losses, level, weights=None):
+    # Reference: full descending sort, tail of mass n * (1 - level).
+    n = losses.size
+    order = np.argsort(-losses, kind="stable")
+    desc = losses[order].astype(np.float64)
+    if weights is None:
+        m = tail_count(n, level)
+        return desc[m - 1], desc[:m].mean()
+    w = weights[order].astype(np.float64)
+    mass = round(n * (1.0 - level), 9)
+    j = min(int((np.cumsum(w) < mass).sum()), n - 1)
+    value_at_risk = desc[j]
+    return value_at_risk, value_at_risk + (w * np.maximum(desc - value_at_risk, 0.0)).sum() / mass
+
+
+@pytest.fixture
+def sample():
+    rng = np.random.default_rng(7)
+    losses = rng.lognormal(3.0, 1.2, size=(3, 5_001)).astype(np.float32)
+    weights = rng.gamma(4.0, 0.25, size=5_001).astype(np.float32)
+    return losses, weights
+
+
+@pytest.mark.parametrize("level", LEVELS)
+def test_var_cvar_matches_sort(sample, level):
+    losses, _ = sample
+    value_at_risk, tail_loss = var_cvar(losses, level)
+    for row, v, c in zip(losses, value_at_risk, tail_loss):
+        expected = sorted_var_cvar(row, level)
+        assert v == pytest.approx(expected[0])
+        assert c == pytest.approx(expected[1], rel=1e-6)
+
+
+@pytest.mark.parametrize("level", LEVELS)
+def test_weighted_var_cvar_matches_sort(sample, level):
+    losses, weights = sample
+    value_at_risk, tail_loss = var_cvar(losses, level, weights)
+    for row, v, c in zip(losses, value_at_risk, tail_loss):
+        expected = sorted_var_cvar(row, level, weights)
+        assert v == pytest.approx(expected[0])
+        assert c == pytest.approx(expected[1], rel=1e-6)
+
+
+def test_unit_weights_match_unweighted(sample):
+    losses, _ = sample
+    ones = np.ones(losses.shape[-1], dtype=np.float32)
+    level = 1.0 - 50 / losses.shape[-1]
+    np.testing.assert_allclose(var_cvar(losses, level, ones), var_cvar(losses, level), rtol=1e-6)
+
+
+def test_weighted_mean_accumulates_in_double(sample):
+    losses, weights = sample
+    expected = (losses.astype(np.float64) * weights.astype(np.float64)).mean(axis=-1)
+    np.testing.assert_allclose(weighted_mean(losses, weights), expected, rtol=1e-12)
+
+
+def test_exceedance_curve_matches_sort(sample):
+    losses, _ = sample
+    periods = (2, 10, 100, 1000, 10_000)
+    curve = exceedance_curve(losses[0], periods)
+    desc = np.sort(losses[0])[::-1]
+    expected = [desc[max(1, math.ceil(losses.shape[-1] / t)) - 1] for t in periods[:-1]]
+    np.testing.assert_allclose(curve[:-1], expected)
+    assert np.isnan(curve[-1])
+
+
+def test_streaming_tail_matches_batch(sample):
+    losses, weights = sample
+    tail = StreamingTail(level=0.99)
+    for part in np.array_split(np.arange(losses.shape[-1]), 7):
+        tail.update(losses[0, part], weights[part])
+    estimate = tail.estimate()
+    value_at_risk, tail_loss = var_cvar(losses[0], 0.99, weights)
+    assert estimate.var == pytest.approx(value_at_risk)
+    assert estimate.cvar == pytest.approx(tail_loss, rel=1e-6)
+
+
+def test_streaming_tail_converges_only_after_min_years():
+    tail = StreamingTail(level=0.99)
+    assert tail.min_years() == 10_000
+    tail.update(np.ones(tail.min_years() - 1))
+    assert not tail.converged()
+    tail.update(np.ones(1))
+    assert tail.converged()
@@ -0,0 +1,44 @@
+import os
+from dataclasses import replace
+
+import pytest
+
+from retro_optimizer import pipeline
+from retro_optimizer.pipeline import PipelineConfig, run_portfolio
+from retro_optimizer.simulation import SimulationParams
+
+CONFIG = PipelineConfig(params=SimulationParams(n_years=2_000), iterations=2)
+
+
+@pytest.fixture
+def book(portfolio, tmp_path):
+    path = tmp_path / "book.csv"
+    portfolio.to_csv(path, index=False)
+    return str(path)
+
+
+def recomputed(*args, **kwargs):
+    raise AssertionError("a checkpointed stage was recomputed")
+
+
+def without_timing(report):
+    return {name: value for name, value in report.items() if name != "elapsed"}
+
+
+def test_rerun_resumes_from_checkpoints(book, tmp_path, monkeypatch):
+    out, store = str(tmp_path / "out"), str(tmp_path / "ylt")
+    first = run_portfolio(book, out, CONFIG, store_root=store)
+    # Interrupted before Step 5 finished.
+    os.remove(os.path.join(out, "report.json"))
+    monkeypatch.setattr(pipeline, "simulate_to_store", recomputed)
+    monkeypatch.setattr(pipeline, "train", recomputed)
+    assert without_timing(run_portfolio(book, out, CONFIG, store_root=store)) == without_timing(first)
+
+
+def test_changed_setting_keeps_the_catalog(book, tmp_path, monkeypatch):
+    out, store = str(tmp_path / "out"), str(tmp_path / "ylt")
+    first = run_portfolio(book, out, CONFIG, store_root=store)
+    monkeypatch.setattr(pipeline, "simulate_to_store", recomputed)
+    second = run_portfolio(book, out, replace(CONFIG, max_premium=5.0), store_root=store)
+    assert second["key"] != first["key"]
+    assert second["total_premium"] <= 5.0
@@ -0,0 +1,34 @@
+import numpy as np
+import pytest
+
+from retro_optimizer.layers import LossBasis
+from retro_optimizer.metrics import exceedance_curve
+from retro_optimizer.portfolio import sample_portfolio
+from retro_optimizer.pricing import MAX_TABLE_YEARS, default_table_years, rate_table
+from retro_optimizer.simulation import SimulationParams, simulate_ylt
+
+
+@pytest.fixture(scope="module")
+def basis():
+    return LossBasis.from_ylt(simulate_ylt(sample_portfolio(), SimulationParams(n_years=100_000)))
+
+
+@pytest.mark.parametrize("cover, variable, reinstatements, trigger", [
+    ("XoL", "max_event", 1, 0.0),
+    ("Sidecar", "total", 0, 0.0),
+])
+def test_subsampled_tables_match_full_catalog(basis, cover, variable, reinstatements, trigger):
+    losses = basis.top_events[:, 0] if variable == "max_event" else basis.total
+    top = float(exceedance_curve(losses, (250,))[0])
+    full = rate_table(basis, cover, top, top, reinstatements, trigger, max_years=0)
+    sub = rate_table(basis, cover, top, top, reinstatements, trigger, max_years=MAX_TABLE_YEARS)
+    priced = full.premium > 0.5
+    error = np.abs(sub.premium - full.premium)[priced] / full.premium[priced]
+    assert np.median(error) < 0.01
+    assert error.max() < 0.05
+
+
+def test_table_years_follow_environment(monkeypatch):
+    assert default_table_years() == MAX_TABLE_YEARS
+    monkeypatch.setenv("RETRO_TABLE_YEARS", "0")
+    assert default_table_years() == 0
@@ -0,0 +1,57 @@
+import numpy as np
+import pytest
+
+from retro_optimizer import telemetry
+from retro_optimizer.layers import LossBasis
+from retro_optimizer.portfolio import sample_portfolio
+from retro_optimizer.rl import LIMIT_ACTIONS, RetroEnv, train
+from retro_optimizer.simulation import SimulationParams, simulate_ylt
+
+
+@pytest.fixture(scope="module")
+def env():
+    ylt = simulate_ylt(sample_portfolio(), SimulationParams(n_years=20_000))
+    return RetroEnv(LossBasis.from_ylt(ylt), max_premium=10.0)
+
+
+def test_constrain_keeps_programs_within_budget(env):
+    actions = np.random.default_rng(0).uniform(size=(256, env.action_dim))
+    actions[:8] = 1.0
+    constrained = env.constrain(actions)
+    premium = env.premium(env.decode(constrained))
+    assert np.all(premium <= env.max_premium * (1 + 1e-6))
+    assert np.any(env.premium(env.decode(actions)) > env.max_premium)
+
+
+def test_constrain_only_scales_limits_of_programs_over_budget(env):
+    actions = np.random.default_rng(1).uniform(size=(256, env.action_dim))
+    constrained = env.constrain(actions)
+    within = env.premium(env.decode(actions)) <= env.max_premium
+    np.testing.assert_array_equal(constrained[within], actions[within])
+    others = [i for i in range(env.action_dim) if i not in LIMIT_ACTIONS]
+    np.testing.assert_array_equal(constrained[:, others], actions[:, others])
+    assert np.all(constrained[:, LIMIT_ACTIONS] <= actions[:, LIMIT_ACTIONS])
+
+
+def test_step_scores_only_feasible_programs(env):
+    actions = np.ones((16, env.action_dim))
+    _, _, done, evaluation = env.step(actions)
+    assert done.all()
+    assert evaluation.feasible.all()
+
+
+def test_interrupted_training_still_records_its_span(env):
+    def progress(iteration, best_reward):
+        raise KeyboardInterrupt
+
+    was_enabled = telemetry.enabled()
+    telemetry.enable()
+    try:
+        telemetry.reset()
+        with pytest.raises(KeyboardInterrupt):
+            train(env, iterations=5, progress=progress)
+        record, = [s for s in telemetry.spans() if s.name == "train"]
+        assert record.error == "KeyboardInterrupt"
+    finally:
+        telemetry.enable(was_enabled)
+        telemetry.reset()
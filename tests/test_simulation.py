@@ -0,0 +1,60 @@
+from dataclasses import replace
+
+import numpy as np
+import pytest
+
+from retro_optimizer.parallel import simulate_ylt_parallel
+from retro_optimizer.simulation import simulate_events, simulate_ylt
+from retro_optimizer.ylt import open_ylt, portfolio_hash, simulate_to_store, stored_portfolio
+
+
+def assert_same_catalog(a, b):
+    assert list(a.regions) == list(b.regions)
+    for name in ("annual", "top_events", "weights"):
+        left, right = getattr(a, name), getattr(b, name)
+        if left is None:
+            assert right is None
+        else:
+            assert np.array_equal(left, right), name
+    assert np.array_equal(a.overflow.years, b.overflow.years)
+    assert np.array_equal(a.overflow.losses, b.overflow.losses)
+
+
+@pytest.mark.parametrize("changes", [{}, {"tail_tilt": 1.0}, {"copula": "t"}],
+                         ids=["poisson", "tilted", "t-copula"])
+def test_sharded_catalog_is_bit_identical(portfolio, small_params, changes):
+    params = replace(small_params, **changes)
+    serial = simulate_ylt(portfolio, params)
+    assert_same_catalog(serial, simulate_ylt_parallel(portfolio, params, workers=3))
+
+
+def test_stored_catalog_is_bit_identical(portfolio, small_params, tmp_path):
+    serial = simulate_ylt(portfolio, small_params)
+    one = open_ylt(simulate_to_store(portfolio, small_params, root=str(tmp_path / "one"), workers=1))
+    many = open_ylt(simulate_to_store(portfolio, small_params, root=str(tmp_path / "many"), workers=3))
+    assert_same_catalog(serial, one)
+    assert_same_catalog(serial, many)
+
+
+def test_catalog_stores_its_exposure(portfolio, small_params, tmp_path):
+    stored = stored_portfolio(simulate_to_store(portfolio, small_params, root=str(tmp_path)))
+    assert portfolio_hash(stored) == portfolio_hash(portfolio)
+
+
+def test_catalog_keeps_every_event(portfolio, small_params):
+    events = simulate_events(portfolio, small_params)
+    ylt = simulate_ylt(portfolio, small_params)
+    per_year = np.bincount(ylt.overflow.years, weights=ylt.overflow.losses, minlength=ylt.n_years)
+    np.testing.assert_allclose(ylt.top_events.sum(axis=1, dtype=np.float64) + per_year,
+                               ylt.total, rtol=1e-4)
+    assert np.array_equal(ylt.max_event, events.max_event)
+
+
+@pytest.mark.parametrize("years", [slice(3_000, 9_000), slice(5, None, 7), np.array([4, 4, 17_000, 2])],
+                         ids=["range", "stride", "index"])
+def test_sliced_catalog_keeps_its_events(portfolio, small_params, years):
+    ylt = simulate_ylt(portfolio, small_params)
+    part = ylt[years]
+    per_year = np.bincount(part.overflow.years, weights=part.overflow.losses, minlength=part.n_years)
+    np.testing.assert_allclose(part.top_events.sum(axis=1, dtype=np.float64) + per_year,
+                               part.total, rtol=1e-4)